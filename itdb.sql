@@ -80,9 +80,68 @@ File_Creator INTEGER(4),
 Location VARCHAR(512),
 File_Folder_Count INTEGER(1),
 Library_Folder_Count INTEGER(1),
+-- keys into the artists, albums, genres and kinds tables below (Album_Artist
+-- is in artists too), NULL when the track doesn't have one
+Artist_ID INTEGER(4),
+Album_Artist_ID INTEGER(4),
+Album_ID INTEGER(4),
+Genre_ID INTEGER(4),
+Kind_ID INTEGER(4),
 PRIMARY KEY (User_ID, Track_ID)
 );
 
+-- secondary indexes for the web ui and the tools (itdbloader.py drops these
+-- during a full load and builds them again at the end, itdbindex.py shows
+-- which queries use them). long VARCHARs only index the first few characters.
+CREATE INDEX tracks_track ON tracks (Track_ID);
+CREATE INDEX tracks_genre ON tracks (User_ID, Genre_ID);
+CREATE INDEX tracks_artist ON tracks (User_ID, Artist_ID);
+CREATE INDEX tracks_album ON tracks (User_ID, Album_ID);
+CREATE INDEX tracks_persistent_id ON tracks (Persistent_ID);
+CREATE INDEX tracks_sort_name ON tracks (User_ID, Sort_Name(64));
+CREATE INDEX tracks_sort_artist ON tracks (User_ID, Sort_Artist(64));
+CREATE INDEX tracks_sort_album ON tracks (User_ID, Sort_Album(64));
+CREATE INDEX tracks_sort_album_artist ON tracks (User_ID, Sort_Album_Artist(64));
+
+-- each user's distinct artists, albums, genres and kinds. itdbloader.py
+-- numbers them as it loads the tracks.
+DROP TABLE IF EXISTS artists;
+CREATE TABLE artists (
+User_ID INTEGER(4) NOT NULL,
+Artist_ID INTEGER(4) NOT NULL,
+Name VARCHAR(256) NOT NULL,
+PRIMARY KEY (User_ID, Artist_ID)
+);
+
+CREATE INDEX artists_name ON artists (User_ID, Name(64));
+
+DROP TABLE IF EXISTS albums;
+CREATE TABLE albums (
+User_ID INTEGER(4) NOT NULL,
+Album_ID INTEGER(4) NOT NULL,
+Name VARCHAR(256) NOT NULL,
+PRIMARY KEY (User_ID, Album_ID)
+);
+
+CREATE INDEX albums_name ON albums (User_ID, Name(64));
+
+DROP TABLE IF EXISTS genres;
+CREATE TABLE genres (
+User_ID INTEGER(4) NOT NULL,
+Genre_ID INTEGER(4) NOT NULL,
+Name VARCHAR(64) NOT NULL,
+PRIMARY KEY (User_ID, Genre_ID)
+);
+
+CREATE INDEX genres_name ON genres (User_ID, Name);
+
+DROP TABLE IF EXISTS kinds;
+CREATE TABLE kinds (
+User_ID INTEGER(4) NOT NULL,
+Kind_ID INTEGER(4) NOT NULL,
+Name VARCHAR(64) NOT NULL,
+PRIMARY KEY (User_ID, Kind_ID)
+);
 
 DROP TABLE IF EXISTS playlists;
 CREATE TABLE playlists (
@@ -91,10 +150,27 @@ Playlist_ID INTEGER(4) NOT NULL,
 Name VARCHAR(1024),
 Playlist_Persistent_ID VARCHAR(1024),
 Parent_Persistent_ID VARCHAR(1024),
--- Folder  boolean - how do we do this?
+Folder BOOL DEFAULT FALSE,
 PRIMARY KEY (User_ID, Playlist_ID)
 );
 
+CREATE INDEX playlists_name ON playlists (Name(64));
+CREATE INDEX playlists_persistent_id ON playlists (Playlist_Persistent_ID(20));
+CREATE INDEX playlists_parent ON playlists (Parent_Persistent_ID(20));
+
+-- every folder each playlist is in (at any depth, Depth 1 is its parent) and
+-- each playlist itself at Depth 0, so everything under a folder is one lookup
+DROP TABLE IF EXISTS playlist_folders;
+CREATE TABLE playlist_folders (
+User_ID INTEGER(4) NOT NULL,
+Folder_ID INTEGER(4) NOT NULL,
+Playlist_ID INTEGER(4) NOT NULL,
+Depth INTEGER(2) NOT NULL,
+PRIMARY KEY (User_ID, Folder_ID, Playlist_ID)
+);
+
+CREATE INDEX playlist_folders_playlist ON playlist_folders (User_ID, Playlist_ID);
+
 DROP TABLE IF EXISTS playlist_tracks;
 CREATE TABLE playlist_tracks (
 User_ID INTEGER(4) NOT NULL,
@@ -103,6 +179,21 @@ Track_ID INTEGER(4) NOT NULL,
 PRIMARY KEY (User_ID, Playlist_ID, Track_ID)
 );
 
+CREATE INDEX playlist_tracks_playlist ON playlist_tracks (Playlist_ID);
+
+-- the Track_IDs in each playlist in iTunes' order, packed as little endian
+-- 32 bit ints (itdbstore.pack_track_ids), so reading a whole playlist in
+-- order is one row
+DROP TABLE IF EXISTS playlist_items;
+CREATE TABLE playlist_items (
+User_ID INTEGER(4) NOT NULL,
+Playlist_ID INTEGER(4) NOT NULL,
+Track_IDs LONGBLOB NOT NULL,
+PRIMARY KEY (User_ID, Playlist_ID)
+);
+
+CREATE INDEX playlist_items_playlist ON playlist_items (Playlist_ID);
+
 -- how many stars does each playlit have
 DROP TABLE IF EXISTS playlist_stats;
 CREATE TABLE playlist_stats (
@@ -110,9 +201,45 @@ User_ID INTEGER(4) NOT NULL,
 Playlist_ID INTEGER(4) NOT NULL,
 Rating INTEGER(1) DEFAULT 0,
 Count INTEGER(4) DEFAULT 0,
+Size BIGINT DEFAULT 0,
+Total_Time BIGINT DEFAULT 0,
 PRIMARY KEY (User_ID, Playlist_ID, Rating)
 );
 
+-- and each genre, artist and album (0 is the tracks without one)
+DROP TABLE IF EXISTS genre_stats;
+CREATE TABLE genre_stats (
+User_ID INTEGER(4) NOT NULL,
+Genre_ID INTEGER(4) NOT NULL,
+Rating INTEGER(1) DEFAULT 0,
+Count INTEGER(4) DEFAULT 0,
+Size BIGINT DEFAULT 0,
+Total_Time BIGINT DEFAULT 0,
+PRIMARY KEY (User_ID, Genre_ID, Rating)
+);
+
+DROP TABLE IF EXISTS artist_stats;
+CREATE TABLE artist_stats (
+User_ID INTEGER(4) NOT NULL,
+Artist_ID INTEGER(4) NOT NULL,
+Rating INTEGER(1) DEFAULT 0,
+Count INTEGER(4) DEFAULT 0,
+Size BIGINT DEFAULT 0,
+Total_Time BIGINT DEFAULT 0,
+PRIMARY KEY (User_ID, Artist_ID, Rating)
+);
+
+DROP TABLE IF EXISTS album_stats;
+CREATE TABLE album_stats (
+User_ID INTEGER(4) NOT NULL,
+Album_ID INTEGER(4) NOT NULL,
+Rating INTEGER(1) DEFAULT 0,
+Count INTEGER(4) DEFAULT 0,
+Size BIGINT DEFAULT 0,
+Total_Time BIGINT DEFAULT 0,
+PRIMARY KEY (User_ID, Album_ID, Rating)
+);
+
 
 -- example join of the data
 -- SELECT t.Name FROM tracks t inner join  playlists p on t.Track_ID = p.Track_ID  WHERE p.Playlist_ID=27884
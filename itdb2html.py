@@ -35,7 +35,6 @@ import sys
 import os
 import logging
 import configparser
-import MySQLdb
 import datetime
 import atexit
 import math
@@ -45,8 +44,13 @@ import cgi
 import cgitb
 import getopt
 
+import humanize
 from Cheetah.Template import Template
 
+import itdbqueries
+import itdbstore
+import itdbtrace
+
 
 def usage(code, msg=""):
     if code:
@@ -65,6 +69,14 @@ ALLOWED_FILENAME_CHARS = (
 )
 
 
+# the tracks id column, table of names and table of stats for each kind of grouping
+DIMENSIONS = {
+    "genre": ("Genre_ID", "genres", "genre_stats"),
+    "artist": ("Artist_ID", "artists", "artist_stats"),
+    "album": ("Album_ID", "albums", "album_stats"),
+}
+
+
 def getFilename(base):
     if not base or len(base) == 0:
         return "_NONE_"
@@ -81,11 +93,16 @@ class Grouping:
         self.dispName = name or "<i>empty</i>"
         self.filename = getFilename(name)
         self.stars = [0, 0, 0, 0, 0, 0]
+        # bytes and milliseconds of all the tracks
+        self.size = 0
+        self.total_time = 0
         self.num_stars = num_stars
         self.extension = extension or ".html"
 
-    def addStars(self, stars, count):
+    def addStars(self, stars, count, size=0, total_time=0):
         self.stars[int(stars)] += int(count)
+        self.size += int(size or 0)
+        self.total_time += int(total_time or 0)
 
     def getQuality(self):
         """The quality of this genre from 0 to 5.
@@ -164,6 +181,9 @@ class FormatUtil:
     def sum(self, list):
         return sum(list)
 
+    def formatSize(self, size):
+        return humanize.naturalsize(size)
+
     def urlencode(self, str):
         return urllib.parse.quote_plus(str)
 
@@ -180,16 +200,18 @@ class FormatUtil:
 
 
 class iTunesDbToHtml:
-    def __init__(self, config):
+    def __init__(self, config, conn=None):
+        """conn is a connection to use instead of making our own."""
         self.config = config
-        self.conn = None
+        self.conn = conn
+        if conn is not None:
+            self.cursor = conn.cursor()
         self.userId = int(config.get("user", "id"))
         self.dir = config.get("html", "dir")
         self.base = config.get("html", "base")
         self.script = self.base + "/" + config.get("html", "script")
         logging.info("dir is : %r", self.dir)
 
-        atexit.register(self.close)
         #  locale.setlocale(locale.LC_ALL, "en_US")
         locale.setlocale(locale.LC_ALL, "en_US.UTF-8")
 
@@ -218,12 +240,7 @@ class iTunesDbToHtml:
     def Connect(self):
         logging.info("Connecting to db")
         if self.conn is None:
-            self.conn = MySQLdb.connect(
-                host=self.config.get("client", "host"),
-                db=self.config.get("client", "database"),
-                user=self.config.get("client", "user"),
-                passwd=self.config.get("client", "password"),
-            )
+            self.conn = itdbstore.connect(self.config)
             self.cursor = self.conn.cursor()
         self.filesTemplate.index = self.getTracksIndex()
         self.filesTemplateM3u.index = self.getTracksIndex()
@@ -262,46 +279,31 @@ class iTunesDbToHtml:
         return [row[0] for row in rows]
 
     def getGenresData(self):
-        self.cursor.execute(
-            "SELECT "
-            "CASE WHEN ISNULL(Genre) THEN '' ELSE Genre END"
-            " AS DaGenre, "
-            "CASE WHEN ISNULL(Rating) THEN 0 "
-            "ELSE FLOOR(Rating/20) END "
-            " AS Stars, "
-            "COUNT(*) "
-            "FROM tracks "
-            "WHERE User_ID=%d "
-            "GROUP BY DaGenre, Stars" % self.userId
-        )
+        # itdbloader.py worked out the counts, Genre_ID 0 is no genre
+        self.cursor.execute(itdbqueries.GENRES % {"user": self.userId})
         genres = {}
         row = self.cursor.fetchone()
         while row:
             if row[0] not in genres:
                 genres[row[0]] = Grouping(row[0], "genre")
-            genres[row[0]].addStars(row[1], row[2])
+            genres[row[0]].addStars(*row[1:])
             row = self.cursor.fetchone()
         return list(genres.values())
 
     def getThingData(self, thing):
-        userId = self.userId
+        column, table, stats = DIMENSIONS[thing.lower()]
 
+        # the tracks with no artist/album (id 0) have no name so they're left out
         self.cursor.execute(
-            "SELECT %(thing)s, "
-            "CASE WHEN ISNULL(Rating) THEN 0 "
-            "ELSE FLOOR(Rating/20) END as Stars, "
-            "COUNT(*) as count FROM tracks "
-            "WHERE User_ID=%(userId)d "
-            "AND %(thing)s IS NOT NULL "
-            "AND LENGTH(%(thing)s) != 0 "
-            "GROUP BY %(thing)s, Stars " % locals()
+            itdbqueries.DIMENSION_STARS
+            % {"stats": stats, "table": table, "column": column, "user": self.userId}
         )
         things = {}
         row = self.cursor.fetchone()
         while row:
             if row[0] not in things:
                 things[row[0]] = Grouping(row[0], "genre")
-            things[row[0]].addStars(row[1], row[2])
+            things[row[0]].addStars(*row[1:])
             row = self.cursor.fetchone()
 
         things = list(things.values())
@@ -313,13 +315,27 @@ class iTunesDbToHtml:
             "SELECT "
             "CASE WHEN ISNULL(Rating) THEN 0 "
             "ELSE FLOOR(Rating/20) END as Stars "
-            ", COUNT(*) FROM tracks WHERE User_ID = %d AND %s "
+            ", COUNT(*), SUM(Size), SUM(Total_Time) "
+            "FROM tracks WHERE User_ID = %d AND %s "
             "GROUP BY Rating ORDER BY Rating" % (self.userId, where)
         )
         self.cursor.execute(sql)
         tracks = self.cursor.fetchall()
         for track in tracks:
-            thing.addStars(track[0], track[1])
+            thing.addStars(*track)
+
+    def getStarsFromStats(self, thing):
+        """getStarsFromDb but from the stats itdbloader.py already worked out."""
+        column, table, stats = DIMENSIONS[thing.type.lower()]
+        params = {"stats": stats, "table": table, "column": column, "user": self.userId}
+        if thing.name:
+            params["name"] = itdbstore.escape_string(self.config, thing.name)
+            sql = itdbqueries.NAMED_STARS % params
+        else:
+            sql = itdbqueries.UNNAMED_STARS % params
+        self.cursor.execute(sql)
+        for row in self.cursor.fetchall():
+            thing.addStars(*row)
 
     def writeTrackList(self, title, thing, where=None, tracks=None):
         """You can call this with a list of tracks, or a where clause for the db
@@ -328,10 +344,7 @@ class iTunesDbToHtml:
         filename = self.GetThingFilename(thing)
         if where:
             logging.debug("Writing: %s for %s", os.path.basename(filename), where)
-            sql = "SELECT * FROM tracks WHERE User_ID = %d AND %s ORDER BY Name" % (
-                self.userId,
-                where,
-            )
+            sql = itdbqueries.TRACKS_WHERE % {"user": self.userId, "where": where}
             self.cursor.execute(sql)
             tracks = self.cursor.fetchall()
         elif tracks == None:
@@ -364,38 +377,40 @@ class iTunesDbToHtml:
         for dir in ["album", "artist", "playlist", "genre"]:
             self.RMRF(os.path.join(base, dir))
 
+    @itdbtrace.LogRuntime()
     def WriteStats(self):
         logging.info("Writing Stats")
         self.Connect()
         # get the number of tracks, albums, artists
         totals = {}
+        # every track is in one row of genre_stats (Genre_ID 0 if it has no genre)
         totals["track"] = self.getSqlInt(
-            "SELECT COUNT(*) FROM tracks " "WHERE User_ID=%d" % self.userId
+            "SELECT COALESCE(SUM(Count), 0) FROM genre_stats "
+            "WHERE User_ID=%d" % self.userId
         )
         totals["album"] = self.getSqlInt(
-            "SELECT COUNT(DISTINCT(Album)) "
-            "FROM tracks "
-            "WHERE User_ID=%d" % self.userId
+            "SELECT COUNT(DISTINCT(Album_ID)) "
+            "FROM album_stats "
+            "WHERE User_ID=%d AND Album_ID != 0" % self.userId
         )
         totals["artist"] = self.getSqlInt(
-            "SELECT COUNT(DISTINCT(Artist)) "
-            "FROM tracks "
-            "WHERE User_ID=%d" % self.userId
+            "SELECT COUNT(DISTINCT(Artist_ID)) "
+            "FROM artist_stats "
+            "WHERE User_ID=%d AND Artist_ID != 0" % self.userId
         )
 
         ratings = [0, 0, 0, 0, 0, 0]
 
         self.cursor.execute(
-            "SELECT COUNT(*) AS Count, "
-            "CASE WHEN ISNULL(Rating) THEN 0 "
-            "ELSE FLOOR(Rating/20) END as Stars "
-            "FROM tracks "
+            "SELECT SUM(Count) AS Count, "
+            "FLOOR(Rating/20) as Stars "
+            "FROM genre_stats "
             "WHERE User_ID=%d "
             "GROUP BY Stars" % self.userId
         )
         rows = self.cursor.fetchall()
         for row in rows:
-            ratings[row[1]] = row[0]
+            ratings[int(row[1])] = int(row[0])
 
         ratingspercent = []
         for x in range(0, 6):
@@ -460,10 +475,7 @@ class iTunesDbToHtml:
     def getPlaylists(self):
         playlists = []
         rows = []
-        self.cursor.execute(
-            "SELECT Name, Playlist_ID FROM playlists "
-            "WHERE User_ID = %d" % self.userId
-        )
+        self.cursor.execute(itdbqueries.PLAYLISTS % {"user": self.userId})
         row = self.cursor.fetchone()
         while row:
             rows.append((str(row[0]), int(row[1])))
@@ -477,47 +489,46 @@ class iTunesDbToHtml:
 
     def getPlaylistStats(self, thing, playlistId):
         """This gets all the tracks and the stats about the tracks from one query"""
-        sql = (
-            "SELECT "
-            "CASE WHEN ISNULL(Rating) THEN 0 "
-            "ELSE FLOOR(Rating/20) END as Stars "
-            ", SUM(Count) FROM playlist_stats WHERE "
-            "User_ID = %d AND Playlist_ID = %d "
-            "GROUP BY Stars" % (self.userId, playlistId)
-        )
+        sql = itdbqueries.PLAYLIST_STARS % {"user": self.userId, "playlist": playlistId}
         self.cursor.execute(sql)
         stats = self.cursor.fetchall()
         for stat in stats:
-            thing.addStars(stat[0], stat[1])
+            thing.addStars(*stat)
 
         return thing
 
+    @itdbtrace.LogRuntime()
     def writePlaylist(self, thing):
         self.Connect()
         # find the ID for this playlist
         playlist_id = self.getSqlInt(
-            "SELECT Playlist_ID FROM playlists WHERE "
-            "User_ID = %d AND Name = '%s' "
-            % (self.userId, MySQLdb.escape_string(thing.name))
+            itdbqueries.PLAYLIST_ID
+            % {
+                "user": self.userId,
+                "name": itdbstore.escape_string(self.config, thing.name),
+            }
         )
         return self.getPlaylist(thing, playlist_id)
 
     def getPlaylist(self, thing, playlist_id):
         """This gets all the tracks and the stats about the tracks from one query"""
         logging.debug("Writing playlist: %s (ID:%d)", thing.name, playlist_id)
-        sql = (
-            "SELECT * FROM tracks "
-            "INNER JOIN playlist_tracks "
-            "ON tracks.Track_ID = playlist_tracks.Track_ID "
-            "AND tracks.User_ID = playlist_tracks.User_ID "
-            "WHERE playlist_tracks.Playlist_ID = '%d' "
-            "AND tracks.User_ID = %d" % (playlist_id, self.userId)
-        )
+        params = {"user": self.userId, "playlist": playlist_id}
+        folder = self.getSqlInt(itdbqueries.PLAYLIST_FOLDER % params)
+        if folder:
+            # every track in any playlist in the folder (however deep), once
+            sql = itdbqueries.FOLDER_TRACKS % params
+        else:
+            sql = itdbqueries.PLAYLIST_TRACKS % params
         if thing.num_stars is not None:
             sql += " AND FLOOR(Rating/20) = %d" % thing.num_stars
         self.cursor.execute(sql)
         arr = self.cursor.fetchall()
+        if not folder:
+            track_id = [x[0] for x in self.cursor.description].index("Track_ID")
+            arr = self.inPlaylistOrder(arr, playlist_id, track_id)
 
+        # itdbloader.py counts folders the same way
         self.getPlaylistStats(thing, playlist_id)
 
         # write out the tracklist
@@ -526,6 +537,20 @@ class iTunesDbToHtml:
 
         return filename
 
+    def inPlaylistOrder(self, rows, playlist_id, track_id):
+        """The tracks rows (Track_ID is column track_id) in the playlist's order."""
+        self.cursor.execute(
+            itdbqueries.PLAYLIST_ORDER % {"user": self.userId, "playlist": playlist_id}
+        )
+        items = self.cursor.fetchone()
+        if not items:
+            # loaded before there was a playlist_items table
+            return rows
+        return itdbstore.in_playlist_order(
+            rows, itdbstore.unpack_track_ids(items[0]), lambda row: row[track_id]
+        )
+
+    @itdbtrace.LogRuntime()
     def WritePlaylistsAsM3u(self):
         self.filesTemplate = self.filesTemplateM3u
         playlists = self.getPlaylists()
@@ -534,16 +559,30 @@ class iTunesDbToHtml:
             playlist.extension = ".m3u"
             print(self.writePlaylist(playlist))
 
+    @itdbtrace.LogRuntime()
     def writeThing(self, thing):
         logging.info("Writing %s %s" % (thing.type, thing.name))
         self.Connect()
         # make sure genres directort exists
         count = 0
         column = thing.type  # e.g. genre
-        sqlname = MySQLdb.escape_string(thing.name)
+        sqlname = itdbstore.escape_string(self.config, thing.name)
         htmlname = cgi.escape(thing.name)
-        where = "%(column)s='%(sqlname)s'" % locals()
-        self.getStarsFromDb(thing, where)
+        if column.lower() in DIMENSIONS:
+            key, table, _ = DIMENSIONS[column.lower()]
+            if thing.name:
+                where = itdbqueries.IN_DIMENSION % {
+                    "column": key,
+                    "table": table,
+                    "user": self.userId,
+                    "name": sqlname,
+                }
+            else:
+                where = "%s IS NULL" % key
+            self.getStarsFromStats(thing)
+        else:
+            where = "%(column)s='%(sqlname)s'" % locals()
+            self.getStarsFromDb(thing, where)
         if thing.num_stars is not None:
             where += " AND FLOOR(Rating/20) = %d" % thing.num_stars
         filename = self.writeTrackList(
@@ -606,7 +645,7 @@ def CgiMain(it):
     for x in ["genre", "playlist", "album", "artist", "edit", "stat"]:
         if x in form:
             type = x
-            name = MySQLdb.escape_string(form[x].value)
+            name = itdbstore.escape_string(it.config, form[x].value)
             break
 
     if type in ["genre", "artist", "album"]:
@@ -667,6 +706,7 @@ if __name__ == "__main__":
     # config.set("webserver", "start", "false")
 
     it = iTunesDbToHtml(config)
+    atexit.register(it.close)
 
     runascgi = True
     for opt, arg in opts:
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# Copyright 2026 Alex K (wtwf.com)
+# PYTHON_ARGCOMPLETE_OK
+
+"""Time each stage of itdbloader on made up libraries of a few sizes.
+
+The libraries come from itdbgenerate (and are kept in --dir so the next
+run doesn't have to make them again). Each size is loaded twice into a
+scratch SQLite file (or the database in --config): once to time the
+stages and once with tracemalloc on to find each stage's peak memory.
+"""
+
+__author__ = "wtwf.com (Alex K)"
+
+import argparse
+import atexit
+import functools
+import json
+import logging
+import os
+import tempfile
+import tracemalloc
+
+import argcomplete
+
+import itdbgenerate
+import itdbloader
+import itdbtrace
+
+# the DbLoader methods to time, load_csv runs inside load_tracks and load_playlists
+LOADER_STAGES = (
+    "load_tracks",
+    "load_playlists",
+    "load_csv",
+    "load_all_playlist_stats",
+)
+DEFAULT_SIZES = "10000,100000,500000"
+
+
+def bench_loader():
+    """A DbLoader with a span named after each of LOADER_STAGES."""
+
+    def wrap(name, func):
+        @functools.wraps(func)
+        def wrapped(*args, **kwargs):
+            with itdbtrace.span(name):
+                return func(*args, **kwargs)
+
+        return wrapped
+
+    methods = {
+        name: wrap(name, getattr(itdbloader.DbLoader, name)) for name in LOADER_STAGES
+    }
+    return type("BenchLoader", (itdbloader.DbLoader,), methods)
+
+
+def get_library(directory, size, seed):
+    filename = os.path.join(directory, "itdbbench_%d_%d.xml" % (size, seed))
+    if not os.path.exists(filename):
+        os.makedirs(directory, exist_ok=True)
+        print("Generating %s" % filename)
+        itdbgenerate.generate(filename, size, seed=seed)
+    return filename
+
+
+def get_config(args, directory):
+    """The loader's config, pointed at a new SQLite file unless --config was given."""
+    config = itdbloader.get_config()
+    if args.config:
+        config.read(args.config)
+    else:
+        if not config.has_section("storage"):
+            config.add_section("storage")
+        config.set("storage", "backend", "sqlite")
+        config.set("storage", "path", os.path.join(directory, "itdbbench.sqlite"))
+    if not config.has_section("user"):
+        config.add_section("user")
+    config.set("user", "id", str(args.user))
+    for option in ("incremental", "shadow", "showmax"):
+        config.set("loader", option, "no")
+    return config
+
+
+def run(xmlfile, config, trace_memory):
+    """Load xmlfile once, returns the itdbtrace summary of each stage."""
+    itdbtrace.TRACER.reset()
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        with itdbtrace.span("load_xml"):
+            library = itdbloader.load_xml(xmlfile)
+            for _ in library.tracks():
+                pass
+            for _ in library.playlists():
+                pass
+        loader = bench_loader()(config, itdbloader.load_xml(xmlfile))
+        loader.close()
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return itdbtrace.TRACER.summary()
+
+
+def bench(args):
+    """Run every size and return a list of result dicts."""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="itdbbench_") as scratch:
+        for size in [int(x) for x in args.sizes.split(",")]:
+            xmlfile = get_library(args.dir, size, args.seed)
+            megabytes = os.path.getsize(xmlfile) / 1e6
+            config = get_config(args, scratch)
+            if not args.config:
+                # start from an empty database every time
+                path = config.get("storage", "path")
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+            timed = run(xmlfile, config, False)
+            traced = None if args.no_memory else run(xmlfile, config, True)
+            for name in ("load_xml",) + LOADER_STAGES:
+                seconds = timed[name]["seconds"]
+                result = {
+                    "tracks": size,
+                    "stage": name,
+                    "calls": timed[name]["calls"],
+                    "seconds": round(seconds, 4),
+                    "tracks_per_second": round(size / seconds) if seconds else None,
+                    "peak_bytes": traced[name]["peak_memory"] if traced else None,
+                }
+                if name == "load_xml":
+                    result["megabytes_per_second"] = round(megabytes / seconds, 1)
+                results.append(result)
+    return results
+
+
+def show_results(results):
+    print(
+        "\n%8s  %-24s %5s %10s %10s %10s"
+        % ("tracks", "stage", "calls", "seconds", "tracks/s", "peak MB")
+    )
+    for result in results:
+        peak = result["peak_bytes"]
+        print(
+            "%8d  %-24s %5d %10.3f %10s %10s"
+            % (
+                result["tracks"],
+                result["stage"],
+                result["calls"],
+                result["seconds"],
+                result["tracks_per_second"] or "-",
+                "-" if peak is None else "%.1f" % (peak / 1e6),
+            )
+        )
+
+
+def main():
+    """Parse args and do the thing."""
+    logging.basicConfig()
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark itdbloader on made up libraries."
+    )
+    parser.add_argument(
+        "-s",
+        "--sizes",
+        help="Comma separated numbers of tracks (default %s)" % DEFAULT_SIZES,
+        default=DEFAULT_SIZES,
+    )
+    parser.add_argument(
+        "--dir",
+        help="Where to keep the generated libraries",
+        default=os.path.join(tempfile.gettempdir(), "itdbbench"),
+    )
+    parser.add_argument(
+        "-c",
+        "--config",
+        help="Load into the database in this itdb config instead of a scratch SQLite file",
+    )
+    parser.add_argument(
+        "-u",
+        "--user",
+        help="User_ID to load as (its rows get replaced)",
+        type=int,
+        default=9999,
+    )
+    parser.add_argument("--seed", help="Random seed", type=int, default=0)
+    parser.add_argument(
+        "--no-memory", help="Don't measure peak memory", action="store_true"
+    )
+    parser.add_argument("-j", "--json", help="Also write the results to this file")
+    parser.add_argument("-v", "--verbose", help="Log verbosely", action="store_true")
+
+    argcomplete.autocomplete(parser)
+    args = parser.parse_args()
+
+    if args.verbose:
+        logging.getLogger().setLevel(logging.INFO)
+    # the loader's own runtimes would just repeat ours
+    atexit.unregister(itdbtrace.show_runtimes)
+
+    results = bench(args)
+    show_results(results)
+    if args.json:
+        with open(args.json, "w") as outfile:
+            json.dump(results, outfile, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+# Copyright 2026 Alex K (wtwf.com)
+# PYTHON_ARGCOMPLETE_OK
+
+"""Make up an iTunes library xml file of any size.
+
+The tracks have artists, albums, genres, unicode and xml special
+characters in their names and only some of the optional keys, and the
+playlists include the built in ones, smart playlists and nested folders,
+so it looks enough like a real library to test and benchmark the loader
+without needing anyone's real one. The same seed always makes the same
+library.
+"""
+
+__author__ = "wtwf.com (Alex K)"
+
+import argparse
+import base64
+import datetime
+import logging
+import random
+import string
+import urllib.parse
+from xml.sax.saxutils import escape
+
+import argcomplete
+
+HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">
+<plist version="1.0">
+<dict>
+"""
+FOOTER = "</dict>\n</plist>\n"
+
+MUSIC_FOLDER = "file:///Users/itdb/Music/iTunes/iTunes%20Media/"
+
+WORDS = (
+    "love",
+    "night",
+    "blue",
+    "heart",
+    "dance",
+    "rain",
+    "fire",
+    "summer",
+    "road",
+    "dream",
+    "city",
+    "light",
+    "river",
+    "gold",
+    "ghost",
+    "garden",
+    "Beyoncé",
+    "Björk",
+    "naïve",
+    "Straße",
+    "café",
+    "Ærøskøbing",
+    "Москва",
+    "東京",
+    "사랑",
+    "أغنية",
+    "Ελλάδα",
+    "😀",
+    "&",
+    "<Live>",
+    '"Remix"',
+    "it's",
+)
+GENRES = (
+    "Rock",
+    "Pop",
+    "Alternative",
+    "Electronic",
+    "Hip-Hop/Rap",
+    "Jazz",
+    "Classical",
+    "Country",
+    "R&B/Soul",
+    "Reggae",
+    "Blues",
+    "Folk",
+    "Metal",
+    "Soundtrack",
+    "World",
+    "J-Pop",
+    "K-Pop",
+    "Música Popular Brasileira",
+    "Électronique",
+    "Podcast",
+)
+KINDS = (
+    ("MPEG audio file", "mp3", 0.6),
+    ("AAC audio file", "m4a", 0.2),
+    ("Purchased AAC audio file", "m4a", 0.1),
+    ("Apple Lossless audio file", "m4a", 0.1),
+)
+# playlists every library has, with their Distinguished Kind
+BUILT_IN_PLAYLISTS = (("Music", 4), ("Movies", 2), ("TV Shows", 3), ("Podcasts", 10))
+
+
+class Generator:
+    """Makes up tracks and playlists and writes them out as plist xml."""
+
+    def __init__(self, num_tracks, num_playlists=None, seed=0):
+        self.random = random.Random(seed)
+        self.num_tracks = num_tracks
+        if num_playlists is None:
+            num_playlists = max(10, num_tracks // 500)
+        self.num_playlists = num_playlists
+        self.start = datetime.datetime(2006, 3, 5, 10, 32, 41)
+        self.persistent_ids = set()
+        self.artists = [
+            string.capwords(self.words(1, 3)) for _ in range(max(1, num_tracks // 12))
+        ]
+
+    def words(self, low, high):
+        return " ".join(
+            self.random.choice(WORDS) for _ in range(self.random.randint(low, high))
+        )
+
+    def persistent_id(self):
+        while True:
+            value = "%016X" % self.random.getrandbits(64)
+            if value not in self.persistent_ids:
+                self.persistent_ids.add(value)
+                return value
+
+    def date(self, after=None):
+        after = after or self.start
+        days = (datetime.datetime(2026, 1, 1) - after).days
+        return after + datetime.timedelta(
+            days=self.random.randint(0, max(0, days)),
+            seconds=self.random.randint(0, 86399),
+        )
+
+    def tracks(self):
+        """Yield (track id, track dict), a whole album at a time."""
+        track_id = 1000
+        made = 0
+        while made < self.num_tracks:
+            artist = self.random.choice(self.artists)
+            album = string.capwords(self.words(1, 4))
+            genre = self.random.choice(GENRES)
+            year = self.random.randint(1960, 2025)
+            compilation = self.random.random() < 0.05
+            count = min(self.random.randint(1, 18), self.num_tracks - made)
+            for number in range(1, count + 1):
+                track_id += 2
+                made += 1
+                yield track_id, self.track(
+                    track_id, artist, album, genre, year, compilation, number, count
+                )
+
+    def track(self, track_id, artist, album, genre, year, compilation, number, count):
+        rnd = self.random.random
+        kind, extension, _ = self.random.choices(KINDS, [x[2] for x in KINDS])[0]
+        name = self.words(1, 5).capitalize()
+        added = self.date()
+        track = {
+            "Track ID": track_id,
+            "Name": name,
+            "Artist": artist,
+            "Album": album,
+            "Genre": genre,
+            "Kind": kind,
+            "Size": self.random.randint(1_000_000, 20_000_000),
+            "Total Time": self.random.randint(30_000, 600_000),
+            "Track Number": number,
+            "Track Count": count,
+            "Date Modified": self.date(added),
+            "Date Added": added,
+            "Bit Rate": self.random.choice((128, 192, 256, 320)),
+            "Sample Rate": 44100,
+            "Persistent ID": self.persistent_id(),
+            "Track Type": "File",
+            "File Folder Count": 5,
+            "Library Folder Count": 1,
+        }
+        if rnd() < 0.9:
+            track["Year"] = year
+        if rnd() < 0.5:
+            track["Album Artist"] = "Various Artists" if compilation else artist
+        if compilation:
+            track["Compilation"] = True
+        if rnd() < 0.5:
+            track["Disc Number"] = 1
+            track["Disc Count"] = self.random.choice((1, 1, 1, 2))
+        if rnd() < 0.3:
+            track["Composer"] = string.capwords(self.words(1, 2))
+        if rnd() < 0.1:
+            track["Comments"] = self.words(2, 12)
+        if rnd() < 0.1:
+            track["Sort Name"] = name.lower()
+            track["Sort Artist"] = artist.lower()
+        if rnd() < 0.1:
+            track["BPM"] = self.random.randint(60, 180)
+        if rnd() < 0.7:
+            played = self.date(added)
+            track["Play Count"] = self.random.randint(1, 500)
+            # Play Date is seconds since 1904 like the Mac's clock
+            track["Play Date"] = int(
+                (played - datetime.datetime(1904, 1, 1)).total_seconds()
+            )
+            track["Play Date UTC"] = played
+        if rnd() < 0.15:
+            track["Skip Count"] = self.random.randint(1, 20)
+            track["Skip Date"] = self.date(added)
+        if rnd() < 0.6:
+            track["Rating"] = self.random.randint(1, 5) * 20
+        if rnd() < 0.3:
+            track["Album Rating"] = self.random.randint(1, 5) * 20
+            track["Album Rating Computed"] = True
+        if rnd() < 0.05:
+            track["Loved"] = True
+        if rnd() < 0.02:
+            track["Disabled"] = True
+        if rnd() < 0.03:
+            track["Explicit"] = True
+        if kind.startswith("Purchased"):
+            track["Purchased"] = True
+            track["Release Date"] = datetime.datetime(year, 1, 1, 12)
+        track["Location"] = MUSIC_FOLDER + urllib.parse.quote(
+            "Music/%s/%s/%02d %s.%s" % (artist, album, number, name, extension)
+        )
+        return track
+
+    def playlists(self, track_ids):
+        """Yield playlist dicts: the library, the built in ones, folders and the rest."""
+        playlist_id = track_ids[-1] + 2 if track_ids else 1000
+        library_id = self.persistent_id()
+        yield {
+            "Name": "Library",
+            "Master": True,
+            "Playlist ID": playlist_id,
+            "Playlist Persistent ID": library_id,
+            "Visible": False,
+            "All Items": True,
+            "Playlist Items": track_ids,
+        }
+        for name, kind in BUILT_IN_PLAYLISTS:
+            playlist_id += 2
+            playlist = {
+                "Name": name,
+                "Playlist ID": playlist_id,
+                "Playlist Persistent ID": self.persistent_id(),
+                "Distinguished Kind": kind,
+                "All Items": True,
+            }
+            if kind == 4:
+                playlist["Music"] = True
+                playlist["Playlist Items"] = track_ids
+            yield playlist
+
+        folders = []
+        for number in range(self.num_playlists):
+            playlist_id += 2
+            playlist = {
+                "Name": string.capwords(self.words(1, 4)),
+                "Playlist ID": playlist_id,
+                "Playlist Persistent ID": self.persistent_id(),
+                "All Items": True,
+            }
+            if folders and self.random.random() < 0.6:
+                playlist["Parent Persistent ID"] = self.random.choice(folders)
+            if number % 8 == 0:
+                # folders go up to about 3 deep
+                playlist["Folder"] = True
+                if len(folders) < 3 or "Parent Persistent ID" not in playlist:
+                    folders.append(playlist["Playlist Persistent ID"])
+            elif track_ids:
+                if self.random.random() < 0.3:
+                    playlist["Smart Info"] = self.random.randbytes(24)
+                    playlist["Smart Criteria"] = self.random.randbytes(64)
+                size = min(len(track_ids), int(self.random.paretovariate(1.2) * 20))
+                items = self.random.sample(track_ids, size)
+                if self.random.random() < 0.5:
+                    items.sort()
+                playlist["Playlist Items"] = items
+            yield playlist
+
+    def write(self, outfile):
+        """Write the library to a text file, returns (tracks, playlists, items)."""
+        outfile.write(HEADER)
+        for key, value in (
+            ("Major Version", 1),
+            ("Minor Version", 1),
+            ("Date", datetime.datetime(2026, 1, 1)),
+            ("Application Version", "12.13.2.3"),
+            ("Features", 5),
+            ("Show Content Ratings", True),
+        ):
+            write_value(outfile, value, key, "\t")
+        outfile.write("\t<key>Tracks</key>\n\t<dict>\n")
+        track_ids = []
+        for track_id, track in self.tracks():
+            track_ids.append(track_id)
+            write_value(outfile, track, str(track_id), "\t\t")
+        outfile.write("\t</dict>\n\t<key>Playlists</key>\n\t<array>\n")
+        playlists = items = 0
+        for playlist in self.playlists(track_ids):
+            playlists += 1
+            if "Playlist Items" in playlist:
+                items += len(playlist["Playlist Items"])
+                playlist["Playlist Items"] = [
+                    {"Track ID": x} for x in playlist["Playlist Items"]
+                ]
+            write_value(outfile, playlist, None, "\t\t")
+        outfile.write("\t</array>\n")
+        write_value(outfile, MUSIC_FOLDER, "Music Folder", "\t")
+        write_value(outfile, self.persistent_id(), "Library Persistent ID", "\t")
+        outfile.write(FOOTER)
+        return len(track_ids), playlists, items
+
+
+def write_value(outfile, value, key=None, indent=""):
+    """Write value as plist xml, the way iTunes lays it out."""
+    if key is not None:
+        outfile.write("%s<key>%s</key>" % (indent, escape(key)))
+    else:
+        outfile.write(indent)
+    if isinstance(value, bool):
+        outfile.write(value and "<true/>\n" or "<false/>\n")
+    elif isinstance(value, int):
+        outfile.write("<integer>%d</integer>\n" % value)
+    elif isinstance(value, str):
+        outfile.write("<string>%s</string>\n" % escape(value))
+    elif isinstance(value, datetime.datetime):
+        outfile.write("<date>%s</date>\n" % value.strftime("%Y-%m-%dT%H:%M:%SZ"))
+    elif isinstance(value, bytes):
+        outfile.write("<data>%s</data>\n" % base64.b64encode(value).decode("ascii"))
+    elif isinstance(value, dict):
+        outfile.write("\n%s<dict>\n" % indent if key is not None else "<dict>\n")
+        for child_key, child in value.items():
+            write_value(outfile, child, child_key, indent + "\t")
+        outfile.write("%s</dict>\n" % indent)
+    elif isinstance(value, list):
+        outfile.write("\n%s<array>\n" % indent if key is not None else "<array>\n")
+        for child in value:
+            write_value(outfile, child, None, indent + "\t")
+        outfile.write("%s</array>\n" % indent)
+    else:
+        raise TypeError("Can't write %r as plist" % value)
+
+
+def generate(filename, num_tracks, num_playlists=None, seed=0):
+    """Write a made up library to filename, returns (tracks, playlists, items)."""
+    logging.info("Generating %d tracks into %s", num_tracks, filename)
+    with open(filename, "w", encoding="utf-8") as outfile:
+        return Generator(num_tracks, num_playlists, seed).write(outfile)
+
+
+def main():
+    """Parse args and do the thing."""
+    logging.basicConfig()
+
+    parser = argparse.ArgumentParser(description="Make up an iTunes library xml file.")
+    parser.add_argument("filename", help="Where to write the xml")
+    parser.add_argument(
+        "-t", "--tracks", help="How many tracks", type=int, default=10000
+    )
+    parser.add_argument(
+        "-p",
+        "--playlists",
+        help="How many playlists (and folders), default is one per 500 tracks",
+        type=int,
+    )
+    parser.add_argument("-s", "--seed", help="Random seed", type=int, default=0)
+    parser.add_argument("-v", "--verbose", help="Log verbosely", action="store_true")
+
+    argcomplete.autocomplete(parser)
+    args = parser.parse_args()
+
+    if args.verbose:
+        logging.getLogger().setLevel(logging.INFO)
+
+    tracks, playlists, items = generate(
+        args.filename, args.tracks, args.playlists, args.seed
+    )
+    print(
+        "%s: %d tracks, %d playlists, %d playlist items"
+        % (args.filename, tracks, playlists, items)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# Copyright 2026 Alex K (wtwf.com)
+# PYTHON_ARGCOMPLETE_OK
+
+"""Check that the queries the itdb tools run use the indexes in itdb.sql.
+
+The secondary indexes live in itdb.sql as CREATE INDEX statements (so a
+new database gets them) and itdbloader.py drops them for a full load and
+puts them back afterwards. This runs EXPLAIN (EXPLAIN QUERY PLAN on
+SQLite) on each of the web ui's and the tools' queries and says which
+index each table is read with, or that it's read with a full scan.
+"""
+
+__author__ = "wtwf.com (Alex K)"
+
+import argparse
+import collections
+import configparser
+import logging
+import os
+import re
+import sys
+
+import argcomplete
+
+import itdbqueries
+import itdbstore
+
+CREATE_INDEX_RE = re.compile(
+    r"^\s*CREATE\s+(?P<kind>UNIQUE\s+|FULLTEXT\s+)?INDEX\s+(?P<name>\w+)\s+"
+    r"ON\s+(?P<table>\w+)\s*\((?P<columns>(?:[^()]|\(\d+\))*)\)\s*;",
+    re.IGNORECASE | re.MULTILINE,
+)
+# sqlite's EXPLAIN QUERY PLAN: SCAN tracks or SEARCH tracks USING INDEX x (...)
+SQLITE_PLAN_RE = re.compile(
+    r"^(?P<how>SCAN|SEARCH)\s+(?:TABLE\s+)?(?P<table>\w+)"
+    r"(?:\s+AS\s+\w+)?(?:\s+USING\s+(?P<automatic>AUTOMATIC\s+)?(?:COVERING\s+)?"
+    r"(?P<index>INTEGER PRIMARY KEY|PRIMARY KEY|INDEX(?:\s+\w+)?))?",
+    re.IGNORECASE,
+)
+# sqlite runs a subquery in FROM into a temporary table first
+SUBQUERY_RE = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE)\s+(?P<name>\w+)")
+# what explain says a subquery's rows are read with
+SUBQUERY = "(subquery)"
+
+# made up values for the parts of the queries that change
+SAMPLE_NAME = "Something"
+SAMPLE_PLAYLIST_ID = 1
+# (stats table, names table, id column) of each of the groupings
+GROUPINGS = (
+    ("genre_stats", "genres", "Genre_ID"),
+    ("artist_stats", "artists", "Artist_ID"),
+    ("album_stats", "albums", "Album_ID"),
+)
+
+
+def known_queries(user):
+    """(name, sql) for the queries the web ui and the tools run.
+
+    They're the strings from itdbqueries that the tools use, filled in
+    with made up values.
+    """
+    params = {"user": user, "name": SAMPLE_NAME, "playlist": SAMPLE_PLAYLIST_ID}
+    tables = {x: x for x in ("tracks", "playlist_folders", "playlist_tracks")}
+    queries = [
+        (
+            "itdbloader playlist_stats",
+            itdbqueries.PLAYLIST_STATS
+            % dict(params, where="AND playlist_folders.Folder_ID IN (1)", **tables),
+        ),
+        ("itdb2html genres", itdbqueries.GENRES % params),
+        ("itdb2html playlists", itdbqueries.PLAYLISTS % params),
+        ("itdb2html playlist id", itdbqueries.PLAYLIST_ID % params),
+        ("itdb2html playlist folder", itdbqueries.PLAYLIST_FOLDER % params),
+        ("itdb2html playlist page", itdbqueries.PLAYLIST_TRACKS % params),
+        ("itdb2html folder page", itdbqueries.FOLDER_TRACKS % params),
+        ("itdb2html playlist order", itdbqueries.PLAYLIST_ORDER % params),
+        ("itdb2html playlist stars", itdbqueries.PLAYLIST_STARS % params),
+    ]
+    for stats, table, column in GROUPINGS:
+        grouping = dict(params, stats=stats, table=table, column=column, **tables)
+        thing = table[:-1]
+        queries.extend(
+            [
+                ("itdbloader %s" % stats, itdbqueries.GROUPING_STATS % grouping),
+                ("itdb2html %ss" % thing, itdbqueries.DIMENSION_STARS % grouping),
+                ("itdb2html %s stars" % thing, itdbqueries.NAMED_STARS % grouping),
+                ("itdb2html no %s stars" % thing, itdbqueries.UNNAMED_STARS % grouping),
+                (
+                    "itdb2html %s page" % thing,
+                    itdbqueries.TRACKS_WHERE
+                    % dict(params, where=itdbqueries.IN_DIMENSION % grouping),
+                ),
+            ]
+        )
+    name = "'%s'" % SAMPLE_NAME
+    queries.extend(
+        [
+            ("playlistlinks playlist id", itdbqueries.LINKS_PLAYLIST_ID % name),
+            ("playlistlinks folder", itdbqueries.LINKS_FOLDER_PLAYLISTS % name),
+            ("playlistlinks folder tracks", itdbqueries.LINKS_FOLDER_TRACKS % name),
+            (
+                "playlistlinks playlist tracks",
+                itdbqueries.LINKS_PLAYLIST_TRACKS % SAMPLE_PLAYLIST_ID,
+            ),
+            (
+                "playlistlinks playlist order",
+                itdbqueries.LINKS_PLAYLIST_ORDER % SAMPLE_PLAYLIST_ID,
+            ),
+        ]
+    )
+    return queries
+
+
+def get_config():
+    config = configparser.ConfigParser()
+    config.read(["itdb.config", os.path.expanduser("~/.itdb.config")])
+    return config
+
+
+def schema_indexes(sql=None):
+    """Map each table to {index name: its definition} from itdb.sql.
+
+    The definitions look like the ones DbLoader.get_secondary_indexes
+    returns, so they can go straight into ALTER TABLE ... ADD.
+    """
+    if sql is None:
+        with open(itdbstore.SCHEMA_FILE) as schema:
+            sql = schema.read()
+    indexes = collections.defaultdict(dict)
+    for match in CREATE_INDEX_RE.finditer(sql):
+        columns = ", ".join(x.strip() for x in match.group("columns").split(","))
+        kind = (match.group("kind") or "").strip().upper()
+        indexes[match.group("table")][match.group("name")] = "%sINDEX %s (%s)" % (
+            kind and kind + " ",
+            match.group("name"),
+            columns,
+        )
+    return dict(indexes)
+
+
+def explain(cursor, config, sql):
+    """[(table, index or None for a full scan), ...] for the query."""
+    if itdbstore.is_sqlite(config):
+        cursor.execute("EXPLAIN QUERY PLAN " + sql)
+        plan = []
+        subqueries = set()
+        for row in cursor.fetchall():
+            match = SUBQUERY_RE.match(row[-1])
+            if match:
+                subqueries.add(match.group("name"))
+                continue
+            match = SQLITE_PLAN_RE.match(row[-1])
+            if not match:
+                continue
+            index = match.group("index")
+            if match.group("table") in subqueries:
+                # reading back the rows of a subquery it already ran
+                index = SUBQUERY
+            elif match.group("automatic"):
+                # sqlite scanned the table to build a throwaway index
+                index = None
+            elif index:
+                index = re.sub(r"(?i)^INDEX\s+", "", index)
+                if index.startswith("sqlite_autoindex_"):
+                    index = "PRIMARY"
+            elif match.group("how").upper() == "SEARCH":
+                index = "PRIMARY"
+            plan.append((match.group("table"), index))
+        return plan
+
+    cursor.execute("EXPLAIN " + sql)
+    names = [x[0] for x in cursor.description]
+    plan = []
+    for row in cursor.fetchall():
+        row = dict(zip(names, row))
+        if not row.get("table"):
+            continue
+        index = row.get("key")
+        if row["table"].startswith("<derived"):
+            index = SUBQUERY
+        elif row.get("type") == "ALL":
+            index = None
+        plan.append((row["table"], index))
+    return plan
+
+
+def check(config, queries=None):
+    """Explain each query, returns how many tables were read with a full scan."""
+    conn = itdbstore.connect(config)
+    cursor = conn.cursor()
+    user_id = int(config.get("user", "id")) if config.has_section("user") else 1
+    scans = 0
+    for name, sql in queries or known_queries(user_id):
+        for table, index in explain(cursor, config, sql):
+            if index:
+                print("%-32s %-16s %s" % (name, table, index))
+            else:
+                scans += 1
+                print("%-32s %-16s FULL SCAN" % (name, table))
+    conn.close()
+    return scans
+
+
+def create_missing(config):
+    """Add any index in itdb.sql the database doesn't have yet."""
+    conn = itdbstore.connect(config)
+    cursor = conn.cursor()
+    for table, indexes in schema_indexes().items():
+        cursor.execute("SHOW INDEX FROM %s" % table)
+        existing = {x[2] for x in cursor.fetchall()}
+        missing = [x for name, x in indexes.items() if name not in existing]
+        if missing:
+            logging.info("Adding %d indexes to %s", len(missing), table)
+            cursor.execute(
+                "ALTER TABLE %s %s" % (table, ", ".join("ADD %s" % x for x in missing))
+            )
+    conn.commit()
+    conn.close()
+
+
+def main():
+    """Parse args and do the thing."""
+    logging.basicConfig()
+
+    parser = argparse.ArgumentParser(
+        description="Show which indexes the itdb queries use."
+    )
+    parser.add_argument(
+        "-c",
+        "--create",
+        help="First add any index in itdb.sql the database is missing",
+        action="store_true",
+    )
+    parser.add_argument("-v", "--verbose", help="Log verbosely", action="store_true")
+
+    argcomplete.autocomplete(parser)
+    args = parser.parse_args()
+
+    if args.verbose:
+        logging.getLogger().setLevel(logging.INFO)
+
+    config = get_config()
+    if args.create:
+        create_missing(config)
+    if check(config):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
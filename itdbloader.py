@@ -9,231 +9,1039 @@ __author__ = "wtwf.com (Alex K)"
 import argparse
 import atexit
 import collections
+import concurrent.futures
 import configparser
+import contextlib
 import csv
-import datetime
+import io
 import logging
 import os
-import plistlib
+import select
 import stat
 import sys
+import tempfile
+import threading
+import time
 
 import argcomplete
-import humanize
 import tqdm
-import MySQLdb
 
 import itdb2html
+import itdbindex
+import itdbmodel
+import itdbplist
+import itdbprofile
+import itdbqueries
+import itdbstore
+import itdbtrace
+import itdbwatch
+
+# columns that tell us a track changed since the last load. iTunes doesn't
+# bump Date Modified when a track is played, skipped or rated.
+TRACK_STATE_COLUMNS = (
+    "Persistent_ID",
+    "Date_Modified",
+    "Play_Count",
+    "Play_Date_UTC",
+    "Skip_Count",
+    "Rating",
+)
+TRACK_STATE_KEYS = tuple(x.replace("_", " ") for x in TRACK_STATE_COLUMNS)
+
+# how LOAD DATA spells NULL
+NULL = "\\N"
+
+# how to write each kind of column in a csv. None means csv.writer's own
+# str() is right: ints are ints, datetimes come out as 2006-03-05 10:32:41
+CONVERTERS = {
+    "bool": lambda value: value and "1" or "0",
+    "int": None,
+    "datetime": None,
+    "str": None,
+}
+
+# most ids we put into one IN (...) clause
+ID_BATCH_SIZE = 1000
+
+# [library:<name>] sections each describe one user's library
+LIBRARY_PREFIX = "library:"
+
+# tables numbering the distinct values of some tracks columns, and their id column
+DIMENSION_TABLES = {
+    "artists": "Artist_ID",
+    "albums": "Album_ID",
+    "genres": "Genre_ID",
+    "kinds": "Kind_ID",
+}
+# (tracks column, the plist key it numbers, the table the numbers are in)
+DIMENSIONS = (
+    ("Artist_ID", "Artist", "artists"),
+    ("Album_Artist_ID", "Album Artist", "artists"),
+    ("Album_ID", "Album", "albums"),
+    ("Genre_ID", "Genre", "genres"),
+    ("Kind_ID", "Kind", "kinds"),
+)
+# playlist_stats for each genre, artist and album, and the tracks column they're by
+GROUPING_STATS = {
+    "genre_stats": "Genre_ID",
+    "artist_stats": "Artist_ID",
+    "album_stats": "Album_ID",
+}
+
+# the tables a load fills in
+LOADED_TABLES = (
+    (
+        "tracks",
+        "playlists",
+        "playlist_tracks",
+        "playlist_items",
+        "playlist_stats",
+        "playlist_folders",
+    )
+    + tuple(DIMENSION_TABLES)
+    + tuple(GROUPING_STATS)
+)
+# shards=N splits these into N csv files loaded over N connections at once
+SHARDED_TABLES = ("tracks", "playlist_tracks")
+# how many rows in a row go to the same shard
+SHARD_ROWS = 1000
+# shadow=yes loads into these copies and then swaps them in
+SHADOW_SUFFIX = "_loading"
 
 
-class LogRuntime:
-    RUNTIMES = collections.defaultdict(list)
-
-    def __init__(self, name=None, args=None, kwargs=None):
-        self.args = args or []
-        self.kwargs = kwargs or []
-        self.name = name
-
-    def __call__(self, func):
-        def wrapped_f(*args, **kwargs):
-            start = datetime.datetime.now()
-            reply = func(*args, **kwargs)
-            delta = start - datetime.datetime.now()
-            description = self.name or func.__name__
-            description += "("
-            description += ", ".join(
-                [args[x] for x in self.args] + [f"{x}={kwargs[x]}" for x in self.kwargs]
-            )
-            description += ")"
-            LogRuntime.RUNTIMES[description].append(delta)
-            return reply
-
-        return wrapped_f
-
-    @staticmethod
-    def show_runtimes():
-        print("\nRuntimes:\n")
-        for desc, deltas in LogRuntime.RUNTIMES.items():
-            duration = ", ".join([humanize.naturaldelta(delta) for delta in deltas])
-            print(f"{desc}: {duration}")
-
-
-atexit.register(LogRuntime.show_runtimes)
+atexit.register(itdbtrace.show_runtimes)
 
 
 def get_config():
     config = configparser.ConfigParser()
     config.add_section("loader")
-    config.set("loader", "showmax", "yes")
+    config.set("loader", "showmax", "no")
+    config.set("loader", "profile", "")
     config.set("loader", "force", "no")
     config.set("loader", "clear", "yes")
+    config.set("loader", "incremental", "no")
+    config.set("loader", "pipeline", "no")
+    config.set("loader", "shadow", "no")
+    config.set("loader", "dropindexes", "no")
+    config.set("loader", "snapshot", "yes")
     config.set("loader", "stats", "yes")
+    config.set("loader", "workers", "1")
+    config.set("loader", "shards", "1")
+    config.set("loader", "parsers", "1")
+    config.set("loader", "poll", "2")
+    config.set("loader", "settle", "5")
     config.read(["itdb.config", os.path.expanduser("~/.itdb.config")])
 
     return config
 
 
-def load_itdb(config):
+def get_libraries(config):
+    """Map the name of each library we load to a config for loading it.
+
+    Every [library:<name>] section gives a user id, an xmlfile and
+    optionally an html dir for that user's .loaded stamp and pages (it
+    defaults to <name> under the [html] dir). With no library sections
+    it's just the one from [user] and [iTunes].
+    """
+    names = [x for x in config.sections() if x.startswith(LIBRARY_PREFIX)]
+    if not names:
+        return {config.get("user", "id"): config}
+    libraries = {}
+    for name in names:
+        library = copy_config(config)
+        if config.has_option("html", "dir"):
+            library.set(
+                "html",
+                "dir",
+                os.path.join(
+                    config.get("html", "dir", raw=True), name[len(LIBRARY_PREFIX) :]
+                ),
+            )
+        for section, option, key in (
+            ("user", "id", "id"),
+            ("iTunes", "xmlfile", "xmlfile"),
+            ("html", "dir", "dir"),
+        ):
+            if config.has_option(name, key):
+                if not library.has_section(section):
+                    library.add_section(section)
+                library.set(section, option, config.get(name, key, raw=True))
+        libraries[name[len(LIBRARY_PREFIX) :]] = library
+    return libraries
+
+
+def copy_config(config):
+    """A copy of config that can be changed (and pickled)."""
+    text = io.StringIO()
+    config.write(text)
+    copy = configparser.ConfigParser()
+    copy.read_string(text.getvalue())
+    return copy
+
+
+def load_libraries(libraries, workers):
+    """Load each library in its own worker process, a few at a time."""
+    for name, config in libraries.items():
+        if config.getboolean("loader", "shadow"):
+            # swapping whole tables would undo the other workers' loads
+            logging.warning("Not using shadow tables for %s in parallel", name)
+            config.set("loader", "shadow", "no")
+        # the other workers' loads need the indexes kept up to date
+        config.set("loader", "dropindexes", "no")
+        # the libraries are already being parsed in parallel
+        config.set("loader", "parsers", "1")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(load_library, name, config): name
+            for name, config in libraries.items()
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                itdbtrace.TRACER.merge(future.result())
+                logging.info("Loaded library: %s", futures[future])
+            except (Exception, SystemExit) as ex:  # pylint: disable=broad-except
+                logging.error("Loading library %s failed: %r", futures[future], ex)
+
+
+def load_library(name, config):
+    """Run in a worker process by load_libraries, returns its trace events."""
+    itdbtrace.TRACER.reset()
+    logging.info("Loading library: %s", name)
+    with itdbtrace.span("load_library(%s)" % name):
+        load_itdb(config)
+    print("\nLibrary: %s" % name)
+    itdbtrace.show_runtimes()
+    return itdbtrace.TRACER.trace_events()
+
+
+def watch(libraries, config):
+    """Load each library whenever its xml changes, until we're killed.
+
+    Each library keeps its database connection and RowEncoder between
+    loads so a change gets into the database as quickly as possible.
+    """
+    warm = {name: WarmLoader(library) for name, library in libraries.items()}
+    xmlfiles = {
+        os.path.abspath(library.get("iTunes", "xmlfile")): name
+        for name, library in libraries.items()
+    }
+    watcher = itdbwatch.Watcher(
+        xmlfiles, config.getfloat("loader", "poll"), config.getfloat("loader", "settle")
+    )
+    # catch up on whatever changed while we weren't watching
+    changed = list(xmlfiles)
+    while True:
+        for xmlfile in changed:
+            name = xmlfiles[xmlfile]
+            logging.info("Loading library: %s", name)
+            try:
+                load_itdb(libraries[name], warm[name])
+            except Exception as ex:  # pylint: disable=broad-except
+                logging.error("Loading library %s failed: %r", name, ex)
+                warm[name].close()
+            itdbtrace.show_runtimes()
+            itdbtrace.TRACER.reset()
+        changed = watcher.wait()
+
+
+class WarmLoader:
+    """The database connection, RowEncoder and stats writer a watcher reuses."""
+
+    def __init__(self, config):
+        self.config = config
+        self.conn = None
+        self.encoder = None
+        self.to_html = None
+
+    def connect(self):
+        """The connection, remade if it's gone away since the last load."""
+        if self.conn is not None:
+            try:
+                self.conn.cursor().execute("SELECT 1")
+            except Exception as ex:  # pylint: disable=broad-except
+                logging.info("Reconnecting: %r", ex)
+                self.close()
+        if self.conn is None:
+            self.conn = db_connect(self.config)
+            self.conn.autocommit(True)
+        return self.conn
+
+    def html(self):
+        """The itdb2html.iTunesDbToHtml that writes the stats, on our connection."""
+        conn = self.connect()
+        if self.to_html is None or self.to_html.conn is not conn:
+            self.to_html = itdb2html.iTunesDbToHtml(self.config, conn)
+        return self.to_html
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:  # pylint: disable=broad-except
+                pass
+        self.conn = None
+        # the tables might have changed too
+        self.encoder = None
+        self.to_html = None
+
+
+def load_itdb(config, warm=None):
     xmlfile = config.get("iTunes", "xmlfile")
     directory = config.get("html", "dir")
     loading = os.path.join(directory, ".loading")
     loaded = os.path.join(directory, ".loaded")
+    snapshot = None
+    if config.getboolean("loader", "snapshot"):
+        snapshot = itdbplist.cache_filename(xmlfile, "snapshot")
+    # snapshots used to go in the html dir where anyone could download them
+    old_snapshot = os.path.join(directory, ".snapshot")
+    if os.path.exists(old_snapshot):
+        logging.info("Removing old snapshot: %s", old_snapshot)
+        os.remove(old_snapshot)
 
     if not os.path.exists(xmlfile):
         logging.fatal("ERROR: iTunes xmlfile %r does not exist", xmlfile)
+    os.makedirs(directory, exist_ok=True)
+    itunes = load_xml(
+        xmlfile,
+        snapshot,
+        config.getint("loader", "parsers"),
+        config.getboolean("iTunes", "clean", fallback=False),
+    )
 
     # check to see if we really even need to run
-    if not (
-        config.getboolean("loader", "force")
-        or not os.path.exists(loaded)
-        or os.stat(loaded)[stat.ST_MTIME] < os.stat(xmlfile)[stat.ST_MTIME]
-    ):
-        sys.exit()
-
-    touch(loading)
-
-    itunes = load_xml(xmlfile)
-    DbLoader(config, itunes)
+    if not config.getboolean("loader", "force") and os.path.exists(loaded):
+        if os.stat(loaded)[stat.ST_MTIME] >= os.stat(xmlfile)[stat.ST_MTIME]:
+            return
+        # .loaded has the sha1 of the xml it loaded in it
+        if snapshot and read_file(loaded) == itunes.digest():
+            logging.info("iTunes xmlfile is newer but hasn't changed")
+            touch(loaded, itunes.digest())
+            return
+
+    # with shadow tables the web ui can keep going while we load
+    shadow = config.getboolean("loader", "shadow")
+    if shadow and itdbstore.is_sqlite(config):
+        # no CREATE TABLE LIKE or multi table RENAME in sqlite
+        logging.warning("Not using shadow tables with SQLite")
+        config.set("loader", "shadow", "no")
+        shadow = False
+    if not shadow:
+        touch(loading)
+    if config.getint("loader", "shards") > 1 and itdbstore.is_sqlite(config):
+        logging.warning("Loading one shard at a time with SQLite")
+        config.set("loader", "shards", "1")
+
+    DbLoader(config, itunes, warm)
 
     if config.getboolean("loader", "stats"):
-        write_stats(config)
+        write_stats(config, warm)
 
     # touch the .loaded file
-    os.remove(loading)
-    touch(loaded)
+    if not shadow:
+        os.remove(loading)
+    touch(loaded, itunes.digest() if snapshot else "")
 
 
-@LogRuntime()
-def write_stats(config):
+@itdbtrace.LogRuntime()
+def write_stats(config, warm=None):
     logging.info("Writing Stats with itdb2html")
-    to_html = itdb2html.iTunesDbToHtml(config)
-    to_html.ClearCache()
-    to_html.WriteStats()
+    to_html = warm.html() if warm else itdb2html.iTunesDbToHtml(config)
+    try:
+        to_html.ClearCache()
+        to_html.WriteStats()
+    finally:
+        # the warm connection is kept for the next load
+        if not warm:
+            to_html.close()
 
 
 class DbLoader:
-    def __init__(self, config, itunes):
+    def __init__(self, config, itunes, warm=None):
+        self.config = config
         self.itunes = itunes
-        self.conn = db_connect(config)
-        self.conn.autocommit(True)
-        atexit.register(self.close)
+        self.warm = warm
+        if warm:
+            self.conn = warm.connect()
+        else:
+            self.conn = db_connect(config)
+            self.conn.autocommit(True)
+            atexit.register(self.close)
         self.cursor = self.conn.cursor()
         self.user_id = int(config.get("user", "id"))
         self.max = {}
         # dictionary of column names we're missing (and their max values)
         self.missing = {}
-
-        if config.getboolean("loader", "clear"):
+        self.incremental = config.getboolean("loader", "incremental")
+        self.pipeline = config.getboolean("loader", "pipeline")
+        self.shadow = config.getboolean("loader", "shadow")
+        self.showmax = config.getboolean("loader", "showmax")
+        # where to write the suggested column types for tracks
+        self.profile_file = config.get("loader", "profile")
+        self.profiler = None
+        if self.showmax or self.profile_file:
+            self.profiler = itdbprofile.Profile()
+        self.shards = max(1, config.getint("loader", "shards"))
+        # where each of LOADED_TABLES really goes
+        self.tables = {
+            x: x + (self.shadow and SHADOW_SUFFIX or "") for x in LOADED_TABLES
+        }
+        # secondary indexes to put back on each table once it's loaded
+        self.indexes = {}
+        # Track_IDs an incremental load inserted, updated or deleted
+        self.changed_tracks = set()
+        # how many tracks were in the xml
+        self.track_count = 0
+        # a Dimension for each of DIMENSION_TABLES
+        self.dimensions = {}
+
+        if self.shadow:
+            self.make_shadow_tables()
+        elif not self.incremental and config.getboolean("loader", "dropindexes"):
+            self.drop_indexes()
+        if self.incremental:
+            logging.info("Loading incrementally")
+        elif config.getboolean("loader", "clear") and not self.shadow:
             logging.info("Clearing database")
             self.clear_database()
 
-        self.load_tracks()
-        self.load_playlists()
-        if config.getboolean("loader", "showmax"):
+        try:
+            self.load_tracks()
+            self.load_playlists()
+            self.load_grouping_stats()
+        except Exception:
+            # everyone's libraries are in the real tables, so they get their
+            # indexes back even if this load didn't make it
+            if not self.shadow:
+                self.build_indexes()
+            raise
+        self.build_indexes()
+        if self.shadow:
+            self.swap_shadow_tables()
+        if self.showmax:
             self.show_max_lengths()
+        if self.profile_file:
+            self.write_profile()
 
     def close(self):
         logging.info("DbLoader: Closing db")
         self.conn.close()
 
-    @LogRuntime()
+    @itdbtrace.LogRuntime()
     def clear_database(self):
-        self.cursor.execute("DELETE FROM playlist_stats")
-        self.cursor.execute("DELETE FROM playlist_tracks")
-        self.cursor.execute("DELETE FROM playlists")
-        self.cursor.execute("DELETE FROM tracks")
+        """Delete this user's rows, other people's libraries are left alone."""
+        for table in (
+            (
+                "playlist_stats",
+                "playlist_folders",
+                "playlist_items",
+                "playlist_tracks",
+                "playlists",
+                "tracks",
+            )
+            + tuple(DIMENSION_TABLES)
+            + tuple(GROUPING_STATS)
+        ):
+            self.cursor.execute(
+                "DELETE FROM %s WHERE User_ID = %d" % (table, self.user_id)
+            )
 
-    @LogRuntime()
-    def load_tracks(self):
-        tracks = self.itunes["Tracks"]
+    @itdbtrace.LogRuntime()
+    def make_shadow_tables(self):
+        """Make empty copies of the tables, without their secondary indexes.
+
+        Everyone else's rows are copied over (and ours too for an incremental
+        load) so the shadow tables can take the real ones' place.
+        """
+        for table in LOADED_TABLES:
+            shadow = self.tables[table]
+            logging.info("Making shadow table: %s", shadow)
+            self.cursor.execute("DROP TABLE IF EXISTS %s" % shadow)
+            self.cursor.execute("CREATE TABLE %s LIKE %s" % (shadow, table))
+            self.indexes[table] = self.drop_secondary_indexes(shadow)
+            self.cursor.execute(
+                "INSERT INTO %s SELECT * FROM %s%s"
+                % (
+                    shadow,
+                    table,
+                    "" if self.incremental else " WHERE User_ID != %d" % self.user_id,
+                )
+            )
+
+    @itdbtrace.LogRuntime()
+    def drop_indexes(self):
+        """Drop the secondary indexes so a full load doesn't keep them up to date."""
+        for table in LOADED_TABLES:
+            self.indexes[table] = self.drop_secondary_indexes(table)
+
+    def drop_secondary_indexes(self, table):
+        """Drop table's secondary indexes and return what they were."""
+        indexes = self.get_secondary_indexes(table)
+        if indexes:
+            logging.info("Dropping indexes on: %s", table)
+            self.cursor.execute(
+                "ALTER TABLE %s %s"
+                % (table, ", ".join("DROP INDEX %s" % x for x in indexes))
+            )
+        return indexes
+
+    @itdbtrace.LogRuntime()
+    def build_indexes(self):
+        """Put back the indexes we dropped and add any from itdb.sql that are missing."""
+        wanted = itdbindex.schema_indexes()
+        for table in LOADED_TABLES:
+            indexes = dict(wanted.get(table, {}))
+            indexes.update(self.indexes.get(table, {}))
+            existing = self.get_secondary_indexes(self.tables[table])
+            missing = [x for name, x in indexes.items() if name not in existing]
+            if missing:
+                logging.info("Building indexes on: %s", self.tables[table])
+                self.cursor.execute(
+                    "ALTER TABLE %s %s"
+                    % (self.tables[table], ", ".join("ADD %s" % x for x in missing))
+                )
+        self.indexes = {}
+
+    def get_secondary_indexes(self, table):
+        """Map the name of each index (other than the primary key) to its definition."""
+        self.cursor.execute("SHOW INDEX FROM %s" % table)
+        columns = collections.defaultdict(list)
+        kinds = {}
+        for row in self.cursor.fetchall():
+            _, non_unique, key_name, _, column_name, _, _, sub_part = row[:8]
+            if key_name == "PRIMARY":
+                continue
+            if sub_part:
+                column_name = "%s(%d)" % (column_name, sub_part)
+            columns[key_name].append(column_name)
+            if row[10] == "FULLTEXT":
+                kinds[key_name] = "FULLTEXT "
+            elif not non_unique:
+                kinds[key_name] = "UNIQUE "
+            else:
+                kinds[key_name] = ""
+        return {
+            name: "%sINDEX %s (%s)" % (kinds[name], name, ", ".join(cols))
+            for name, cols in columns.items()
+        }
+
+    @itdbtrace.LogRuntime()
+    def swap_shadow_tables(self):
+        """Swap the (loaded and indexed) shadow tables in, all at once."""
+        logging.info("Swapping in shadow tables")
+        # left over from a load that died half way through the swap
+        self.cursor.execute(
+            "DROP TABLE IF EXISTS %s" % ", ".join("%s_old" % x for x in LOADED_TABLES)
+        )
+        # RENAME TABLE does all of these atomically
+        self.cursor.execute(
+            "RENAME TABLE %s"
+            % ", ".join(
+                "%s TO %s_old, %s TO %s" % (table, table, shadow, table)
+                for table, shadow in self.tables.items()
+            )
+        )
+        self.cursor.execute(
+            "DROP TABLE %s" % ", ".join("%s_old" % x for x in LOADED_TABLES)
+        )
+        self.tables = {x: x for x in LOADED_TABLES}
+
+    def delete_rows(self, table, column, ids):
+        """Delete this user's rows in table where column is one of ids."""
+        for batch in id_batches(ids):
+            self.cursor.execute(
+                "DELETE FROM %s WHERE User_ID = %d AND %s IN (%s)"
+                % (self.tables[table], self.user_id, column, batch)
+            )
+
+    def get_existing_tracks(self):
+        """Map each Track_ID we already have to the state we last loaded."""
+        self.cursor.execute(
+            "SELECT Track_ID, %s FROM %s WHERE User_ID = %d"
+            % (", ".join(TRACK_STATE_COLUMNS), self.tables["tracks"], self.user_id)
+        )
+        return {
+            int(row[0]): tuple(x or None for x in row[1:])
+            for row in self.cursor.fetchall()
+        }
 
-        columns_we_care_about = self.get_track_columns()
+    @staticmethod
+    def get_track_state(track):
+        return tuple(track.get(x) or None for x in TRACK_STATE_KEYS)
+
+    @itdbtrace.LogRuntime()
+    def load_tracks(self):
+        if self.warm and self.warm.encoder:
+            encoder = self.warm.encoder
+        else:
+            encoder = RowEncoder(self.get_track_columns(), {"User_ID": self.user_id})
+            if self.warm:
+                self.warm.encoder = encoder
+        existing = self.get_existing_tracks() if self.incremental else None
+        if any(x[0] in encoder.positions for x in DIMENSIONS):
+            self.dimensions = {
+                table: Dimension(table, column)
+                for table, column in DIMENSION_TABLES.items()
+            }
+            if self.incremental:
+                self.get_existing_dimensions()
 
-        tracks_csv_filename = "/tmp/itdb_tracks.csv"
         logging.info("Making tracks csv")
-        with open(tracks_csv_filename, "w", newline="") as csv_file:
-            writer = csv.writer(csv_file)
-            for track in tqdm.tqdm(tracks.values()):
-                track["User_ID"] = self.user_id
-
-                # we don't load everything, only things we have columns for
-                keys = list(track.keys())
-
-                def convert(val):
-                    return isinstance(val, bool) and (val and "1" or "0") or str(val)
-
-                row = [
-                    convert(track.get(x.replace("_", " ")))
-                    for x in columns_we_care_about
-                ]
-                writer.writerow(row)
-                for key in keys:
-                    if key not in self.max or len(str(track[key])) > len(self.max[key]):
-                        self.max[key] = str(track[key])
-
-                    if key.replace(" ", "_") not in columns_we_care_about:
-                        if key not in self.missing or len(str(track[key])) > len(
-                            self.missing[key]
-                        ):
-                            self.missing[key] = str(track[key])
-        self.load_csv("tracks", tracks_csv_filename)
+        self.bulk_load(
+            "tracks",
+            lambda csv_file: self.write_tracks(csv_file, encoder, existing),
+            replace=self.incremental,
+        )
+        itdbtrace.add_rows(self.track_count)
+        if existing and not self.track_count:
+            # a broken or truncated xml, not a library with nothing left in it
+            raise ValueError(
+                "No tracks in %s, not deleting the %d tracks already loaded"
+                % (self.itunes.filename, len(existing))
+            )
+        self.load_dimensions()
+        if existing:
+            logging.info("Deleting %d tracks", len(existing))
+            self.delete_rows("tracks", "Track_ID", existing)
+            self.changed_tracks.update(existing)
+        if self.incremental:
+            logging.info("%d tracks changed", len(self.changed_tracks))
         print("")
 
-    @LogRuntime()
-    def load_playlists(self):
-        max_name = ""
-        playlist_tracks_filename = "/tmp/itdb_playlist_tracks.csv"
-        logging.info("Creating playlists and playlist_tracks csv")
-        with open(playlist_tracks_filename, "w") as playlist_tracks:
+    def write_tracks(self, csv_file, encoder, existing):
+        writerow = csv.writer(csv_file).writerow
+        encode = encoder.encode
+        # (row index, plist key, Dimension.number) for each of DIMENSIONS
+        keys = [
+            (encoder.positions[column], key, self.dimensions[table].number)
+            for column, key, table in DIMENSIONS
+            if self.dimensions and column in encoder.positions
+        ]
+        for track in tqdm.tqdm(self.itunes.tracks()):
+            self.track_count += 1
+            if self.profiler:
+                self.profiler.add(track)
+
+            if existing is not None:
+                track_id = int(track["Track ID"])
+                if existing.pop(track_id, None) == self.get_track_state(track):
+                    continue
+                self.changed_tracks.add(track_id)
+
+            row = encode(track)
+            for index, key, number in keys:
+                row[index] = number(track.get(key))
+            writerow(row)
+        if self.profiler:
+            self.max = self.profiler.longest()
+        # we don't load everything, only things we have columns for
+        self.missing = {
+            key: value for key, value in self.max.items() if key not in encoder.keys
+        }
+
+    def get_existing_dimensions(self):
+        """Start from the numbers the last load gave things, so they don't change."""
+        for table, dimension in self.dimensions.items():
+            self.cursor.execute(
+                "SELECT %s, Name FROM %s WHERE User_ID = %d"
+                % (dimension.column, self.tables[table], self.user_id)
+            )
+            dimension.add_existing(self.cursor.fetchall())
+
+    @itdbtrace.LogRuntime()
+    def load_dimensions(self):
+        """Add the artists, albums etc. that write_tracks numbered for the first time."""
+        for table, dimension in self.dimensions.items():
+            if dimension.new:
+                logging.info("Adding %d %s", len(dimension.new), table)
+                self.bulk_load(
+                    table,
+                    lambda csv_file, new=dimension.new: csv.writer(csv_file).writerows(
+                        (self.user_id, key, value) for key, value in new
+                    ),
+                )
+                itdbtrace.add_rows(len(dimension.new))
+        if self.incremental and self.dimensions:
+            self.delete_unused_dimensions()
+
+    def delete_unused_dimensions(self):
+        """Delete the artists, albums etc. no track has any more."""
+        for table, column in DIMENSION_TABLES.items():
+            used = " UNION ".join(
+                "SELECT %s FROM %s WHERE User_ID = %d AND %s IS NOT NULL"
+                % (track_column, self.tables["tracks"], self.user_id, track_column)
+                for track_column, _, dimension_table in DIMENSIONS
+                if dimension_table == table
+            )
+            self.cursor.execute(
+                "DELETE FROM %s WHERE User_ID = %d AND %s NOT IN (%s)"
+                % (self.tables[table], self.user_id, column, used)
+            )
+            if self.cursor.rowcount > 0:
+                logging.info("Deleted %d %s", self.cursor.rowcount, table)
 
-            for playlist in tqdm.tqdm(self.itunes["Playlists"]):
+    def get_existing_playlists(self):
+        """Map each Playlist_ID we already have to its row, its Track_IDs and their order."""
+        self.cursor.execute(
+            "SELECT Playlist_ID, Name, Playlist_Persistent_ID, Parent_Persistent_ID, "
+            "Folder FROM %s WHERE User_ID = %d"
+            % (self.tables["playlists"], self.user_id)
+        )
+        playlists = {
+            int(row[0]): tuple(x or None for x in row[1:])
+            for row in self.cursor.fetchall()
+        }
+        self.cursor.execute(
+            "SELECT Playlist_ID, Track_ID FROM %s WHERE User_ID = %d"
+            % (self.tables["playlist_tracks"], self.user_id)
+        )
+        items = collections.defaultdict(set)
+        for playlist_id, track_id in self.cursor.fetchall():
+            items[int(playlist_id)].add(int(track_id))
+        self.cursor.execute(
+            "SELECT Playlist_ID, Track_IDs FROM %s WHERE User_ID = %d"
+            % (self.tables["playlist_items"], self.user_id)
+        )
+        orders = {int(row[0]): bytes(row[1]) for row in self.cursor.fetchall()}
+        return playlists, items, orders
 
-                new_playlist = {
-                    "User ID": self.user_id,
-                    "Playlist ID": -1,
-                    "Name": "",
-                    "Playlist Persistent ID": "",
-                    "Parent Persistent ID": "",
-                }
-                for key in playlist.keys():
-                    if key in new_playlist:
-                        new_playlist[key] = playlist[key]
+    @itdbtrace.LogRuntime()
+    def load_playlists(self):
+        # rows for the playlists table, they go in once playlist_tracks is loaded
+        self.new_playlists = []
+        # Track_IDs taken out of each playlist since the last load
+        self.removed_items = {}
+        # playlists whose playlist_stats need working out again
+        self.stats_playlists = set()
+        # the Playlist ID and Parent Persistent ID of each Playlist Persistent ID
+        self.playlist_parents = {}
+        # (User_ID, Playlist_ID, packed Track_IDs) rows for playlist_items
+        self.playlist_items = []
+        self.max_name = ""
+        existing = existing_items = existing_orders = None
+        if self.incremental:
+            existing, existing_items, existing_orders = self.get_existing_playlists()
 
-                sql = "REPLACE INTO playlists (%s) VALUES (%s)" % (
-                    ", ".join([x.replace(" ", "_") for x in list(new_playlist.keys())]),
-                    ", ".join(["%%(%s)s" % x for x in list(new_playlist.keys())]),
+        logging.info("Creating playlists and playlist_tracks csv")
+        self.bulk_load(
+            "playlist_tracks",
+            lambda csv_file: self.write_playlists(
+                csv_file, existing, existing_items, existing_orders
+            ),
+        )
+        self.insert_playlists()
+        self.insert_playlist_items()
+
+        deleted = None
+        if self.incremental:
+            deleted = set(existing) | set(existing_items) | set(existing_orders)
+            logging.info(
+                "%d playlists deleted, %d playlists changed",
+                len(deleted),
+                len(self.stats_playlists),
+            )
+            for table in (
+                "playlists",
+                "playlist_tracks",
+                "playlist_items",
+                "playlist_stats",
+            ):
+                self.delete_rows(table, "Playlist_ID", deleted)
+            for playlist_id, track_ids in self.removed_items.items():
+                self.cursor.execute(
+                    "DELETE FROM %s WHERE User_ID = %d AND Playlist_ID = %d "
+                    "AND Track_ID IN (%s)"
+                    % (
+                        self.tables["playlist_tracks"],
+                        self.user_id,
+                        playlist_id,
+                        ", ".join(map(str, track_ids)),
+                    )
                 )
-                try:
-                    self.cursor.execute(sql, new_playlist)
-                except Exception as ex:
-                    logging.error(
-                        "\nPlaylists FAIL:%r\nSQL:%s\nINFO:%r\n", ex, sql, new_playlist
+        itdbtrace.add_rows(len(self.new_playlists))
+        if not self.incremental or self.new_playlists or deleted:
+            self.load_playlist_folders()
+            if self.incremental:
+                # a playlist may have moved out of a folder
+                self.stats_playlists.update(self.get_folders())
+        if self.incremental and self.stats_playlists:
+            # a folder's stats are its playlists' tracks
+            self.stats_playlists.update(self.get_folders(self.stats_playlists))
+        self.load_all_playlist_stats(self.stats_playlists if self.incremental else None)
+        self.max["Playlist name"] = self.max_name
+
+    @itdbtrace.LogRuntime()
+    def load_playlist_folders(self):
+        """Fill out playlist_folders from the playlists write_playlists saw.
+
+        It's a row for every folder a playlist is in so it's rebuilt
+        whenever any playlist changes.
+        """
+        if self.incremental:
+            self.cursor.execute(
+                "DELETE FROM %s WHERE User_ID = %d"
+                % (self.tables["playlist_folders"], self.user_id)
+            )
+        self.folder_rows = 0
+        self.bulk_load("playlist_folders", self.write_playlist_folders)
+        itdbtrace.add_rows(self.folder_rows)
+
+    def write_playlist_folders(self, csv_file):
+        writerow = csv.writer(csv_file).writerow
+        parents = self.playlist_parents
+        for playlist_id, parent in parents.values():
+            writerow((self.user_id, playlist_id, playlist_id, 0))
+            self.folder_rows += 1
+            depth = 0
+            seen = set()
+            # seen is in case a broken library has a loop of folders
+            while parent in parents and parent not in seen:
+                seen.add(parent)
+                depth += 1
+                folder_id, parent = parents[parent]
+                writerow((self.user_id, folder_id, playlist_id, depth))
+                self.folder_rows += 1
+
+    def get_folders(self, playlist_ids=None):
+        """The Playlist_IDs of the folders playlist_ids are in (or all of them)."""
+        sql = "SELECT DISTINCT Folder_ID FROM %s WHERE User_ID = %d AND Depth > 0" % (
+            self.tables["playlist_folders"],
+            self.user_id,
+        )
+        if playlist_ids is None:
+            self.cursor.execute(sql)
+            return {int(x[0]) for x in self.cursor.fetchall()}
+        folders = set()
+        for ids in id_batches(playlist_ids):
+            self.cursor.execute(sql + " AND Playlist_ID IN (%s)" % ids)
+            folders.update(int(x[0]) for x in self.cursor.fetchall())
+        return folders
+
+    @itdbtrace.LogRuntime()
+    def insert_playlists(self):
+        """Put the new playlists rows in with a few multi row statements."""
+        if not self.new_playlists:
+            return
+        columns = list(self.new_playlists[0].keys())
+        sql = "REPLACE INTO %s (%s) VALUES (%s)" % (
+            self.tables["playlists"],
+            ", ".join([x.replace(" ", "_") for x in columns]),
+            ", ".join(["%s"] * len(columns)),
+        )
+        rows = [tuple(x[key] for key in columns) for x in self.new_playlists]
+        logging.info("Inserting %d playlists", len(rows))
+        itdbtrace.add_rows(len(rows))
+        # executemany turns this into a handful of multi row statements
+        self.cursor.execute("START TRANSACTION")
+        try:
+            self.cursor.executemany(sql, rows)
+            self.conn.commit()
+        except Exception as ex:
+            self.conn.rollback()
+            logging.error("\nPlaylists FAIL:%r\nSQL:%s\n", ex, sql)
+
+    @itdbtrace.LogRuntime()
+    def insert_playlist_items(self):
+        """Put in the packed Track_IDs of the playlists that are new or changed."""
+        if not self.playlist_items:
+            return
+        sql = (
+            "REPLACE INTO %s (User_ID, Playlist_ID, Track_IDs) VALUES (%%s, %%s, %%s)"
+            % self.tables["playlist_items"]
+        )
+        logging.info("Inserting %d playlist_items", len(self.playlist_items))
+        itdbtrace.add_rows(len(self.playlist_items))
+        self.cursor.execute("START TRANSACTION")
+        try:
+            self.cursor.executemany(sql, self.playlist_items)
+            self.conn.commit()
+        except Exception as ex:
+            self.conn.rollback()
+            logging.error("\nPlaylist items FAIL:%r\nSQL:%s\n", ex, sql)
+
+    def write_playlists(
+        self, playlist_tracks, existing, existing_items, existing_orders
+    ):
+        for playlist in tqdm.tqdm(self.itunes.playlists()):
+            playlist = itdbmodel.Playlist.from_plist(playlist)
+
+            new_playlist = {
+                "User ID": self.user_id,
+                "Playlist ID": playlist.get("Playlist ID", -1),
+                "Name": playlist.get("Name", ""),
+                "Playlist Persistent ID": playlist.get("Playlist Persistent ID", ""),
+                "Parent Persistent ID": playlist.get("Parent Persistent ID", ""),
+                "Folder": playlist.get("Folder", False),
+            }
+            if len(new_playlist["Name"]) > len(self.max_name):
+                self.max_name = new_playlist["Name"]
+
+            playlist_id = new_playlist["Playlist ID"]
+            self.playlist_parents[
+                new_playlist["Playlist Persistent ID"] or playlist_id
+            ] = (playlist_id, new_playlist["Parent Persistent ID"])
+            track_ids = playlist.track_ids
+            packed = itdbstore.pack_track_ids(track_ids)
+            # a playlist can be put in a new order without changing what's in it
+            if (
+                existing_orders is None
+                or existing_orders.pop(playlist_id, None) != packed
+            ):
+                self.playlist_items.append((self.user_id, playlist_id, packed))
+            if existing is not None:
+                state = tuple(
+                    new_playlist[x] or None
+                    for x in (
+                        "Name",
+                        "Playlist Persistent ID",
+                        "Parent Persistent ID",
+                        "Folder",
                     )
-                if len(playlist["Name"]) > len(max_name):
-                    max_name = playlist["Name"]
-
-                if "Playlist Items" in playlist:
-                    # now add all the songs
-                    playlist_id = int(playlist["Playlist ID"])
-                    prefix = "%d,%d," % (self.user_id, playlist_id)
-                    for item in playlist["Playlist Items"]:
-                        print(prefix + str(item["Track ID"]), file=playlist_tracks)
-        self.load_csv("playlist_tracks", playlist_tracks_filename)
-        self.load_all_playlist_stats()
-        self.max["Playlist name"] = max_name
-
-    @LogRuntime(args=[2])
-    def load_csv(self, table, filename):
+                )
+                if existing.pop(playlist_id, None) == state:
+                    new_playlist = None
+                old_track_ids = existing_items.pop(playlist_id, set())
+                new_track_ids = set(track_ids)
+                if old_track_ids != new_track_ids:
+                    self.stats_playlists.add(playlist_id)
+                    if old_track_ids - new_track_ids:
+                        self.removed_items[playlist_id] = sorted(
+                            old_track_ids - new_track_ids
+                        )
+                elif not self.changed_tracks.isdisjoint(track_ids):
+                    self.stats_playlists.add(playlist_id)
+                # only the ones we don't already have
+                track_ids = sorted(new_track_ids - old_track_ids)
+
+            if new_playlist:
+                self.new_playlists.append(new_playlist)
+
+            # now add all the songs
+            prefix = "%d,%d," % (self.user_id, playlist_id)
+            for track_id in track_ids:
+                print(prefix + str(track_id), file=playlist_tracks)
+
+    def bulk_load(self, table, write_rows, replace=False):
+        """Load the csv rows write_rows(csv_file) writes into table.
+
+        Normally the rows are written to /tmp/itdb_<table>.csv and then
+        loaded. With pipeline=yes they go through a fifo into LOAD DATA LOCAL
+        INFILE as they are made, so parsing and loading overlap and nothing
+        is left on disk. With shards=N the rows for SHARDED_TABLES are dealt
+        out to N files (or fifos) that are loaded over N connections at once.
+        """
+        shards = self.shards if table in SHARDED_TABLES else 1
+        names = ["%s.csv" % table]
+        if shards > 1:
+            names = ["%s_%d.csv" % (table, x) for x in range(shards)]
+
+        if not self.pipeline:
+            filenames = ["/tmp/itdb_%d_%s" % (self.user_id, x) for x in names]
+            with contextlib.ExitStack() as stack:
+                files = [stack.enter_context(open_csv(x)) for x in filenames]
+                write_rows(files[0] if shards == 1 else ShardedFile(files))
+            self.load_shards(table, filenames, replace)
+            return
+
+        directory = tempfile.mkdtemp(prefix="itdb_%d_" % self.user_id)
+        filenames = [os.path.join(directory, x) for x in names]
+        for filename in filenames:
+            os.mkfifo(filename)
+        errors = []
+
+        def writer():
+            try:
+                with contextlib.ExitStack() as stack:
+                    files = [stack.enter_context(open_csv(x)) for x in filenames]
+                    write_rows(files[0] if shards == 1 else ShardedFile(files))
+            except Exception as ex:  # pylint: disable=broad-except
+                errors.append(ex)
+
+        thread = threading.Thread(target=writer, name="itdb_%s_writer" % table)
+        thread.start()
+        try:
+            self.load_shards(table, filenames, replace, local=True, writer=thread)
+        finally:
+            # if LOAD DATA gave up early soak up the rest so the writer can finish
+            fifos = [os.open(x, os.O_RDONLY | os.O_NONBLOCK) for x in filenames]
+            while thread.is_alive():
+                select.select(fifos, [], [], 0.1)
+                for fifo in fifos:
+                    try:
+                        os.read(fifo, 65536)
+                    except BlockingIOError:
+                        pass
+            for fifo, filename in zip(fifos, filenames):
+                os.close(fifo)
+                os.unlink(filename)
+            os.rmdir(directory)
+        if errors:
+            raise errors[0]
+
+    def load_shards(self, table, filenames, replace=False, local=False, writer=None):
+        """load_csv each file, over a connection each when there's more than one.
+
+        writer is the thread writing the fifos when they're fifos.
+        """
+        if len(filenames) == 1:
+            self.load_csv(table, filenames[0], replace=replace, local=local)
+            return
+        parent = itdbtrace.TRACER.current()
+
+        def load_shard(filename):
+            try:
+                conn = db_connect(self.config)
+                conn.autocommit(True)
+                try:
+                    with itdbtrace.span(
+                        "shard(%s)" % os.path.basename(filename), parent
+                    ):
+                        self.load_csv(table, filename, replace, local, conn.cursor())
+                finally:
+                    conn.close()
+            except Exception:
+                if writer:
+                    # the writer would block on this fifo and hold up the other shards
+                    drain_fifo(filename, writer)
+                raise
+
+        logging.info("Loading %d shards into: %r", len(filenames), table)
+        with concurrent.futures.ThreadPoolExecutor(len(filenames)) as pool:
+            for future in [pool.submit(load_shard, x) for x in filenames]:
+                future.result()
+
+    @itdbtrace.LogRuntime(args=[2])
+    def load_csv(self, table, filename, replace=False, local=False, cursor=None):
+        """Bulk load a csv, rows replace existing ones with the same key if replace."""
         logging.info("Loading csv into: %r", table)
-        os.chmod(filename, 0o644)
+        cursor = cursor or self.cursor
+        if not local:
+            # the server reads this one
+            os.chmod(filename, 0o644)
         sql = (
-            """LOAD DATA INFILE '%s' IGNORE INTO TABLE %s FIELDS TERMINATED BY ',' ENCLOSED BY '"'"""
-            % (filename, table)
+            """LOAD DATA %sINFILE '%s' %s INTO TABLE %s FIELDS TERMINATED BY ',' ENCLOSED BY '"'"""
+            % (
+                local and "LOCAL " or "",
+                filename,
+                replace and "REPLACE" or "IGNORE",
+                self.tables.get(table, table),
+            )
         )
         try:
-            self.cursor.execute(sql)
+            started = time.perf_counter()
+            cursor.execute(sql)
+            itdbtrace.add_rows(cursor.rowcount)
+            logging.info(
+                "Loaded %d rows from %s in %.3fs",
+                cursor.rowcount,
+                os.path.basename(filename),
+                time.perf_counter() - started,
+            )
         except Exception as ex:
             logging.error("\nTracks FAIL:%r\nSQL:%s\n", ex, sql)
+            if local:
+                # the rest of the pipeline has to know to stop
+                raise
         # os.unlink(filename)
 
     def show_max_lengths(self):
@@ -246,75 +1054,254 @@ class DbLoader:
             for key, value in sorted(self.missing.items()):
                 print("%20s:%3d:%s" % (key, len(value), value))
 
+    def write_profile(self):
+        """Save ALTER TABLE statements that make the tracks columns as small as they can be."""
+        logging.info("Writing suggested column types to %s", self.profile_file)
+        with open(self.profile_file, "w") as outfile:
+            outfile.write(itdbprofile.alter_script(self.profiler))
+
     def get_track_columns(self):
-        # find columns in the tracks table
+        """The DESCRIBE rows for the tracks table."""
         self.cursor.execute("DESCRIBE tracks")
         rows = self.cursor.fetchall()
-        columns_we_care_about = [row[0] for row in rows]
 
         logging.debug(
-            "We care about these columns: %s", ", ".join(sorted(columns_we_care_about))
+            "We care about these columns: %s", ", ".join(sorted(x[0] for x in rows))
         )
-        return columns_we_care_about
+        return rows
 
-    @LogRuntime()
-    def load_all_playlist_stats(self):
-        logging.info("Loading all playlist_stats")
-        self.cursor.execute(
-            "SELECT Playlist_ID FROM playlists WHERE User_ID = %d" % self.user_id
-        )
-        for (plid,) in tqdm.tqdm(self.cursor.fetchall()):
-            self.load_playlist_stats(int(plid))
-
-    def load_playlist_stats(self, playlist_id):
+    @itdbtrace.LogRuntime()
+    def load_all_playlist_stats(self, playlist_ids=None):
         """Fill out a lookup table with data about stats for playlists.
-        This is somewhat expensive so we pre fill it out.
-        """
-        self.cursor.execute(
-            "SELECT "
-            "CASE WHEN ISNULL(Rating) THEN 0 "
-            "ELSE FLOOR(Rating/20) END as Stars "
-            ", COUNT(*) "
-            "FROM tracks "
-            "INNER JOIN playlist_tracks "
-            "ON tracks.Track_ID = playlist_tracks.Track_ID "
-            "AND tracks.User_ID = playlist_tracks.User_ID "
-            "WHERE playlist_tracks.Playlist_ID = '%d' "
-            "AND tracks.User_ID = %d "
-            "GROUP BY stars" % (playlist_id, self.user_id)
-        )
-        arr = self.cursor.fetchall()
 
-        for row in arr:
+        This is somewhat expensive so we pre fill it out, with one query
+        for all of the user's playlists or just the ones in playlist_ids.
+        A folder's stats count each track in any playlist under it once.
+        """
+        sql = (
+            "INSERT INTO %s (User_ID, Playlist_ID, Rating, Count, Size, Total_Time) "
+            % self.tables["playlist_stats"]
+        ) + itdbqueries.PLAYLIST_STATS
+        params = {
+            "playlist_folders": self.tables["playlist_folders"],
+            "playlist_tracks": self.tables["playlist_tracks"],
+            "tracks": self.tables["tracks"],
+            "user": self.user_id,
+        }
+        if playlist_ids is None:
+            logging.info("Loading all playlist_stats")
+            self.cursor.execute(
+                "DELETE FROM %s WHERE User_ID = %d"
+                % (self.tables["playlist_stats"], self.user_id)
+            )
+            self.cursor.execute(sql % dict(params, where=""))
+            itdbtrace.add_rows(self.cursor.rowcount)
+            return
+
+        logging.info("Loading playlist_stats for %d playlists", len(playlist_ids))
+        # a rating may no longer be in the playlist at all
+        self.delete_rows("playlist_stats", "Playlist_ID", playlist_ids)
+        for ids in id_batches(playlist_ids):
+            where = "AND playlist_folders.Folder_ID IN (%s)" % ids
+            self.cursor.execute(sql % dict(params, where=where))
+            itdbtrace.add_rows(self.cursor.rowcount)
+
+    @itdbtrace.LogRuntime()
+    def load_grouping_stats(self):
+        """Fill out genre_stats, artist_stats and album_stats like playlist_stats.
+
+        There are only a few rows per genre, artist or album so an
+        incremental load that changed any tracks works them all out again.
+        """
+        if not self.dimensions:
+            # the tracks table is older than the *_ID columns
+            return
+        if self.incremental and not self.changed_tracks:
+            return
+        for table, column in GROUPING_STATS.items():
+            logging.info("Loading %s", table)
             self.cursor.execute(
-                "REPLACE INTO playlist_stats "
-                "(User_ID, Playlist_ID, Rating, Count) VALUES "
-                "(%d, %d, %d, %d)" % (self.user_id, playlist_id, row[0] * 20, row[1])
+                "DELETE FROM %s WHERE User_ID = %d" % (self.tables[table], self.user_id)
             )
+            self.cursor.execute(
+                "INSERT INTO %s (User_ID, %s, Rating, Count, Size, Total_Time) "
+                % (self.tables[table], column)
+                + itdbqueries.GROUPING_STATS
+                % {
+                    "column": column,
+                    "tracks": self.tables["tracks"],
+                    "user": self.user_id,
+                }
+            )
+            itdbtrace.add_rows(self.cursor.rowcount)
+
+
+class ShardedFile:
+    """Deals the lines written to it out to files, SHARD_ROWS lines at a time.
+
+    csv writers write each row with one write() so rows never get split.
+    """
+
+    def __init__(self, files):
+        self.files = files
+        self.lines = 0
+
+    def write(self, text):
+        self.files[(self.lines // SHARD_ROWS) % len(self.files)].write(text)
+        self.lines += 1
+
+
+def drain_fifo(filename, writer):
+    """Read and throw away what's written to a fifo until the writer thread ends."""
+    fifo = os.open(filename, os.O_RDONLY | os.O_NONBLOCK)
+    try:
+        while writer.is_alive():
+            select.select([fifo], [], [], 0.1)
+            try:
+                if not os.read(fifo, 65536):
+                    # nobody has it open for writing (yet)
+                    time.sleep(0.01)
+            except BlockingIOError:
+                pass
+    finally:
+        os.close(fifo)
+
+
+def open_csv(filename):
+    return open(filename, "w", newline="")
+
+
+class RowEncoder:
+    """Turns track dicts into tracks csv rows.
+
+    Everything that only depends on the table (which plist key feeds each
+    column, what to write when it's missing, how to write it) is worked
+    out once from the DESCRIBE output. csv.writer already does the right
+    thing with ints, strings and datetimes so only booleans need any work
+    per row.
+    """
+
+    def __init__(self, describe_rows, constants=None):
+        constants = constants or {}
+        # (plist key, value when the key is missing) for each column
+        self.columns = [
+            (row[0].replace("_", " "), NULL if row[4] is None else row[4])
+            for row in describe_rows
+        ]
+        self.keys = frozenset(key for key, _ in self.columns)
+        # where each column is in a row
+        self.positions = {row[0]: index for index, row in enumerate(describe_rows)}
+        self.constants = [
+            (index, constants[row[0]])
+            for index, row in enumerate(describe_rows)
+            if row[0] in constants
+        ]
+        self.converters = [
+            (index, CONVERTERS[column_kind(row[1])], self.columns[index][1])
+            for index, row in enumerate(describe_rows)
+            if CONVERTERS[column_kind(row[1])] and row[0] not in constants
+        ]
+
+    def encode(self, track):
+        get = track.get
+        row = [get(key, missing) for key, missing in self.columns]
+        for index, value in self.constants:
+            row[index] = value
+        for index, convert, missing in self.converters:
+            value = row[index]
+            if value is not missing:
+                row[index] = convert(value)
+        return row
+
+
+class Dimension:
+    """Gives each distinct value of a column (like Artist) an integer id.
+
+    Ids are per user and start at 1. new is the (id, value) pairs that
+    have to be added to the table. Values that only differ in case or
+    in spaces at either end ("The Beatles" and "the beatles ") get the
+    same id, like GROUP BY with MySQL's collation gave them, and the
+    table has the first one seen.
+    """
+
+    def __init__(self, table, column):
+        self.table = table
+        self.column = column
+        self.ids = {}
+        self.new = []
+        self.next_id = 1
+
+    def add_existing(self, rows):
+        """(id, value) rows already in the table."""
+        for key, value in rows:
+            self.ids.setdefault(normalize(value), int(key))
+            self.next_id = max(self.next_id, int(key) + 1)
+
+    def number(self, value):
+        """The id for value, NULL if there's no value."""
+        if not value:
+            return NULL
+        name = normalize(value)
+        if not name:
+            return NULL
+        key = self.ids.get(name)
+        if key is None:
+            key = self.ids[name] = self.next_id
+            self.next_id += 1
+            self.new.append((key, value))
+        return key
+
+
+def normalize(value):
+    """What a Dimension tells values apart by."""
+    return value.strip().casefold()
+
+
+def column_kind(column_type):
+    """Is a column a bool, int, datetime or str (from its DESCRIBE type)."""
+    if isinstance(column_type, bytes):
+        column_type = column_type.decode()
+    column_type = column_type.lower()
+    if column_type.startswith(("tinyint(1)", "bool")):
+        return "bool"
+    if "int" in column_type:
+        return "int"
+    if column_type.startswith(("datetime", "timestamp", "date")):
+        return "datetime"
+    return "str"
+
+
+def id_batches(ids):
+    """Yield comma separated lists of ids small enough for an IN (...) clause."""
+    ids = sorted(ids)
+    for start in range(0, len(ids), ID_BATCH_SIZE):
+        yield ", ".join(str(int(x)) for x in ids[start : start + ID_BATCH_SIZE])
 
 
 def db_connect(config):
-    logging.info("Connecting to MySQL")
-    return MySQLdb.connect(
-        host=config.get("client", "host"),
-        db=config.get("client", "database"),
-        user=config.get("client", "user"),
-        passwd=config.get("client", "password"),
+    return itdbstore.connect(
+        config, local_infile=config.getboolean("loader", "pipeline")
     )
 
 
-@LogRuntime()
-def load_xml(xmlfile):
+def load_xml(xmlfile, snapshot=None, parsers=1, clean=False):
+    """The library is parsed lazily as load_tracks and load_playlists consume it."""
     logging.info("Loading XML file: %r", xmlfile)
-    with open(xmlfile, "rb") as infile:
-        return plistlib.load(infile)
+    return itdbplist.Library(
+        xmlfile, snapshot=snapshot, parsers=max(1, parsers), clean=clean
+    )
 
 
-def touch(filename):
+def touch(filename, contents=""):
     if os.path.exists(filename):
         os.remove(filename)
-    file = open(filename, "w")
-    file.close()
+    with open(filename, "w") as file:
+        file.write(contents)
+
+
+def read_file(filename):
+    with open(filename) as file:
+        return file.read()
 
 
 class ShutdownHandler(logging.Handler):
@@ -323,7 +1310,7 @@ class ShutdownHandler(logging.Handler):
         sys.exit(1)
 
 
-@LogRuntime()
+@itdbtrace.LogRuntime()
 def main():
     """Parse args and do the thing."""
     logging.basicConfig()
@@ -331,10 +1318,47 @@ def main():
 
     config = get_config()
 
-    parser = argparse.ArgumentParser(description="LoadiTunes XML into MySQL.")
+    parser = argparse.ArgumentParser(description="LoadiTunes XML into MySQL or SQLite.")
     parser.add_argument("-p", "--password", help="Password")
     parser.add_argument("-size", "--size", help="Size", type=int)
     parser.add_argument("-f", "--force", help="Log verbosely", action="store_true")
+    parser.add_argument(
+        "-m",
+        "--showmax",
+        help="Show the longest value of each key (to help size columns in itdb.sql)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--profile",
+        help="Write ALTER TABLE statements that shrink the tracks columns to fit to this file",
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        help="Only load tracks and playlists that changed since the last load",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="How many [library:<name>] libraries to load at once",
+        type=int,
+    )
+    parser.add_argument(
+        "-P",
+        "--parsers",
+        help="How many processes to parse the xml's tracks with",
+        type=int,
+    )
+    parser.add_argument(
+        "-w",
+        "--watch",
+        help="Keep running and load again whenever the xml changes",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-t", "--trace", help="Save a Chrome trace of where the time went to this file"
+    )
     parser.add_argument("-v", "--verbose", help="Log verbosely", action="store_true")
     parser.add_argument("-d", "--debug", help="Log debug messages", action="store_true")
 
@@ -345,10 +1369,35 @@ def main():
         logging.getLogger().setLevel(logging.INFO)
     if args.debug:
         logging.getLogger().setLevel(logging.DEBUG)
+    if args.trace:
+        atexit.register(itdbtrace.write_trace, args.trace)
     if args.force:
         config.set("loader", "force", "true")
-
-    load_itdb(config)
+    if args.showmax:
+        config.set("loader", "showmax", "true")
+    if args.profile:
+        config.set("loader", "profile", args.profile)
+    if args.incremental:
+        config.set("loader", "incremental", "true")
+    if args.jobs:
+        config.set("loader", "workers", str(args.jobs))
+    if args.parsers:
+        config.set("loader", "parsers", str(args.parsers))
+
+    libraries = get_libraries(config)
+    if args.watch:
+        watch(libraries, config)
+        return
+    workers = min(config.getint("loader", "workers"), len(libraries))
+    if workers > 1 and itdbstore.is_sqlite(config):
+        # sqlite only lets one connection write at a time
+        logging.warning("Loading one library at a time with SQLite")
+        workers = 1
+    if workers > 1:
+        load_libraries(libraries, workers)
+    else:
+        for library in libraries.values():
+            load_itdb(library)
 
 
 if __name__ == "__main__":
@@ -14,66 +14,27 @@ __author__ = "wtwf.com (Alex K)"
 
 import argparse
 import atexit
-import collections
 import configparser
-import datetime
 import html
 import json
 import logging
 import os
 import subprocess
+import sys
 import urllib.parse
 
 import argcomplete
-import humanize
 import tqdm
 
-import MySQLdb
+import itdbstore
+import itdbtrace
 
 
-class LogRuntime:
-    RUNTIMES = collections.defaultdict(list)
-
-    def __init__(self, name=None, args=None, kwargs=None):
-        self.args = args or []
-        self.kwargs = kwargs or []
-        self.name = name
-
-    def __call__(self, func):
-        def wrapped_f(*args, **kwargs):
-            start = datetime.datetime.now()
-            reply = func(*args, **kwargs)
-            delta = start - datetime.datetime.now()
-            description = self.name or func.__name__
-            description += "("
-            description += ", ".join(
-                [args[x] for x in self.args] + [f"{x}={kwargs[x]}" for x in self.kwargs]
-            )
-            description += ")"
-            LogRuntime.RUNTIMES[description].append(delta)
-            return reply
-
-        return wrapped_f
-
-    @staticmethod
-    def show_runtimes():
-        print("\nRuntimes:\n")
-        for desc, deltas in LogRuntime.RUNTIMES.items():
-            duration = ", ".join([humanize.naturaldelta(delta) for delta in deltas])
-            print(f"{desc}: {duration}")
-
-
-atexit.register(LogRuntime.show_runtimes)
+atexit.register(itdbtrace.show_runtimes)
 
 
 def db_connect(config):
-    logging.info("Connecting to MySQL")
-    return MySQLdb.connect(
-        host=config.get("client", "host"),
-        db=config.get("client", "database"),
-        user=config.get("client", "user"),
-        passwd=config.get("client", "password"),
-    )
+    return itdbstore.connect(config)
 
 
 def get_config():
@@ -132,8 +93,10 @@ class ItdbMetadata:
         self.cursor.execute(sql)
         return self.cursor.fetchall()
 
+    @itdbtrace.LogRuntime()
     def get(self):
         locations = self.get_locations()
+        itdbtrace.add_rows(len(locations))
         for location, persistent_id in tqdm.tqdm(locations):
             file_location = html.unescape(urllib.parse.unquote(location))[7:]
             if os.path.exists(file_location):
@@ -178,7 +141,7 @@ class ItdbMetadata:
             logging.error("Failed for: %r %r", persistent_id, e)
 
 
-@LogRuntime()
+@itdbtrace.LogRuntime()
 def main():
     """Parse args and do the thing."""
     logging.basicConfig()
@@ -189,6 +152,9 @@ def main():
     parser = argparse.ArgumentParser(description="Program to do the thing.")
     parser.add_argument("-p", "--password", help="Password")
     parser.add_argument("-size", "--size", help="Size", type=int)
+    parser.add_argument(
+        "-t", "--trace", help="Save a Chrome trace of where the time went to this file"
+    )
     parser.add_argument("-v", "--verbose", help="Log verbosely", action="store_true")
     parser.add_argument("-d", "--debug", help="Log debug messages", action="store_true")
 
@@ -199,6 +165,8 @@ def main():
         logging.getLogger().setLevel(logging.INFO)
     if args.debug:
         logging.getLogger().setLevel(logging.DEBUG)
+    if args.trace:
+        atexit.register(itdbtrace.write_trace, args.trace)
 
     logging.info("Log")
     print("hello")
@@ -0,0 +1,402 @@
+# Copyright 2026 Alex K (wtwf.com)
+
+"""Tracks and playlists held in memory without a dict for each one.
+
+The xml gives every track as a dict of about 60 keys with spaces in
+them. That's a lot of memory for a whole library and every lookup hashes
+a string. A Track has a slot for each key we know (Name is track.name,
+Play Date UTC is track.play_date_utc) and a Playlist keeps its Track IDs
+in an array of 32 bit ints. Strings that lots of tracks share (Artist,
+Album, Genre, Kind...) are interned so there's only one copy of each.
+
+Tracks holds a whole library a column at a time: an array of 64 bit
+ints for each integer and date key, a bytearray for each boolean and a
+list of strings for the rest. That's a small fraction of the memory of
+the track dicts and a column (every track's Name say) is just a list.
+
+Both Track and Playlist also answer get(key) with the plist key, so
+code written for the dicts works with them as well. Keys we don't have a
+slot for end up in extra.
+"""
+
+__author__ = "wtwf.com (Alex K)"
+
+import array
+import datetime
+import sys
+
+# (plist key, kind) for each track key we have a slot for
+TRACK_FIELDS = (
+    ("Track ID", "int"),
+    ("Name", "str"),
+    ("Artist", "shared"),
+    ("Album Artist", "shared"),
+    ("Composer", "shared"),
+    ("Album", "shared"),
+    ("Grouping", "shared"),
+    ("Work", "shared"),
+    ("Genre", "shared"),
+    ("Kind", "shared"),
+    ("Comments", "str"),
+    ("Series", "shared"),
+    ("Episode", "str"),
+    ("Episode Order", "int"),
+    ("Season", "int"),
+    ("Content Rating", "shared"),
+    ("Size", "int"),
+    ("Total Time", "int"),
+    ("Start Time", "int"),
+    ("Stop Time", "int"),
+    ("Disc Number", "int"),
+    ("Disc Count", "int"),
+    ("Track Number", "int"),
+    ("Track Count", "int"),
+    ("Year", "int"),
+    ("BPM", "int"),
+    ("Date Modified", "date"),
+    ("Date Added", "date"),
+    ("Release Date", "date"),
+    ("Bit Rate", "int"),
+    ("Sample Rate", "int"),
+    ("Volume Adjustment", "int"),
+    ("Play Count", "int"),
+    ("Play Date", "int"),
+    ("Play Date UTC", "date"),
+    ("Skip Count", "int"),
+    ("Skip Date", "date"),
+    ("Rating", "int"),
+    ("Album Rating", "int"),
+    ("Artwork Count", "int"),
+    ("Normalization", "int"),
+    ("Persistent ID", "str"),
+    ("Track Type", "shared"),
+    ("File Type", "int"),
+    ("File Creator", "int"),
+    ("Location", "str"),
+    ("File Folder Count", "int"),
+    ("Library Folder Count", "int"),
+    ("Sort Name", "str"),
+    ("Sort Artist", "shared"),
+    ("Sort Album Artist", "shared"),
+    ("Sort Composer", "shared"),
+    ("Sort Album", "shared"),
+    ("Sort Series", "shared"),
+    ("Compilation", "bool"),
+    ("Has Video", "bool"),
+    ("Purchased", "bool"),
+    ("Protected", "bool"),
+    ("TV Show", "bool"),
+    ("Movie", "bool"),
+    ("Music Video", "bool"),
+    ("Podcast", "bool"),
+    ("Unplayed", "bool"),
+    ("Disabled", "bool"),
+    ("Loved", "bool"),
+    ("Explicit", "bool"),
+    ("Clean", "bool"),
+    ("Album Rating Computed", "bool"),
+    ("Rating Computed", "bool"),
+    ("Part Of Gapless Album", "bool"),
+)
+
+# (plist key, kind) for each playlist key we have a slot for, Playlist
+# Items is kept as track_ids
+PLAYLIST_FIELDS = (
+    ("Playlist ID", "int"),
+    ("Name", "str"),
+    ("Description", "str"),
+    ("Playlist Persistent ID", "str"),
+    ("Parent Persistent ID", "str"),
+    ("Distinguished Kind", "int"),
+    ("Folder", "bool"),
+    ("Master", "bool"),
+    ("Visible", "bool"),
+    ("All Items", "bool"),
+    ("Smart Info", "data"),
+    ("Smart Criteria", "data"),
+)
+
+# how each kind of value is stored in a slot, None means as it is
+CONVERTERS = {
+    "int": int,
+    "str": None,
+    "shared": sys.intern,
+    "bool": bool,
+    "date": None,
+    "data": None,
+}
+
+# what Tracks keeps for a missing int or date, and a missing bool
+MISSING_INT = -(1 << 63)
+MISSING_BOOL = 2
+
+# dates are kept in Tracks as seconds since this
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def attribute_name(key):
+    """The slot for a plist key, Play Date UTC is play_date_utc."""
+    return key.lower().replace(" ", "_")
+
+
+def field_table(fields):
+    """plist key: (slot, converter) for each of fields."""
+    return {key: (attribute_name(key), CONVERTERS[kind]) for key, kind in fields}
+
+
+class Record:
+    """What Track and Playlist have in common, see FIELDS in each."""
+
+    __slots__ = ("extra",)
+    FIELDS = ()
+    KEYS = {}
+
+    def __init__(self, **values):
+        for key, _ in self.FIELDS:
+            setattr(self, self.KEYS[key][0], None)
+        self.extra = None
+        for attribute, value in values.items():
+            setattr(self, attribute, value)
+
+    @classmethod
+    def from_plist(cls, plist):
+        """A record from a plist dict (like itdbplist.Library gives out)."""
+        record = cls()
+        keys = cls.KEYS
+        for key, value in plist.items():
+            field = keys.get(key)
+            if field is None:
+                record.set_extra(key, value)
+                continue
+            attribute, convert = field
+            setattr(record, attribute, value if convert is None else convert(value))
+        return record
+
+    def set_extra(self, key, value):
+        if self.extra is None:
+            self.extra = {}
+        self.extra[key] = value
+
+    def get(self, key, default=None):
+        """The value for a plist key, like dict.get."""
+        field = self.KEYS.get(key)
+        if field is None:
+            value = self.extra and self.extra.get(key)
+        else:
+            value = getattr(self, field[0])
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def to_plist(self):
+        """The plist dict this record came from."""
+        plist = {}
+        for key, (attribute, _) in self.KEYS.items():
+            value = getattr(self, attribute)
+            if value is not None:
+                plist[key] = value
+        if self.extra:
+            plist.update(self.extra)
+        return plist
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_plist() == other.to_plist()
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, self.to_plist())
+
+
+class Track(Record):
+    """One track, track.name is its Name."""
+
+    FIELDS = TRACK_FIELDS
+    KEYS = field_table(TRACK_FIELDS)
+    __slots__ = tuple(attribute for attribute, _ in KEYS.values())
+
+
+class Playlist(Record):
+    """One playlist, its Playlist Items are the Track IDs in track_ids."""
+
+    FIELDS = PLAYLIST_FIELDS
+    KEYS = field_table(PLAYLIST_FIELDS)
+    __slots__ = tuple(attribute for attribute, _ in KEYS.values()) + ("track_ids",)
+
+    def __init__(self, **values):
+        self.track_ids = array.array("i")
+        super().__init__(**values)
+
+    @classmethod
+    def from_plist(cls, plist):
+        items = plist.get("Playlist Items")
+        if items is not None:
+            plist = dict(plist)
+            del plist["Playlist Items"]
+        playlist = super().from_plist(plist)
+        if items is not None:
+            playlist.track_ids = array.array("i", [int(x["Track ID"]) for x in items])
+        return playlist
+
+    def get(self, key, default=None):
+        if key == "Playlist Items":
+            return self.playlist_items() if self.track_ids else default
+        return super().get(key, default)
+
+    def playlist_items(self):
+        """The Playlist Items the way the xml has them."""
+        return [{"Track ID": track_id} for track_id in self.track_ids]
+
+    def to_plist(self):
+        plist = super().to_plist()
+        if self.track_ids:
+            plist["Playlist Items"] = self.playlist_items()
+        return plist
+
+
+class Tracks:
+    """A library's tracks a column at a time.
+
+    tracks[n] is the nth Track (made when you ask for it), track(track_id)
+    finds one by Track ID and column("Name") is every track's Name in
+    order (None where a track doesn't have one). There's only a column for
+    the keys some track has.
+    """
+
+    def __init__(self):
+        self.kinds = dict(TRACK_FIELDS)
+        # plist key: column, in the order the keys were first seen
+        self.columns = {}
+        # Track ID: row
+        self.rows = {}
+        # row: {key: value} of what we don't have a column for
+        self.extra = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, track):
+        """Add a track, either a plist dict or a Track."""
+        if isinstance(track, Track):
+            track = track.to_plist()
+        kinds = self.kinds
+        for key in track.keys() - self.columns.keys():
+            if key in kinds:
+                self.add_column(key)
+        for key, column in self.columns.items():
+            column.append(stored(kinds[key], track.get(key)))
+        extra = {key: value for key, value in track.items() if key not in kinds}
+        if extra:
+            self.extra[self.count] = extra
+        track_id = track.get("Track ID")
+        if track_id is not None:
+            self.rows[int(track_id)] = self.count
+        self.count += 1
+
+    def add_column(self, key):
+        kind = self.kinds[key]
+        column = new_column(kind)
+        # the tracks we already have don't have this key
+        column.extend([stored(kind, None)] * self.count)
+        self.columns[key] = column
+
+    def extend(self, tracks):
+        for track in tracks:
+            self.append(track)
+
+    def value(self, key, row):
+        """The value of key for the track in row (or None)."""
+        kind = self.kinds.get(key)
+        if kind is None:
+            return self.extra.get(row, {}).get(key)
+        column = self.columns.get(key)
+        return None if column is None else loaded(kind, column[row])
+
+    def column(self, key):
+        """Every track's value for key, in order."""
+        kind = self.kinds[key]
+        column = self.columns.get(key)
+        if column is None:
+            return [None] * self.count
+        if kind in ("str", "shared"):
+            return column
+        return [loaded(kind, value) for value in column]
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += self.count
+        if not 0 <= row < self.count:
+            raise IndexError(row)
+        track = Track()
+        keys = Track.KEYS
+        for key, column in self.columns.items():
+            setattr(track, keys[key][0], loaded(self.kinds[key], column[row]))
+        extra = self.extra.get(row)
+        if extra:
+            track.extra = dict(extra)
+        return track
+
+    def __iter__(self):
+        for row in range(self.count):
+            yield self[row]
+
+    def track(self, track_id):
+        """The Track with track_id (or None)."""
+        row = self.rows.get(int(track_id))
+        return None if row is None else self[row]
+
+    @classmethod
+    def from_library(cls, library):
+        """All the tracks of an itdbplist.Library."""
+        tracks = cls()
+        tracks.extend(library.tracks())
+        return tracks
+
+
+def new_column(kind):
+    if kind in ("int", "date"):
+        return array.array("q")
+    if kind == "bool":
+        return bytearray()
+    return []
+
+
+def stored(kind, value):
+    """value the way a Tracks column of kind keeps it."""
+    if kind == "int":
+        return MISSING_INT if value is None else int(value)
+    if kind == "date":
+        if value is None:
+            return MISSING_INT
+        return (value - EPOCH) // datetime.timedelta(seconds=1)
+    if kind == "bool":
+        return MISSING_BOOL if value is None else int(bool(value))
+    if kind == "shared" and value is not None:
+        return sys.intern(value)
+    return value
+
+
+def loaded(kind, value):
+    """The value stored() stored."""
+    if kind == "int":
+        return None if value == MISSING_INT else value
+    if kind == "date":
+        return (
+            None if value == MISSING_INT else EPOCH + datetime.timedelta(seconds=value)
+        )
+    if kind == "bool":
+        return None if value == MISSING_BOOL else bool(value)
+    return value
+
+
+def read_library(library):
+    """The Tracks and a list of Playlists in an itdbplist.Library."""
+    tracks = Tracks.from_library(library)
+    playlists = [Playlist.from_plist(x) for x in library.playlists()]
+    return tracks, playlists
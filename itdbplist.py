@@ -0,0 +1,636 @@
+# Copyright 2026 Alex K (wtwf.com)
+
+"""Stream tracks and playlists out of an iTunes library xml file.
+
+plistlib.load builds the whole library in memory before you get to see
+any of it. This walks the xml with iterparse and hands back one track or
+playlist at a time, throwing away the elements it has already converted,
+so memory stays flat no matter how big the library is.
+
+Give Library a snapshot filename and it also pickles what it parses into
+that file as it goes. Next time, if the xml is the same (same size and
+mtime, or failing that the same sha1), the items come straight out of the
+snapshot which is a lot quicker than parsing xml.
+
+With parsers > 1 the Tracks section is cut into pieces at track
+boundaries and the pieces are parsed in that many processes at once
+(the rest of the file is parsed as usual). The tracks still come out in
+file order and exactly as they would from one process.
+
+The xml can be gzip, xz or zstd compressed (going by its first few
+bytes, not its name), it's decompressed as it's parsed. zstd needs
+pip3 install zstandard. The sha1 is of the file as it is on disk.
+
+With clean=True whatever isn't allowed in xml (control characters, or
+character references to them, and bytes that aren't utf-8) is dropped or
+fixed on the way into the parser, and logged with its byte offset,
+instead of stopping the parse.
+"""
+
+__author__ = "wtwf.com (Alex K)"
+
+import base64
+import collections
+import concurrent.futures
+import contextlib
+import datetime
+import gzip
+import hashlib
+import logging
+import lzma
+import mmap
+import os
+import pickle
+import re
+import struct
+import xml.etree.ElementTree as ElementTree
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# the top level keys that hold one item per entry, in the order iTunes writes them
+SECTIONS = ("Tracks", "Playlists")
+
+# snapshots start with magic, version and where the trailer is
+SNAPSHOT_MAGIC = b"ITDBSNAP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8sIQ")
+# how many items go in each pickle in a snapshot
+SNAPSHOT_BATCH_SIZE = 1000
+# where snapshots (and itdbxmlindex indexes) of an xml file are kept
+CACHE_DIRECTORY = os.path.expanduser("~/.cache/itdb")
+
+# how each kind of compressed file starts
+COMPRESSION_MAGIC = (
+    (b"\x1f\x8b", "gzip"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+)
+
+# what xml 1.0 doesn't allow: control characters and references to them
+CONTROL_BYTES = bytes(x for x in range(32) if x not in b"\t\n\r")
+INVALID_REFERENCE_RE = re.compile(
+    rb"&#(?:0*(?:[0-8]|1[124-9]|2[0-9]|3[01])|[xX]0*(?:[0-8bBcCeEfF]|1[0-9a-fA-F]));"
+)
+INVALID_XML_RE = re.compile(
+    rb"[\x00-\x08\x0b\x0c\x0e-\x1f]|" + INVALID_REFERENCE_RE.pattern
+)
+# how far back from the end of a chunk a character reference could start
+MAX_REFERENCE_LENGTH = 16
+# after this many we just count the fixes
+MAX_LOGGED_FIXES = 100
+
+# about how many bytes of tracks each parser process gets at a time
+PARSE_CHUNK_SIZE = 4 << 20
+# the start of each track in the Tracks dict, <key>123</key><dict>
+TRACK_START_RE = re.compile(rb"<key>\d+</key>\s*<dict>")
+
+
+class Library:
+    """An iTunes library xml file that is read lazily.
+
+    Sections are read in file order, so iterate over tracks() before
+    playlists(). Asking for playlists first just skips over the tracks.
+    If the file has Playlists before Tracks they're kept in memory while
+    tracks() gets to the tracks.
+    Top level keys that aren't sections (Major Version, Music Folder...)
+    end up in header as they are found.
+    """
+
+    def __init__(self, filename, snapshot=None, parsers=1, clean=False):
+        self.filename = filename
+        self.snapshot = snapshot
+        self.parsers = parsers
+        self.clean = clean
+        self.header = {}
+        self._items = None
+        self._pending = None
+        # section: [value, ...] of a section that was in the way
+        self._buffered = {}
+        self._digest = None
+
+    def digest(self):
+        """The sha1 of the xml file (from the snapshot when that's still good)."""
+        if self._digest is None and self._fresh_snapshot() is None:
+            self._digest = file_digest(self.filename)
+        return self._digest
+
+    def tracks(self):
+        """Yield each track dict from the Tracks section."""
+        return self._section("Tracks")
+
+    def playlists(self):
+        """Yield each playlist dict from the Playlists section."""
+        return self._section("Playlists")
+
+    def _section(self, name):
+        if self._buffered.get(name):
+            # the whole section went by while we were after another one
+            yield from self._buffered.pop(name)
+            return
+        if self._items is None:
+            self._items = self._parse()
+        found = False
+        while True:
+            if self._pending is not None:
+                item, self._pending = self._pending, None
+            else:
+                item = next(self._items, None)
+                if item is None:
+                    # start again from the top if anyone asks for more
+                    self._items = None
+                    return
+            section = item[0]
+            if section == name:
+                found = True
+                yield item[1]
+            elif found:
+                # we're past this section
+                self._pending = item
+                return
+            elif SECTIONS.index(section) > SECTIONS.index(name):
+                # Playlists before Tracks (plistlib sorts the keys like that),
+                # keep them for when they're asked for
+                self._buffered.setdefault(section, []).append(item[1])
+
+    def _parse(self):
+        trailer = self._fresh_snapshot()
+        if trailer is not None:
+            logging.info("Reading snapshot: %s", self.snapshot)
+            self.header.update(trailer["header"])
+            yield from read_snapshot(self.snapshot, trailer)
+        elif self.snapshot:
+            yield from self._parse_and_snapshot()
+        else:
+            yield from self._parse_xml()
+
+    def _parse_xml(self):
+        """Yield (section, value) from the xml, in parallel if we can."""
+        # more processes than cores would just get in each other's way
+        parsers = min(self.parsers, os.cpu_count() or 1)
+        kind = compression(self.filename)
+        if kind and parsers > 1:
+            # we can't jump into the middle of compressed tracks
+            logging.info("Parsing %s compressed xml in one process", kind)
+        ranges = parsers > 1 and not kind and track_ranges(self.filename, parsers)
+        if not ranges:
+            with open(self.filename, "rb") as infile, decompress(infile, kind) as xml:
+                yield from iter_items(self._cleaned(xml), self.header)
+            return
+        logging.info(
+            "Parsing tracks in %d pieces with %d processes", len(ranges), parsers
+        )
+        yield from parse_tracks_in_parallel(self.filename, ranges, parsers, self.clean)
+        # and everything else (with an empty Tracks dict) as usual
+        with open(self.filename, "rb") as infile:
+            skipped = SkipReader(infile, ranges[0][0], ranges[-1][1])
+            yield from iter_items(self._cleaned(skipped), self.header)
+
+    def _cleaned(self, infile):
+        return CleanReader(infile) if self.clean else infile
+
+    def _fresh_snapshot(self):
+        """The snapshot's trailer if it was made from this xml, otherwise None."""
+        if not self.snapshot:
+            return None
+        trailer = read_trailer(self.snapshot)
+        if trailer is None:
+            return None
+        info = os.stat(self.filename)
+        if trailer["size"] != info.st_size:
+            return None
+        if trailer["mtime"] != info.st_mtime_ns:
+            # touched but maybe not changed
+            if self._digest is None:
+                self._digest = file_digest(self.filename)
+            if self._digest != trailer["sha1"]:
+                return None
+        self._digest = trailer["sha1"]
+        return trailer
+
+    def _parse_and_snapshot(self):
+        logging.info("Writing snapshot: %s", self.snapshot)
+        info = os.stat(self.filename)
+        with SnapshotWriter(self.snapshot) as writer:
+            if self.parsers > 1:
+                for item in self._parse_xml():
+                    writer.add(*item)
+                    yield item
+                self._digest = file_digest(self.filename)
+            else:
+                with open(self.filename, "rb") as infile:
+                    reader = DigestReader(infile)
+                    with decompress(reader, compression(self.filename)) as xml:
+                        for item in iter_items(self._cleaned(xml), self.header):
+                            writer.add(*item)
+                            yield item
+                    # the decompressor might not have needed the last few bytes
+                    for _ in iter(lambda: reader.read(1 << 20), b""):
+                        pass
+                    self._digest = reader.digest.hexdigest()
+            writer.finish(
+                {
+                    "size": info.st_size,
+                    "mtime": info.st_mtime_ns,
+                    "sha1": self._digest,
+                    "header": self.header,
+                }
+            )
+
+
+def iter_items(infile, header=None):
+    """Yield (section, value) for every track and playlist in a library file."""
+    stack = []
+    key = None
+    for event, elem in ElementTree.iterparse(infile, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+        stack.pop()
+        depth = len(stack)
+        if depth == 2:
+            # <plist><dict><here>
+            if elem.tag == "key":
+                key = elem.text
+            elif key not in SECTIONS and header is not None:
+                header[key] = plist_value(elem)
+            stack[-1].clear()
+        elif depth == 3 and key in SECTIONS and elem.tag != "key":
+            yield key, plist_value(elem)
+            # drop everything we've seen so far in this section
+            stack[-1].clear()
+
+
+def track_ranges(filename, pieces):
+    """Cut the Tracks dict into [(start, end), ...] byte ranges of whole tracks.
+
+    There are at least pieces of them (if there are that many tracks).
+    Returns None if the file doesn't look like we expect.
+    """
+    with open(filename, "rb") as infile:
+        if os.fstat(infile.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            key = data.find(b"<key>Tracks</key>")
+            if key < 0:
+                return None
+            first = TRACK_START_RE.search(data, key)
+            playlists = data.find(b"<key>Playlists</key>", key)
+            if playlists < 0:
+                playlists = len(data)
+            # the </dict> that closes Tracks
+            end = data.rfind(b"</dict>", key, playlists)
+            if first is None or end < 0 or first.start() > end:
+                return None
+            start = first.start()
+            size = end - start
+            count = max(pieces, size // PARSE_CHUNK_SIZE)
+            starts = [start]
+            for number in range(1, count):
+                match = TRACK_START_RE.search(data, start + size * number // count, end)
+                if match and match.start() > starts[-1]:
+                    starts.append(match.start())
+    return list(zip(starts, starts[1:] + [end]))
+
+
+def parse_tracks(filename, start, end, clean=False):
+    """The track dicts in filename[start:end] (this runs in a parser process)."""
+    with open(filename, "rb") as infile:
+        infile.seek(start)
+        data = infile.read(end - start)
+    if clean:
+        cleaner = XmlCleaner()
+        data = cleaner.clean(data, start)
+        cleaner.finish()
+    tracks = ElementTree.fromstring(b"<dict>" + data + b"</dict>")
+    return [plist_value(elem) for elem in tracks if elem.tag != "key"]
+
+
+def parse_tracks_in_parallel(filename, ranges, parsers, clean=False):
+    """Yield ("Tracks", track) for every track in ranges, in order."""
+    with concurrent.futures.ProcessPoolExecutor(parsers) as pool:
+        pending = collections.deque()
+        ranges = iter(ranges)
+        while True:
+            # keep every parser busy but don't get too far ahead of the loader
+            while len(pending) < parsers * 2:
+                piece = next(ranges, None)
+                if piece is None:
+                    break
+                pending.append(pool.submit(parse_tracks, filename, *piece, clean))
+            if not pending:
+                return
+            for track in pending.popleft().result():
+                yield "Tracks", track
+
+
+class SkipReader:
+    """Reads a file as if the bytes from start to end weren't there."""
+
+    def __init__(self, infile, start, end):
+        self.infile = infile
+        self.start = start
+        self.end = end
+
+    def read(self, size=-1):
+        position = self.infile.tell()
+        if self.start <= position < self.end:
+            self.infile.seek(self.end)
+        elif position < self.start and (size < 0 or position + size > self.start):
+            size = self.start - position
+        return self.infile.read(size)
+
+    def tell(self):
+        return self.infile.tell()
+
+
+class XmlCleaner:
+    """Drops or fixes what isn't allowed in xml, logging where it was."""
+
+    def __init__(self):
+        self.fixes = 0
+
+    def clean(self, data, offset=0):
+        """data that will parse, offset is where it starts in the file."""
+        # translate is a lot quicker than searching for a character class
+        clean = len(data.translate(None, CONTROL_BYTES)) == len(data)
+        if clean and not INVALID_REFERENCE_RE.search(data):
+            try:
+                data.decode("utf-8")
+                return data
+            except UnicodeDecodeError:
+                pass
+        cleaned = []
+        position = 0
+        for match in INVALID_XML_RE.finditer(data):
+            cleaned.append(
+                self.fix_utf8(data[position : match.start()], offset + position)
+            )
+            self.fixed("Dropped %r at byte %d", match.group(), offset + match.start())
+            position = match.end()
+        cleaned.append(self.fix_utf8(data[position:], offset + position))
+        return b"".join(cleaned)
+
+    def fix_utf8(self, data, offset):
+        """data with any bytes that aren't utf-8 read as latin-1 instead."""
+        fixed = []
+        while True:
+            try:
+                data.decode("utf-8")
+            except UnicodeDecodeError as ex:
+                bad = data[ex.start : ex.end]
+                self.fixed("Replaced non utf-8 %r at byte %d", bad, offset + ex.start)
+                fixed.append(data[: ex.start])
+                fixed.append(bad.decode("latin-1").encode("utf-8"))
+                data = data[ex.end :]
+                offset += ex.end
+                continue
+            fixed.append(data)
+            return b"".join(fixed)
+
+    def fixed(self, message, *args):
+        self.fixes += 1
+        if self.fixes <= MAX_LOGGED_FIXES:
+            logging.warning(message, *args)
+        if self.fixes == MAX_LOGGED_FIXES:
+            logging.warning("Not logging any more fixes")
+
+    def finish(self):
+        if self.fixes:
+            logging.warning("Cleaned %d bad characters out of the xml", self.fixes)
+
+
+class CleanReader:
+    """Reads a file through an XmlCleaner, a chunk at a time."""
+
+    def __init__(self, infile):
+        self.infile = infile
+        self.cleaner = XmlCleaner()
+        # the end of the last chunk, it might be half a character
+        self.pending = b""
+
+    def read(self, size=-1):
+        while True:
+            offset = self.infile.tell() - len(self.pending)
+            data = self.infile.read(size)
+            if not data:
+                data, self.pending = self.pending, b""
+                self.cleaner.finish()
+                return self.cleaner.clean(data, offset)
+            data = self.pending + data
+            keep = incomplete_end(data)
+            data, self.pending = data[:keep], data[keep:]
+            cleaned = self.cleaner.clean(data, offset)
+            # an empty read would look like the end of the file
+            if cleaned:
+                return cleaned
+
+
+def incomplete_end(data):
+    """Where the half a utf-8 character or reference at the end of data starts."""
+    end = len(data)
+    ampersand = data.rfind(b"&", max(0, end - MAX_REFERENCE_LENGTH))
+    if ampersand >= 0 and b";" not in data[ampersand:]:
+        end = ampersand
+    for start in range(end - 1, max(-1, end - 4), -1):
+        byte = data[start]
+        if byte & 0xC0 == 0x80:
+            # a continuation byte, keep looking for the first one
+            continue
+        if byte >= 0xC0:
+            length = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            if end - start < length:
+                return start
+        break
+    return end
+
+
+def compression(filename):
+    """gzip, xz or zstd if that's what filename is compressed with, otherwise None."""
+    with open(filename, "rb") as infile:
+        start = infile.read(8)
+    for magic, kind in COMPRESSION_MAGIC:
+        if start.startswith(magic):
+            return kind
+    return None
+
+
+def decompress(infile, kind):
+    """A file to read infile decompressed with kind (or just infile if kind is None)."""
+    if kind is None:
+        return contextlib.nullcontext(infile)
+    if kind == "gzip":
+        return gzip.GzipFile(fileobj=infile, mode="rb")
+    if kind == "xz":
+        return lzma.LZMAFile(infile)
+    if zstandard is None:
+        raise ValueError("Reading zstd compressed xml needs pip3 install zstandard")
+    return zstandard.ZstdDecompressor().stream_reader(
+        infile, closefd=False, read_across_frames=True
+    )
+
+
+class DigestReader:
+    """Works out the sha1 of a file while something else reads it."""
+
+    def __init__(self, infile):
+        self.infile = infile
+        self.digest = hashlib.sha1()
+
+    def read(self, size=-1):
+        data = self.infile.read(size)
+        self.digest.update(data)
+        return data
+
+    def tell(self):
+        return self.infile.tell()
+
+
+def file_digest(filename):
+    digest = hashlib.sha1()
+    with open(filename, "rb") as infile:
+        for chunk in iter(lambda: infile.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_filename(filename, extension):
+    """Where a cache of filename goes, by its name and a hash of its path."""
+    path = os.path.abspath(filename)
+    return os.path.join(
+        CACHE_DIRECTORY,
+        "%s-%s.%s"
+        % (
+            os.path.basename(path),
+            hashlib.sha1(path.encode()).hexdigest()[:12],
+            extension,
+        ),
+    )
+
+
+def open_private(filename):
+    """Open filename for writing where only we can read it (and its directory)."""
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), mode=0o700, exist_ok=True)
+    return open(os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb")
+
+
+class SnapshotWriter:
+    """Pickles (section, [items]) batches into a snapshot file.
+
+    The snapshot only replaces the old one once finish() is called, so a
+    parse that doesn't make it to the end leaves the old one alone.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.tmp_filename = filename + ".tmp"
+        self.file = None
+        self.section = None
+        self.batch = []
+        self.records = 0
+
+    def __enter__(self):
+        # it has the whole library in it, play history and all
+        self.file = open_private(self.tmp_filename)
+        self.file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0))
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            os.remove(self.tmp_filename)
+
+    def add(self, section, value):
+        if section != self.section or len(self.batch) == SNAPSHOT_BATCH_SIZE:
+            self.flush()
+            self.section = section
+        self.batch.append(value)
+
+    def flush(self):
+        if self.batch:
+            pickle.dump((self.section, self.batch), self.file, pickle.HIGHEST_PROTOCOL)
+            self.records += 1
+            self.batch = []
+
+    def finish(self, trailer):
+        self.flush()
+        offset = self.file.tell()
+        trailer["records"] = self.records
+        pickle.dump(trailer, self.file, pickle.HIGHEST_PROTOCOL)
+        self.file.seek(0)
+        self.file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, offset))
+        self.file.close()
+        self.file = None
+        os.replace(self.tmp_filename, self.filename)
+
+
+def read_trailer(filename):
+    """The size, mtime, sha1, header and records of a snapshot (None if it's no good)."""
+    try:
+        with open(filename, "rb") as infile:
+            magic, version, offset = SNAPSHOT_HEADER.unpack(
+                infile.read(SNAPSHOT_HEADER.size)
+            )
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or not offset:
+                return None
+            infile.seek(offset)
+            return pickle.load(infile)
+    except (OSError, struct.error, pickle.UnpicklingError, EOFError) as ex:
+        logging.debug("Not using snapshot %s: %r", filename, ex)
+        return None
+
+
+def read_snapshot(filename, trailer):
+    """Yield (section, value) for every track and playlist in a snapshot."""
+    with open(filename, "rb") as infile:
+        infile.seek(SNAPSHOT_HEADER.size)
+        for _ in range(trailer["records"]):
+            section, batch = pickle.load(infile)
+            for value in batch:
+                yield section, value
+
+
+def plist_value(elem):
+    """Convert a plist element (and its children) the same way plistlib does."""
+    tag = elem.tag
+    if tag == "string":
+        return elem.text or ""
+    if tag == "integer":
+        return int(elem.text)
+    if tag == "dict":
+        value = {}
+        key = None
+        for child in elem:
+            if child.tag == "key":
+                key = child.text or ""
+            else:
+                value[key] = plist_value(child)
+        return value
+    if tag == "true":
+        return True
+    if tag == "false":
+        return False
+    if tag == "date":
+        return parse_date(elem.text)
+    if tag == "array":
+        return [plist_value(child) for child in elem]
+    if tag == "real":
+        return float(elem.text)
+    if tag == "data":
+        return base64.b64decode(elem.text or "")
+    raise ValueError("Unknown plist element: %r" % tag)
+
+
+def parse_date(text):
+    """Dates look like 2006-03-05T10:32:41Z and are always UTC."""
+    return datetime.datetime(
+        int(text[0:4]),
+        int(text[5:7]),
+        int(text[8:10]),
+        int(text[11:13]),
+        int(text[14:16]),
+        int(text[17:19]),
+    )
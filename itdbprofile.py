@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# Copyright 2026 Alex K (wtwf.com)
+# PYTHON_ARGCOMPLETE_OK
+
+"""Suggest narrower column types for tracks from what's really in the xml.
+
+show_max_lengths only says how long the longest value of each key is. A
+Profile also keeps a histogram of how long the values are (in powers of
+two), the smallest and largest integers and how many different values
+each key has (up to a point). From that alter_script() suggests the
+smallest MySQL type that still fits every value (with room to grow) for
+each column in itdb.sql's tracks table (where that's smaller than it is
+now, or where what's there now is too small), adds columns for keys the table
+doesn't have and points out text columns with only a handful of
+different values that could be an ENUM or numbered in a table of their
+own (like kinds). proposed_schema() is the same thing as a new CREATE
+TABLE tracks for itdb.sql.
+
+Run it on its own to profile the xml without loading it, or load with
+itdbloader.py --profile shrink.sql.
+"""
+
+__author__ = "wtwf.com (Alex K)"
+
+import argparse
+import collections
+import configparser
+import logging
+import os
+import re
+import sys
+
+import argcomplete
+
+import itdbindex
+import itdbplist
+import itdbstore
+
+# stop remembering the different values of a key after this many
+CARDINALITY_LIMIT = 256
+# text keys with this few values could be an ENUM
+ENUM_LIMIT = 16
+# leave room for numbers twice as big as the biggest one we've seen
+HEADROOM = 2
+# the smallest VARCHAR we suggest
+MIN_VARCHAR = 8
+# ids that have to match the other tables' columns
+KEY_COLUMNS = ("User_ID", "Track_ID")
+
+# integer types from smallest to largest, with how many bytes they take
+INTEGER_TYPES = (
+    ("TINYINT", 1),
+    ("SMALLINT", 2),
+    ("MEDIUMINT", 3),
+    ("INTEGER", 4),
+    ("BIGINT", 8),
+)
+
+CREATE_TRACKS_RE = re.compile(
+    r"^CREATE TABLE tracks \($(?P<body>.*?)^\);", re.MULTILINE | re.DOTALL
+)
+# Name VARCHAR(1024) DEFAULT '',
+COLUMN_RE = re.compile(
+    r"^(?P<name>\w+) (?P<type>\w+(?:\(\d+\))?(?: UNSIGNED)?)(?P<rest>[^,\n]*),?$",
+    re.IGNORECASE,
+)
+# Sort_Name(64) in an index definition
+PREFIX_RE = re.compile(r"(\w+)\((\d+)\)")
+# keys we could make a column out of
+COLUMN_KEY_RE = re.compile(r"^[A-Za-z][A-Za-z0-9 ]*$")
+
+
+class KeyProfile:
+    """What we've seen of one key's values."""
+
+    def __init__(self):
+        self.count = 0
+        self.types = set()
+        # how many values were 1, 2-3, 4-7, 8-15... characters long
+        self.lengths = collections.Counter()
+        self.longest = ""
+        self.min = None
+        self.max = None
+        # the different values, until there are too many to care
+        self.values = set()
+
+    def add(self, value):
+        self.count += 1
+        self.types.add(type(value).__name__)
+        if isinstance(value, int) and not isinstance(value, bool):
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+        text = value if isinstance(value, str) else str(value)
+        self.lengths[len(text).bit_length()] += 1
+        if self.count == 1 or len(text) > len(self.longest):
+            self.longest = text
+        if len(self.values) <= CARDINALITY_LIMIT:
+            self.values.add(value)
+
+    @property
+    def cardinality(self):
+        """How many different values, or None if there were too many to count."""
+        if len(self.values) > CARDINALITY_LIMIT:
+            return None
+        return len(self.values)
+
+    def length_percentile(self, fraction):
+        """The length that fraction of the values are no longer than (roughly)."""
+        seen = 0
+        for bits in sorted(self.lengths):
+            seen += self.lengths[bits]
+            if seen >= self.count * fraction:
+                return min((1 << bits) - 1, len(self.longest))
+        return len(self.longest)
+
+    def kind(self):
+        """bool, int, datetime or str, or None if the values are a mixture."""
+        if len(self.types) != 1:
+            return None
+        kind = next(iter(self.types))
+        return kind if kind in ("bool", "int", "datetime", "str") else None
+
+    def fits(self, column_type):
+        """Does every value we've seen fit in column_type."""
+        kind, size = type_size(column_type)
+        if kind == "str":
+            return len(self.longest) <= size
+        if kind == "int" and self.min is not None:
+            return integer_fits(normal_type(column_type), self.min, self.max)
+        return True
+
+    def suggest(self):
+        """The smallest MySQL type that fits what we've seen (or None)."""
+        kind = self.kind()
+        if kind == "bool":
+            return "BOOLEAN"
+        if kind == "datetime":
+            return "DATETIME"
+        if kind == "int":
+            return integer_type(self.min, self.max)
+        if kind == "str":
+            size = MIN_VARCHAR
+            while size <= len(self.longest):
+                size *= 2
+            return "VARCHAR(%d)" % size
+        return None
+
+
+class Profile:
+    """A KeyProfile for every key of every track added."""
+
+    def __init__(self):
+        self.keys = {}
+        self.tracks = 0
+
+    def add(self, track):
+        self.tracks += 1
+        keys = self.keys
+        for key, value in track.items():
+            profile = keys.get(key)
+            if profile is None:
+                profile = keys[key] = KeyProfile()
+            profile.add(value)
+
+    def longest(self):
+        """Map each key to its longest value (what show_max_lengths prints)."""
+        return {key: profile.longest for key, profile in self.keys.items()}
+
+
+def integer_type(low, high):
+    """The smallest integer type that holds low and high HEADROOM times over."""
+    unsigned = " UNSIGNED" if low >= 0 else ""
+    for name, _ in INTEGER_TYPES:
+        if integer_fits(name + unsigned, low * HEADROOM, high * HEADROOM):
+            return name + unsigned
+    return "BIGINT" + unsigned
+
+
+def integer_fits(column_type, low, high):
+    """Do low and high fit in an integer type like SMALLINT UNSIGNED."""
+    _, size = type_size(column_type)
+    bits = size * 8
+    if column_type.endswith("UNSIGNED"):
+        return 0 <= low and high < 1 << bits
+    limit = 1 << (bits - 1)
+    return -limit <= low and high < limit
+
+
+def type_size(column_type):
+    """(kind, bytes for ints or characters for VARCHARs), kind is None for others."""
+    column_type = normal_type(column_type)
+    match = re.match(r"VARCHAR\((\d+)\)$", column_type)
+    if match:
+        return "str", int(match.group(1))
+    for name, size in INTEGER_TYPES:
+        if column_type.split()[0] == name:
+            return "int", size
+    return None, None
+
+
+def normal_type(column_type):
+    """INTEGER(1) is just an INTEGER (the 1 is only how wide to show it)."""
+    column_type = column_type.upper()
+    if column_type.startswith(("BOOL", "TINYINT(1)")):
+        return "BOOLEAN"
+    column_type = re.sub(r"^(\w*INT\w*)\(\d+\)", r"\1", column_type)
+    return re.sub(r"^INT\b", "INTEGER", column_type)
+
+
+def schema_columns(sql=None):
+    """[(name, type, the rest of its definition)] for tracks from itdb.sql."""
+    if sql is None:
+        with open(itdbstore.SCHEMA_FILE) as schema:
+            sql = schema.read()
+    columns = []
+    for line in CREATE_TRACKS_RE.search(sql).group("body").splitlines():
+        match = COLUMN_RE.match(line.strip())
+        if match and match.group("name").upper() != "PRIMARY":
+            columns.append(
+                (match.group("name"), match.group("type"), match.group("rest"))
+            )
+    return columns
+
+
+def changes(profile, columns):
+    """Yield (column, old type or None for a new column, new type, note)."""
+    names = {name for name, _, _ in columns}
+    prefixes = index_prefixes()
+    for name, column_type, _ in columns:
+        key = profile.keys.get(name.replace("_", " "))
+        suggested = key and key.suggest()
+        if not suggested or name in KEY_COLUMNS:
+            continue
+        kind, size = type_size(column_type)
+        new_kind, new_size = type_size(suggested)
+        if kind is None or kind != new_kind:
+            # only make VARCHARs and integers smaller (or big enough)
+            continue
+        if new_kind == "str" and new_size < prefixes.get(name, 0):
+            # an index can't use more of a column than there is
+            new_size = prefixes[name]
+            suggested = "VARCHAR(%d)" % new_size
+        if not key.fits(column_type):
+            yield name, column_type, suggested, describe(key) + " (too small now)"
+        elif new_size < size:
+            yield name, column_type, suggested, describe(key)
+    for key_name, key in sorted(profile.keys.items()):
+        name = key_name.replace(" ", "_")
+        if name in names or not COLUMN_KEY_RE.match(key_name):
+            continue
+        suggested = key.suggest()
+        if suggested:
+            yield name, None, suggested, describe(key)
+
+
+def index_prefixes():
+    """Map each tracks column to the longest prefix of it an index uses."""
+    prefixes = {}
+    for definition in itdbindex.schema_indexes().get("tracks", {}).values():
+        for column, length in PREFIX_RE.findall(definition):
+            prefixes[column] = max(prefixes.get(column, 0), int(length))
+    return prefixes
+
+
+def describe(key):
+    """A short summary of a key's values for a comment."""
+    if key.kind() == "int":
+        return "%d values from %d to %d" % (key.count, key.min, key.max)
+    if key.kind() == "str":
+        return "%d values, longest %d, 95%% no longer than %d" % (
+            key.count,
+            len(key.longest),
+            key.length_percentile(0.95),
+        )
+    return "%d values" % key.count
+
+
+def enum_candidates(profile, columns):
+    """Yield a comment for each text column with only a few different values."""
+    names = {name for name, _, _ in columns}
+    for key_name, key in sorted(profile.keys.items()):
+        name = key_name.replace(" ", "_")
+        cardinality = key.cardinality
+        if key.kind() != "str" or cardinality is None or cardinality > ENUM_LIMIT:
+            continue
+        # a handful of values on a handful of tracks isn't worth it
+        if key.count < cardinality * 10:
+            continue
+        if name + "_ID" in names:
+            note = "already numbered in %s_ID" % name
+        else:
+            note = "could be ENUM(%s) or numbered in its own table" % ", ".join(
+                "'%s'" % x.replace("'", "''") for x in sorted(key.values)
+            )
+        yield "-- %s has %d different values in %d tracks, %s" % (
+            name,
+            cardinality,
+            key.count,
+            note,
+        )
+
+
+def alter_script(profile, columns=None):
+    """ALTER TABLE tracks statements that make each column as small as it can be."""
+    columns = columns or schema_columns()
+    rest = {name: extra for name, _, extra in columns}
+    lines = ["-- suggested by itdbprofile.py from %d tracks" % profile.tracks]
+    for name, old, new, note in changes(profile, columns):
+        if old is None:
+            lines.append("-- %s" % note)
+            lines.append("ALTER TABLE tracks ADD COLUMN %s %s;" % (name, new))
+        else:
+            lines.append("-- %s was %s, %s" % (name, old, note))
+            lines.append("ALTER TABLE tracks MODIFY %s %s%s;" % (name, new, rest[name]))
+    lines.extend(enum_candidates(profile, columns))
+    return "\n".join(lines) + "\n"
+
+
+def proposed_schema(profile, sql=None):
+    """itdb.sql's CREATE TABLE tracks with the suggested types."""
+    if sql is None:
+        with open(itdbstore.SCHEMA_FILE) as schema:
+            sql = schema.read()
+    columns = schema_columns(sql)
+    types = {}
+    added = []
+    for name, old, new, _ in changes(profile, columns):
+        if old is None:
+            added.append("%s %s," % (name, new))
+        else:
+            types[name] = new
+    lines = []
+    for line in CREATE_TRACKS_RE.search(sql).group(0).splitlines():
+        match = COLUMN_RE.match(line.strip())
+        if match and match.group("name") in types:
+            line = "%s %s%s," % (
+                match.group("name"),
+                types[match.group("name")],
+                match.group("rest"),
+            )
+        elif line.startswith("PRIMARY KEY"):
+            lines.extend(added)
+        lines.append(line)
+    lines.extend(enum_candidates(profile, columns))
+    return "\n".join(lines) + "\n"
+
+
+def get_config():
+    config = configparser.ConfigParser()
+    config.read(["itdb.config", os.path.expanduser("~/.itdb.config")])
+    return config
+
+
+def profile_xml(xmlfile, clean=False):
+    """A Profile of every track in xmlfile."""
+    profile = Profile()
+    for track in itdbplist.Library(xmlfile, clean=clean).tracks():
+        profile.add(track)
+    return profile
+
+
+def main():
+    """Parse args and do the thing."""
+    logging.basicConfig()
+
+    parser = argparse.ArgumentParser(
+        description="Suggest compact column types for tracks from the iTunes xml."
+    )
+    parser.add_argument("xmlfile", help="The xml (default [iTunes] xmlfile)", nargs="?")
+    parser.add_argument(
+        "-s",
+        "--schema",
+        help="Print a new CREATE TABLE tracks instead of ALTER TABLE statements",
+        action="store_true",
+    )
+    parser.add_argument("-v", "--verbose", help="Log verbosely", action="store_true")
+
+    argcomplete.autocomplete(parser)
+    args = parser.parse_args()
+
+    if args.verbose:
+        logging.getLogger().setLevel(logging.INFO)
+
+    config = get_config()
+    xmlfile = args.xmlfile or config.get("iTunes", "xmlfile", fallback=None)
+    if not xmlfile:
+        parser.error("no xmlfile given and no [iTunes] xmlfile in itdb.config")
+    profile = profile_xml(xmlfile, config.getboolean("iTunes", "clean", fallback=False))
+    if args.schema:
+        sys.stdout.write(proposed_schema(profile))
+    else:
+        sys.stdout.write(alter_script(profile))
+
+
+if __name__ == "__main__":
+    main()
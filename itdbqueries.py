@@ -0,0 +1,222 @@
+# Copyright 2026 Alex K (wtwf.com)
+
+"""The SQL the itdb tools run on the read paths.
+
+itdbloader.py, itdb2html.py and playlistlinks.py run these and
+itdbindex.py EXPLAINs the very same strings, so its index check can't
+drift from what the tools really do. The %(name)s bits are filled in with
+%, the plain %s ones in the playlistlinks queries are database parameters.
+"""
+
+__author__ = "wtwf.com (Alex K)"
+
+# itdbloader.py: the genre_stats, artist_stats and album_stats rows, by
+# %(column)s (Genre_ID etc.) of %(tracks)s
+GROUPING_STATS = (
+    "SELECT User_ID, CASE WHEN ISNULL(%(column)s) THEN 0 ELSE %(column)s END "
+    "AS Grouping_ID, "
+    "CASE WHEN ISNULL(Rating) THEN 0 "
+    "ELSE FLOOR(Rating/20) END * 20 as Stars "
+    ", COUNT(*), COALESCE(SUM(Size), 0), COALESCE(SUM(Total_Time), 0) "
+    "FROM %(tracks)s WHERE User_ID = %(user)d "
+    "GROUP BY User_ID, Grouping_ID, Stars"
+)
+
+# itdbloader.py: the playlist_stats rows, %(where)s picks the folders
+PLAYLIST_STATS = (
+    "SELECT members.User_ID, members.Folder_ID, "
+    "CASE WHEN ISNULL(Rating) THEN 0 "
+    "ELSE FLOOR(Rating/20) END * 20 as Stars "
+    ", COUNT(*), COALESCE(SUM(Size), 0), COALESCE(SUM(Total_Time), 0) "
+    "FROM (SELECT DISTINCT playlist_folders.User_ID, "
+    "playlist_folders.Folder_ID, playlist_tracks.Track_ID "
+    "FROM %(playlist_folders)s AS playlist_folders "
+    "INNER JOIN %(playlist_tracks)s AS playlist_tracks "
+    "ON playlist_tracks.User_ID = playlist_folders.User_ID "
+    "AND playlist_tracks.Playlist_ID = playlist_folders.Playlist_ID "
+    "WHERE playlist_folders.User_ID = %(user)d %(where)s) AS members "
+    "INNER JOIN %(tracks)s AS tracks "
+    "ON tracks.Track_ID = members.Track_ID "
+    "AND tracks.User_ID = members.User_ID "
+    "GROUP BY members.User_ID, members.Folder_ID, Stars"
+)
+
+# itdb2html.py: the stars of every genre, Genre_ID 0 is no genre
+GENRES = (
+    "SELECT "
+    "CASE WHEN ISNULL(genres.Name) THEN '' ELSE genres.Name END"
+    " AS DaGenre, "
+    "FLOOR(stats.Rating/20) AS Stars, "
+    "stats.Count, stats.Size, stats.Total_Time "
+    "FROM genre_stats AS stats "
+    "LEFT JOIN genres ON genres.User_ID=stats.User_ID "
+    "AND genres.Genre_ID=stats.Genre_ID "
+    "WHERE stats.User_ID=%(user)d"
+)
+
+# itdb2html.py: the stars of every artist or album (%(stats)s is
+# artist_stats, %(table)s artists and %(column)s Artist_ID), the ones with
+# no artist/album (id 0) have no name so they're left out
+DIMENSION_STARS = (
+    "SELECT names.Name, FLOOR(stats.Rating/20) AS Stars, "
+    "stats.Count, stats.Size, stats.Total_Time "
+    "FROM %(stats)s AS stats "
+    "INNER JOIN %(table)s AS names ON names.User_ID=stats.User_ID "
+    "AND names.%(column)s=stats.%(column)s "
+    "WHERE stats.User_ID=%(user)d"
+)
+
+# itdb2html.py: the stars of the genre, artist or album called %(name)s
+NAMED_STARS = (
+    "SELECT FLOOR(stats.Rating/20), stats.Count, stats.Size, stats.Total_Time "
+    "FROM %(stats)s AS stats "
+    "INNER JOIN %(table)s AS names ON names.User_ID = stats.User_ID "
+    "AND names.%(column)s = stats.%(column)s "
+    "WHERE stats.User_ID = %(user)d AND names.Name = '%(name)s'"
+)
+
+# itdb2html.py: the stars of the tracks without a genre, artist or album
+UNNAMED_STARS = (
+    "SELECT FLOOR(stats.Rating/20), stats.Count, stats.Size, stats.Total_Time "
+    "FROM %(stats)s AS stats "
+    "WHERE stats.User_ID = %(user)d AND stats.%(column)s = 0"
+)
+
+# itdb2html.py: the tracks of a page, %(where)s picks them
+TRACKS_WHERE = (
+    "SELECT * FROM tracks WHERE User_ID = %(user)d AND %(where)s ORDER BY Name"
+)
+
+# itdb2html.py: the where for the tracks of the genre, artist or album
+# called %(name)s, %(column)s is Genre_ID and %(table)s genres etc.
+IN_DIMENSION = (
+    "%(column)s IN (SELECT %(column)s FROM %(table)s "
+    "WHERE User_ID = %(user)d AND Name = '%(name)s')"
+)
+
+# itdb2html.py: every playlist
+PLAYLISTS = "SELECT Name, Playlist_ID FROM playlists WHERE User_ID = %(user)d"
+
+# itdb2html.py: the playlist called %(name)s
+PLAYLIST_ID = (
+    "SELECT Playlist_ID FROM playlists WHERE User_ID = %(user)d AND Name = '%(name)s' "
+)
+
+# itdb2html.py: whether a playlist is a folder
+PLAYLIST_FOLDER = (
+    "SELECT Folder FROM playlists WHERE User_ID = %(user)d "
+    "AND Playlist_ID = %(playlist)d"
+)
+
+# itdb2html.py: every track in any playlist in the folder (however deep), once
+FOLDER_TRACKS = (
+    "SELECT * FROM tracks WHERE User_ID = %(user)d "
+    "AND Track_ID IN (SELECT playlist_tracks.Track_ID "
+    "FROM playlist_folders INNER JOIN playlist_tracks "
+    "ON playlist_tracks.User_ID = playlist_folders.User_ID "
+    "AND playlist_tracks.Playlist_ID = playlist_folders.Playlist_ID "
+    "WHERE playlist_folders.User_ID = %(user)d "
+    "AND playlist_folders.Folder_ID = %(playlist)d)"
+)
+
+# itdb2html.py: the tracks in a playlist
+PLAYLIST_TRACKS = (
+    "SELECT * FROM tracks "
+    "INNER JOIN playlist_tracks "
+    "ON tracks.Track_ID = playlist_tracks.Track_ID "
+    "AND tracks.User_ID = playlist_tracks.User_ID "
+    "WHERE playlist_tracks.Playlist_ID = '%(playlist)d' "
+    "AND tracks.User_ID = %(user)d"
+)
+
+# itdb2html.py: the order of the tracks in a playlist
+PLAYLIST_ORDER = (
+    "SELECT Track_IDs FROM playlist_items WHERE User_ID = %(user)d "
+    "AND Playlist_ID = %(playlist)d"
+)
+
+# itdb2html.py: the stars of a playlist
+PLAYLIST_STARS = (
+    "SELECT "
+    "CASE WHEN ISNULL(Rating) THEN 0 "
+    "ELSE FLOOR(Rating/20) END as Stars "
+    ", SUM(Count), SUM(Size), SUM(Total_Time) FROM playlist_stats WHERE "
+    "User_ID = %(user)d AND Playlist_ID = %(playlist)d "
+    "GROUP BY Stars"
+)
+
+# playlistlinks.py: the tracks columns it uses
+LINKS_COLUMNS = [
+    "Track_ID",
+    "Name",
+    "Artist",
+    "Album",
+    "Genre",
+    "Kind",
+    "Size",
+    "Total_Time",
+    "Disc_Number",
+    "Disc_Count",
+    "Track_Number",
+    "Track_Count",
+    "Year",
+    "Date_Modified",
+    "Date_Added",
+    "Skip_Date",
+    "Skip_Count",
+    "Bit_Rate",
+    "Sample_Rate",
+    "Play_Count",
+    "Play_Date_UTC",
+    "Rating",
+    "Artwork_Count",
+    "Season",
+    "Persistent_ID",
+    "Track_Type",
+    "File_Type",
+    "File_Creator",
+    "Location",
+    "File_Folder_Count",
+    "Library_Folder_Count",
+]
+LINKS_SELECT = ", ".join(["tracks.%s as %s" % (x, x) for x in LINKS_COLUMNS])
+
+# playlistlinks.py: the playlist with this name
+LINKS_PLAYLIST_ID = "SELECT Playlist_ID AS id from playlists WHERE name = %s"
+
+# playlistlinks.py: the playlists in the folder and in the folders in it and so on
+LINKS_FOLDER_PLAYLISTS = """SELECT playlists.Name AS name, playlists.Playlist_ID AS id
+  FROM playlists AS folders
+  INNER JOIN playlist_folders
+    ON playlist_folders.User_ID = folders.User_ID
+    AND playlist_folders.Folder_ID = folders.Playlist_ID
+  INNER JOIN playlists
+    ON playlists.User_ID = playlist_folders.User_ID
+    AND playlists.Playlist_ID = playlist_folders.Playlist_ID
+  WHERE folders.Name = %s AND folders.Folder
+    AND playlist_folders.Depth > 0 AND NOT playlists.Folder
+  ORDER BY playlist_folders.Depth, playlists.Name"""
+
+# playlistlinks.py: each track once, however many playlists under the folder it's in
+LINKS_FOLDER_TRACKS = (
+    "SELECT " + LINKS_SELECT + " FROM tracks WHERE (User_ID, Track_ID) IN ("
+    "SELECT playlist_tracks.User_ID, playlist_tracks.Track_ID "
+    "FROM playlists AS folders "
+    "INNER JOIN playlist_folders "
+    "ON playlist_folders.User_ID = folders.User_ID "
+    "AND playlist_folders.Folder_ID = folders.Playlist_ID "
+    "INNER JOIN playlist_tracks "
+    "ON playlist_tracks.User_ID = playlist_folders.User_ID "
+    "AND playlist_tracks.Playlist_ID = playlist_folders.Playlist_ID "
+    "WHERE folders.Name = %s AND folders.Folder)"
+)
+
+# playlistlinks.py: the tracks in a playlist
+LINKS_PLAYLIST_TRACKS = (
+    "SELECT " + LINKS_SELECT + " FROM tracks, playlist_tracks "
+    "WHERE tracks.Track_ID = playlist_tracks.Track_ID "
+    "AND playlist_tracks.Playlist_ID = %s;"
+)
+
+# playlistlinks.py: the order of the tracks in a playlist
+LINKS_PLAYLIST_ORDER = "SELECT Track_IDs FROM playlist_items WHERE Playlist_ID = %s"
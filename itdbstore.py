@@ -0,0 +1,453 @@
+# Copyright 2026 Alex K (wtwf.com)
+
+"""Connect to the itdb database, either MySQL or an embedded SQLite file.
+
+Which one comes from the [storage] section of the config:
+
+[storage]
+backend=sqlite
+path=~/.itdb.sqlite
+
+MySQL (the default) uses the [client] section like it always has. The
+SQLite connection looks enough like a MySQLdb one for the itdb tools:
+%s parameters, DESCRIBE, LOAD DATA [LOCAL] INFILE, START TRANSACTION and
+the MySQL functions the queries use all work. A new SQLite file gets the
+schema from itdb.sql.
+"""
+
+__author__ = "wtwf.com (Alex K)"
+
+import array
+import csv
+import datetime
+import logging
+import math
+import os
+import re
+import sqlite3
+import sys
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "itdb.sql")
+
+# how LOAD DATA spells NULL
+NULL = "\\N"
+
+LOAD_DATA_RE = re.compile(
+    r"\s*LOAD DATA\s+(?:LOCAL\s+)?INFILE\s+'(?P<filename>[^']*)'\s+"
+    r"(?P<mode>IGNORE|REPLACE)?\s*INTO TABLE\s+(?P<table>\w+)",
+    re.IGNORECASE,
+)
+DESCRIBE_RE = re.compile(r"\s*(?:DESCRIBE|DESC)\s+(?P<table>\w+)\s*;?\s*$", re.I)
+START_TRANSACTION_RE = re.compile(r"\s*START TRANSACTION\s*;?\s*$", re.IGNORECASE)
+PARAM_RE = re.compile(r"%\((\w+)\)s|%s|%%")
+# ISNULL is an operator in sqlite so it can't be a function
+ISNULL_RE = re.compile(r"\bISNULL\s*\(", re.IGNORECASE)
+SHOW_INDEX_RE = re.compile(r"\s*SHOW INDEX FROM\s+(?P<table>\w+)\s*;?\s*$", re.I)
+ALTER_INDEX_RE = re.compile(
+    r"\s*ALTER TABLE\s+(?P<table>\w+)\s+(?P<changes>(?:ADD|DROP)\s.*?)\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+ADD_INDEX_RE = re.compile(
+    r"ADD\s+(?P<kind>UNIQUE\s+|FULLTEXT\s+)?INDEX\s+(?P<name>\w+)\s*"
+    r"\((?P<columns>(?:[^()]|\(\d+\))*)\)\s*(?:,|$)",
+    re.IGNORECASE,
+)
+DROP_INDEX_RE = re.compile(r"DROP\s+INDEX\s+(?P<name>\w+)\s*(?:,|$)", re.IGNORECASE)
+# sqlite indexes the whole column, not the first n characters of it
+PREFIX_LENGTH_RE = re.compile(r"(\w)\(\d+\)")
+
+
+def pack_track_ids(track_ids):
+    """The Track_IDs as little endian 32 bit ints (for playlist_items)."""
+    packed = array.array("i", track_ids)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_track_ids(blob):
+    """The list of Track_IDs pack_track_ids packed."""
+    track_ids = array.array("i")
+    track_ids.frombytes(blob)
+    if sys.byteorder == "big":
+        track_ids.byteswap()
+    return track_ids.tolist()
+
+
+def in_playlist_order(rows, track_ids, track_id):
+    """rows sorted into the order of track_ids, track_id(row) is a row's Track_ID.
+
+    Rows for tracks that aren't in track_ids go at the end.
+    """
+    positions = {}
+    for position, key in enumerate(track_ids):
+        positions.setdefault(key, position)
+    end = len(positions)
+    return sorted(rows, key=lambda row: positions.get(int(track_id(row)), end))
+
+
+def backend(config):
+    """mysql or sqlite."""
+    if config.has_option("storage", "backend"):
+        return config.get("storage", "backend").lower()
+    return "mysql"
+
+
+def is_sqlite(config):
+    return backend(config) == "sqlite"
+
+
+def connect(config, dict_cursor=False, local_infile=False):
+    """Connect to whichever database the config says to use.
+
+    dict_cursor makes cursors return dicts like MySQLdb.cursors.DictCursor,
+    local_infile allows LOAD DATA LOCAL INFILE.
+    """
+    if is_sqlite(config):
+        path = os.path.expanduser(config.get("storage", "path"))
+        logging.info("Connecting to SQLite: %s", path)
+        return SqliteConnection(path, dict_cursor=dict_cursor)
+
+    import MySQLdb  # pylint: disable=import-outside-toplevel
+    import MySQLdb.cursors  # pylint: disable=import-outside-toplevel
+
+    logging.info("Connecting to MySQL")
+    kwargs = {}
+    if dict_cursor:
+        kwargs["cursorclass"] = MySQLdb.cursors.DictCursor
+    if local_infile:
+        kwargs["local_infile"] = True
+    return MySQLdb.connect(
+        host=config.get("client", "host"),
+        db=config.get("client", "database"),
+        user=config.get("client", "user"),
+        passwd=config.get("client", "password"),
+        **kwargs
+    )
+
+
+def escape_string(config, value):
+    """Make value safe to put inside '' in an SQL statement."""
+    if is_sqlite(config):
+        return value.replace("'", "''")
+
+    import MySQLdb  # pylint: disable=import-outside-toplevel
+
+    return MySQLdb.escape_string(value.encode("utf-8")).decode("utf-8")
+
+
+def sqlite_schema(sql):
+    """Turn the MySQL schema in itdb.sql into something SQLite is happy with."""
+    sql = re.sub(r"(?im)^\s*SET\s+[^;]*;", "", sql)
+    sql = re.sub(r"(?i)\s+UNSIGNED\b", "", sql)
+    sql = re.sub(
+        r"(?im)^\s*CREATE INDEX\s.*$",
+        lambda match: PREFIX_LENGTH_RE.sub(r"\1", match.group(0)),
+        sql,
+    )
+    return sql
+
+
+def parse_datetime(value):
+    """DATETIME columns come back as datetimes (or None for 0000-00-00) like MySQLdb."""
+    value = value.decode("utf-8")
+    if value.startswith("0000"):
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+sqlite3.register_converter("datetime", parse_datetime)
+
+
+def sql_floor(value):
+    return None if value is None else math.floor(value)
+
+
+def sql_isnull(value):
+    return value is None
+
+
+def sql_regexp(pattern, value):
+    return value is not None and re.search(pattern, str(value)) is not None
+
+
+# MySQL functions the itdb queries use that SQLite doesn't have
+FUNCTIONS = (
+    ("FLOOR", 1, sql_floor),
+    ("MYSQL_ISNULL", 1, sql_isnull),
+    ("REGEXP", 2, sql_regexp),
+)
+
+
+class SqliteConnection:
+    """Just enough of a MySQLdb connection on top of sqlite3."""
+
+    def __init__(self, path, dict_cursor=False):
+        new = path == ":memory:" or not os.path.exists(path)
+        self.conn = sqlite3.connect(
+            path,
+            isolation_level=None,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+        )
+        self.dict_cursor = dict_cursor
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        for name, num_args, func in FUNCTIONS:
+            self.conn.create_function(name, num_args, func, deterministic=True)
+        if new:
+            logging.info("Creating SQLite schema from: %s", SCHEMA_FILE)
+            with open(SCHEMA_FILE) as schema:
+                self.conn.executescript(sqlite_schema(schema.read()))
+
+    def cursor(self, cursorclass=None):
+        return SqliteCursor(self, dict_rows=self.dict_cursor or cursorclass is not None)
+
+    def autocommit(self, on):
+        self.conn.isolation_level = None if on else "DEFERRED"
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+
+class SqliteCursor:
+    """Translates MySQL-isms on the way in and buffers results like MySQLdb."""
+
+    def __init__(self, connection, dict_rows=False):
+        self.connection = connection
+        self.dict_rows = dict_rows
+        self.cursor = connection.conn.cursor()
+        self.description = None
+        self.rowcount = -1
+        self.rows = []
+
+    def execute(self, sql, args=None):
+        match = LOAD_DATA_RE.match(sql)
+        if match:
+            return self.load_data(**match.groupdict())
+        match = DESCRIBE_RE.match(sql)
+        if match:
+            return self.describe(match.group("table"))
+        match = SHOW_INDEX_RE.match(sql)
+        if match:
+            return self.show_index(match.group("table"))
+        match = ALTER_INDEX_RE.match(sql)
+        if match:
+            return self.alter_indexes(**match.groupdict())
+        if START_TRANSACTION_RE.match(sql):
+            sql = "BEGIN"
+        sql = ISNULL_RE.sub("MYSQL_ISNULL(", sql)
+        if args is None:
+            self.cursor.execute(sql)
+        else:
+            self.cursor.execute(translate(sql), args)
+        return self.fetch_results()
+
+    def executemany(self, sql, args):
+        args = list(args)
+        if not args:
+            return 0
+        self.cursor.executemany(translate(sql), args)
+        self.rows = []
+        self.rowcount = self.cursor.rowcount
+        return self.rowcount
+
+    def fetch_results(self):
+        self.description = self.cursor.description
+        if self.description is None:
+            self.rows = []
+            self.rowcount = self.cursor.rowcount
+        else:
+            self.rows = self.cursor.fetchall()
+            if self.dict_rows:
+                names = [x[0] for x in self.description]
+                self.rows = [dict(zip(names, row)) for row in self.rows]
+            self.rowcount = len(self.rows)
+        self.rows.reverse()
+        return self.rowcount
+
+    def fetchone(self):
+        return self.rows.pop() if self.rows else None
+
+    def fetchall(self):
+        rows = self.rows[::-1]
+        self.rows = []
+        return rows
+
+    def describe(self, table):
+        """Rows shaped like MySQL's: Field, Type, Null, Key, Default, Extra."""
+        self.cursor.execute("PRAGMA table_info(%s)" % table)
+        rows = []
+        for _, name, column_type, notnull, default, primary_key in self.cursor:
+            if default is not None:
+                default = default.strip("'")
+                default = {"false": "0", "true": "1", "null": None}.get(
+                    default.lower(), default
+                )
+            rows.append(
+                (
+                    name,
+                    column_type.lower(),
+                    "NO" if notnull or primary_key else "YES",
+                    "PRI" if primary_key else "",
+                    default,
+                    "",
+                )
+            )
+        self.description = (("Field",), ("Type",), ("Null",), ("Key",), ("Default",))
+        self.rows = rows[::-1]
+        self.rowcount = len(rows)
+        return self.rowcount
+
+    def show_index(self, table):
+        """Rows shaped like MySQL's SHOW INDEX, one per column of each index.
+
+        Only Table, Non_unique, Key_name, Seq_in_index, Column_name and
+        Index_type mean anything.
+        """
+        self.cursor.execute("PRAGMA index_list(%s)" % table)
+        indexes = self.cursor.fetchall()
+        rows = []
+        for _, name, unique, origin, _ in indexes:
+            if origin == "pk":
+                key_name = "PRIMARY"
+            elif origin == "c":
+                key_name = name
+            else:
+                # UNIQUE constraints can't be dropped like an index
+                continue
+            self.cursor.execute("PRAGMA index_info(%s)" % name)
+            for seq, _, column in self.cursor.fetchall():
+                rows.append(
+                    (
+                        table,
+                        0 if unique else 1,
+                        key_name,
+                        seq + 1,
+                        column,
+                        "A",
+                        None,
+                        None,
+                        None,
+                        "",
+                        "BTREE",
+                    )
+                )
+        if not any(x[2] == "PRIMARY" for x in rows):
+            # a rowid table's primary key isn't in index_list
+            self.cursor.execute("PRAGMA table_info(%s)" % table)
+            for column in self.cursor.fetchall():
+                if column[5]:
+                    rows.append(
+                        (table, 0, "PRIMARY", column[5], column[1])
+                        + ("A", None, None, None, "", "BTREE")
+                    )
+        self.description = tuple(
+            (x,)
+            for x in (
+                "Table",
+                "Non_unique",
+                "Key_name",
+                "Seq_in_index",
+                "Column_name",
+                "Collation",
+                "Cardinality",
+                "Sub_part",
+                "Packed",
+                "Null",
+                "Index_type",
+            )
+        )
+        self.rows = rows[::-1]
+        self.rowcount = len(rows)
+        return self.rowcount
+
+    def alter_indexes(self, table, changes):
+        """ALTER TABLE t ADD INDEX n (cols), DROP INDEX m ... as CREATE/DROP INDEX."""
+        statements = []
+        while changes:
+            match = DROP_INDEX_RE.match(changes) or ADD_INDEX_RE.match(changes)
+            if not match:
+                raise sqlite3.OperationalError(
+                    "can't do this ALTER TABLE in sqlite: %s" % changes
+                )
+            if "columns" in match.groupdict():
+                kind = (match.group("kind") or "").strip().upper()
+                unique = "UNIQUE " if kind == "UNIQUE" else ""
+                statements.append(
+                    "CREATE %sINDEX %s ON %s (%s)"
+                    % (
+                        unique,
+                        match.group("name"),
+                        table,
+                        PREFIX_LENGTH_RE.sub(r"\1", match.group("columns")),
+                    )
+                )
+            else:
+                statements.append("DROP INDEX %s" % match.group("name"))
+            changes = changes[match.end() :].strip()
+        for statement in statements:
+            self.cursor.execute(statement)
+        self.rows = []
+        self.rowcount = 0
+        return self.rowcount
+
+    def load_data(self, filename, mode, table):
+        """LOAD DATA INFILE a csv the way itdbloader writes them."""
+        sql = "INSERT OR %s INTO %s VALUES (%%s)" % (
+            (mode or "IGNORE").upper(),
+            table,
+        )
+        transaction = not self.connection.conn.in_transaction
+        if transaction:
+            self.cursor.execute("BEGIN")
+        self.rowcount = 0
+        try:
+            with open(filename, newline="") as csv_file:
+                batch = []
+                for row in csv.reader(csv_file):
+                    batch.append([None if x == NULL else x for x in row])
+                    if len(batch) == 1000:
+                        self.rowcount += self.insert_rows(sql, batch)
+                        batch = []
+                self.rowcount += self.insert_rows(sql, batch)
+        except Exception:
+            # don't leave half a file in a transaction that's still open
+            if transaction:
+                self.cursor.execute("ROLLBACK")
+            raise
+        if transaction:
+            self.cursor.execute("COMMIT")
+        self.rows = []
+        return self.rowcount
+
+    def insert_rows(self, sql, rows):
+        if not rows:
+            return 0
+        self.cursor.executemany(sql % ", ".join(["?"] * len(rows[0])), rows)
+        return len(rows)
+
+    def close(self):
+        self.cursor.close()
+
+
+def translate(sql):
+    """Turn MySQLdb's %s and %(name)s parameters into sqlite3's ? and :name."""
+
+    def replace(match):
+        if match.group(0) == "%%":
+            return "%"
+        if match.group(1):
+            return ":" + match.group(1)
+        return "?"
+
+    return PARAM_RE.sub(replace, sql)
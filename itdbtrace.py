@@ -0,0 +1,239 @@
+# Copyright 2026 Alex K (wtwf.com)
+
+"""Time how long the itdb tools spend where.
+
+Decorate a function with @LogRuntime() (or wrap a block in span(name))
+and every call becomes a span: when it started and how long it took on
+the monotonic clock, which span it was called from, how many rows it
+said it handled (with add_rows) and the process's peak memory when it
+finished. If tracemalloc is running each span also gets the peak
+python memory used while it ran.
+
+show_runtimes() prints them as a tree and write_trace() saves them as a
+Chrome trace (open it in chrome://tracing or https://ui.perfetto.dev).
+"""
+
+__author__ = "wtwf.com (Alex K)"
+
+import contextlib
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+import humanize
+
+# ru_maxrss is in kilobytes on linux and bytes on a mac
+MAXRSS_SCALE = 1 if sys.platform == "darwin" else 1024
+
+
+def max_rss():
+    """The most memory this process has used so far, in bytes."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_SCALE
+
+
+class Span:
+    """One call of something being timed."""
+
+    def __init__(self, name, parent=None, args=None):
+        self.name = name
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent else 0
+        self.args = args or {}
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+        self.start = time.perf_counter_ns()
+        self.end = None
+        self.rows = None
+        self.max_rss = None
+        # peak tracemalloc memory while this span was open
+        self.peak = 0
+        self.start_memory = None
+        self.peak_memory = None
+
+    @property
+    def seconds(self):
+        return ((self.end or time.perf_counter_ns()) - self.start) / 1e9
+
+    def event(self, origin):
+        """This span as a Chrome trace complete ("X") event."""
+        args = dict(self.args)
+        for key in ("rows", "max_rss", "peak_memory"):
+            if getattr(self, key) is not None:
+                args[key] = getattr(self, key)
+        return {
+            "name": self.name,
+            "ph": "X",
+            "ts": (self.start - origin) / 1e3,
+            "dur": ((self.end or self.start) - self.start) / 1e3,
+            "pid": self.pid,
+            "tid": self.tid,
+            "args": args,
+        }
+
+
+class Tracer:
+    """Keeps every span, with a stack of open ones for each thread."""
+
+    def __init__(self):
+        self.spans = []
+        # events merged in from other processes
+        self.events = []
+        self.origin = time.perf_counter_ns()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def current(self):
+        """The innermost span running in this thread (or None)."""
+        stack = self.stack()
+        return stack[-1] if stack else None
+
+    @contextlib.contextmanager
+    def span(self, name, parent=None, **args):
+        """Time the block, parent is for spans in a thread some other span started."""
+        stack = self.stack()
+        span = Span(name, parent or self.current(), args)
+        if tracemalloc.is_tracing():
+            self.fold_peak()
+            tracemalloc.reset_peak()
+            span.start_memory = tracemalloc.get_traced_memory()[0]
+        with self.lock:
+            self.spans.append(span)
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            stack.pop()
+            span.end = time.perf_counter_ns()
+            span.max_rss = max_rss()
+            if span.start_memory is not None and tracemalloc.is_tracing():
+                self.fold_peak(span)
+                span.peak_memory = span.peak - span.start_memory
+
+    def fold_peak(self, *extra):
+        """Remember the peak so far in every open span before it's reset."""
+        peak = tracemalloc.get_traced_memory()[1]
+        for span in self.stack() + list(extra):
+            span.peak = max(span.peak, peak)
+
+    def add_rows(self, rows):
+        stack = self.stack()
+        if stack and rows is not None and rows >= 0:
+            stack[-1].rows = (stack[-1].rows or 0) + rows
+
+    def reset(self):
+        with self.lock:
+            self.spans = []
+            self.events = []
+            self.origin = time.perf_counter_ns()
+
+    def trace_events(self):
+        with self.lock:
+            return self.events + [x.event(self.origin) for x in self.spans]
+
+    def merge(self, events):
+        """Add events from trace_events() in another process (a worker)."""
+        with self.lock:
+            self.events.extend(events)
+
+    def summary(self):
+        """Total calls, seconds, rows and peaks for each span name, in order."""
+        totals = {}
+        for span in self.spans:
+            total = totals.setdefault(
+                span.name,
+                {
+                    "calls": 0,
+                    "seconds": 0,
+                    "rows": None,
+                    "max_rss": 0,
+                    "peak_memory": None,
+                },
+            )
+            total["calls"] += 1
+            total["seconds"] += span.seconds
+            if span.rows is not None:
+                total["rows"] = (total["rows"] or 0) + span.rows
+            total["max_rss"] = max(total["max_rss"], span.max_rss or 0)
+            if span.peak_memory is not None:
+                total["peak_memory"] = max(total["peak_memory"] or 0, span.peak_memory)
+        return totals
+
+    def show(self, file=None):
+        file = file or sys.stdout
+        print("\nRuntimes:\n", file=file)
+        for span in self.spans:
+            line = "%s%s: %.3fs" % ("  " * span.depth, span.name, span.seconds)
+            if span.rows is not None:
+                line += ", %s rows" % humanize.intcomma(span.rows)
+            if span.peak_memory is not None:
+                line += ", peak %s" % humanize.naturalsize(span.peak_memory)
+            if span.max_rss:
+                line += ", max rss %s" % humanize.naturalsize(span.max_rss)
+            print(line, file=file)
+
+    def write(self, filename):
+        """Save every span as a Chrome trace json file."""
+        with open(filename, "w") as outfile:
+            json.dump(
+                {"traceEvents": self.trace_events(), "displayTimeUnit": "ms"},
+                outfile,
+                indent=1,
+            )
+
+
+TRACER = Tracer()
+
+
+def span(name, parent=None, **args):
+    """with span("name"): ... times the block."""
+    return TRACER.span(name, parent, **args)
+
+
+def add_rows(rows):
+    """Count rows against the innermost span that's running."""
+    TRACER.add_rows(rows)
+
+
+def show_runtimes():
+    TRACER.show()
+
+
+def write_trace(filename):
+    TRACER.write(filename)
+
+
+class LogRuntime:
+    """Decorator that makes every call of a function a span.
+
+    args and kwargs pick out which of its arguments go in the span's name.
+    """
+
+    def __init__(self, name=None, args=None, kwargs=None):
+        self.args = args or []
+        self.kwargs = kwargs or []
+        self.name = name
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapped_f(*args, **kwargs):
+            description = self.name or func.__name__
+            description += "("
+            description += ", ".join(
+                [str(args[x]) for x in self.args if x < len(args)]
+                + [f"{x}={kwargs[x]}" for x in self.kwargs if x in kwargs]
+            )
+            description += ")"
+            with TRACER.span(description):
+                return func(*args, **kwargs)
+
+        return wrapped_f
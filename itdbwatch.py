@@ -0,0 +1,86 @@
+# Copyright 2026 Alex K (wtwf.com)
+
+"""Wait for files (like the iTunes library xml) to change.
+
+On linux with inotify_simple installed the wait wakes up as soon as the
+file is written, otherwise it checks the files' size and mtime every
+poll seconds. iTunes writes the library in a burst (and usually by
+renaming a new file over the old one) so once something changes we wait
+until the files have been left alone for settle seconds.
+"""
+
+__author__ = "wtwf.com (Alex K)"
+
+import logging
+import os
+import time
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+
+def signature(filename):
+    """(size, mtime) of filename, or None if it isn't there (mid rename)."""
+    try:
+        info = os.stat(filename)
+    except OSError:
+        return None
+    return info.st_size, info.st_mtime_ns
+
+
+class Watcher:
+    """Blocks until some of filenames change and then settle down."""
+
+    def __init__(self, filenames, poll=2.0, settle=5.0):
+        self.filenames = [os.path.abspath(x) for x in filenames]
+        self.poll = poll
+        self.settle = settle
+        self.signatures = {x: signature(x) for x in self.filenames}
+        self.inotify = None
+        if inotify_simple is not None:
+            self.inotify = inotify_simple.INotify()
+            flags = inotify_simple.flags
+            # watch the directories since the files get replaced by renames
+            for directory in {os.path.dirname(x) for x in self.filenames}:
+                self.inotify.add_watch(
+                    directory, flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE
+                )
+            logging.info("Watching with inotify: %s", ", ".join(self.filenames))
+        else:
+            logging.info("Checking every %ss: %s", self.poll, ", ".join(self.filenames))
+
+    def changed(self):
+        return [x for x in self.filenames if signature(x) != self.signatures[x]]
+
+    def block(self):
+        """Wait until inotify says something happened (or for poll seconds)."""
+        if self.inotify is None:
+            time.sleep(self.poll)
+        else:
+            # the timeout is in case we miss an event
+            self.inotify.read(timeout=int(self.poll * 1000))
+
+    def wait(self):
+        """Return the filenames that changed, once they stop changing."""
+        changed = self.changed()
+        while not changed:
+            self.block()
+            changed = self.changed()
+        logging.info("Changed: %s", ", ".join(changed))
+        while True:
+            before = {x: signature(x) for x in changed}
+            time.sleep(self.settle)
+            if self.inotify is not None:
+                # throw away the events from the burst of writes
+                self.inotify.read(timeout=0)
+            now = {x: signature(x) for x in changed}
+            if now == before and None not in now.values():
+                break
+        self.signatures.update(now)
+        return changed
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
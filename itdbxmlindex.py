@@ -0,0 +1,200 @@
+# Copyright 2026 Alex K (wtwf.com)
+
+"""Find single tracks and playlists in an iTunes library xml without parsing it all.
+
+An XmlIndex remembers where (the byte offset and length) each track's
+dict is by Track ID, which Track ID each Persistent ID is and where each
+playlist's dict is by name, along with every track's Location. Getting
+a track or playlist out of the xml is then a seek and a parse of just
+that dict (into an itdbmodel Track or Playlist).
+
+Making the index is one pass of regular expressions over the xml (a lot
+quicker than parsing it). It's pickled into ~/.cache/itdb and used again
+until the xml's size or mtime changes. Compressed xml can't be indexed
+since there's no seeking in it.
+"""
+
+__author__ = "wtwf.com (Alex K)"
+
+import html
+import logging
+import mmap
+import os
+import pickle
+import re
+import xml.etree.ElementTree as ElementTree
+
+import itdbmodel
+import itdbplist
+
+INDEX_VERSION = 1
+
+# each track in the Tracks dict, they don't have any dicts inside them
+TRACK_RE = re.compile(rb"<key>(\d+)</key>\s*(<dict>.*?</dict>)", re.DOTALL)
+PERSISTENT_ID_RE = re.compile(rb"<key>Persistent ID</key>\s*<string>([^<]*)</string>")
+LOCATION_RE = re.compile(rb"<key>Location</key>\s*<string>([^<]*)</string>")
+# the first Name in a playlist is its own (the items don't have one)
+NAME_RE = re.compile(rb"<key>Name</key>\s*<string>([^<]*)</string>")
+# the start or end of every dict and array, or an empty one
+CONTAINER_RE = re.compile(rb"<(/?)(?:dict|array)(/?)>")
+
+
+def index_filename(xmlfile):
+    """Where the index of xmlfile is kept."""
+    return itdbplist.cache_filename(xmlfile, "index")
+
+
+def text(value):
+    """The str of some escaped xml text."""
+    return html.unescape(value.decode("utf-8", "replace"))
+
+
+class XmlIndex:
+    """Where each track and playlist is in an xml file.
+
+    clean runs what's read through itdbplist.XmlCleaner first (like
+    [iTunes] clean does for the loader).
+    """
+
+    def __init__(self, xmlfile, filename=None, clean=False):
+        self.xmlfile = xmlfile
+        self.filename = filename or index_filename(xmlfile)
+        self.clean = clean
+        info = os.stat(xmlfile)
+        index = read_index(self.filename)
+        if (
+            index is None
+            or index["size"] != info.st_size
+            or index["mtime"] != info.st_mtime_ns
+        ):
+            index = build_index(xmlfile)
+            write_index(self.filename, index)
+        # Track ID: (offset, length)
+        self.tracks = index["tracks"]
+        # Persistent ID: Track ID
+        self.persistent_ids = index["persistent_ids"]
+        # Track ID: Location
+        self.locations = index["locations"]
+        # Name: [(offset, length), ...] (names don't have to be unique)
+        self.playlists = index["playlists"]
+
+    def track(self, track_id):
+        """The itdbmodel.Track for track_id (or None)."""
+        where = self.tracks.get(int(track_id))
+        return where and itdbmodel.Track.from_plist(self.read(*where))
+
+    def track_by_persistent_id(self, persistent_id):
+        track_id = self.persistent_ids.get(persistent_id)
+        return None if track_id is None else self.track(track_id)
+
+    def playlists_named(self, name):
+        """The itdbmodel.Playlists called name."""
+        return [
+            itdbmodel.Playlist.from_plist(self.read(*where))
+            for where in self.playlists.get(name, [])
+        ]
+
+    def read(self, offset, length):
+        with open(self.xmlfile, "rb") as infile:
+            infile.seek(offset)
+            data = infile.read(length)
+        if self.clean:
+            data = itdbplist.XmlCleaner().clean(data, offset)
+        return itdbplist.plist_value(ElementTree.fromstring(data))
+
+
+def build_index(xmlfile):
+    """Find where everything is in xmlfile."""
+    kind = itdbplist.compression(xmlfile)
+    if kind:
+        raise ValueError("Can't index %s compressed xml: %s" % (kind, xmlfile))
+    logging.info("Indexing: %s", xmlfile)
+    info = os.stat(xmlfile)
+    index = {
+        "version": INDEX_VERSION,
+        "size": info.st_size,
+        "mtime": info.st_mtime_ns,
+        "tracks": {},
+        "persistent_ids": {},
+        "locations": {},
+        "playlists": {},
+    }
+    if info.st_size == 0:
+        return index
+    with open(xmlfile, "rb") as infile, mmap.mmap(
+        infile.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        tracks = data.find(b"<key>Tracks</key>")
+        playlists = data.find(b"<key>Playlists</key>")
+        if tracks >= 0:
+            index_tracks(
+                index, data, tracks, len(data) if playlists < tracks else playlists
+            )
+        if playlists >= 0:
+            index_playlists(index, data, playlists)
+    logging.info(
+        "Indexed %d tracks and %d playlist names",
+        len(index["tracks"]),
+        len(index["playlists"]),
+    )
+    return index
+
+
+def index_tracks(index, data, start, end):
+    for match in TRACK_RE.finditer(data, start, end):
+        track_id = int(match.group(1))
+        track = match.group(2)
+        index["tracks"][track_id] = (match.start(2), len(track))
+        persistent_id = PERSISTENT_ID_RE.search(track)
+        if persistent_id:
+            index["persistent_ids"][persistent_id.group(1).decode()] = track_id
+        location = LOCATION_RE.search(track)
+        if location:
+            index["locations"][track_id] = text(location.group(1))
+
+
+def index_playlists(index, data, start):
+    # the Playlists array is depth 1 and each playlist in it is depth 2
+    depth = 0
+    playlist = None
+    for match in CONTAINER_RE.finditer(data, start):
+        closing, empty = match.groups()
+        if empty:
+            continue
+        if not closing:
+            depth += 1
+            if depth == 2:
+                playlist = match.start()
+            continue
+        depth -= 1
+        if depth == 0:
+            break
+        if depth == 1:
+            name = NAME_RE.search(data, playlist, match.end())
+            if name:
+                index["playlists"].setdefault(text(name.group(1)), []).append(
+                    (playlist, match.end() - playlist)
+                )
+
+
+def read_index(filename):
+    """The index saved in filename, or None if there isn't a usable one."""
+    try:
+        with open(filename, "rb") as infile:
+            index = pickle.load(infile)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+        return None
+    return index
+
+
+def write_index(filename, index):
+    """Save the index (if we can, it's only a cache)."""
+    try:
+        tmp_filename = filename + ".tmp"
+        with itdbplist.open_private(tmp_filename) as outfile:
+            pickle.dump(index, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, filename)
+    except OSError as ex:
+        logging.warning("Unable to save xml index %s: %r", filename, ex)
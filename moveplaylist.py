@@ -7,8 +7,6 @@ __author__ = "wtwf.com (Alex K)"
 
 import argparse
 import atexit
-import collections
-import datetime
 import logging
 import os
 import subprocess
@@ -17,43 +15,11 @@ import time
 
 import appscript
 import argcomplete
-import humanize
 import tqdm
 
+import itdbtrace
 
-class LogRuntime:
-    RUNTIMES = collections.defaultdict(list)
-
-    def __init__(self, name=None, args=None, kwargs=None):
-        self.args = args or []
-        self.kwargs = kwargs or []
-        self.name = name
-
-    def __call__(self, func):
-        def wrapped_f(*args, **kwargs):
-            start = datetime.datetime.now()
-            reply = func(*args, **kwargs)
-            delta = datetime.datetime.now() - start
-            description = self.name or func.__name__
-            description += "("
-            description += ", ".join(
-                [args[x] for x in self.args] + [f"{x}={kwargs[x]}" for x in self.kwargs]
-            )
-            description += ")"
-            LogRuntime.RUNTIMES[description].append(delta)
-            return reply
-
-        return wrapped_f
-
-    @staticmethod
-    def show_runtimes():
-        print("\nRuntimes:\n", file=sys.stdout)
-        for desc, deltas in LogRuntime.RUNTIMES.items():
-            duration = ", ".join([humanize.naturaldelta(delta) for delta in deltas])
-            print(f"{desc}: {duration}", file=sys.stdout)
-
-
-atexit.register(LogRuntime.show_runtimes)
+atexit.register(itdbtrace.show_runtimes)
 
 
 class ShutdownHandler(logging.Handler):
@@ -62,7 +28,7 @@ class ShutdownHandler(logging.Handler):
         sys.exit(1)
 
 
-@LogRuntime()
+@itdbtrace.LogRuntime()
 def main():
     """Parse args and do the thing."""
     logging.basicConfig()
@@ -124,6 +90,10 @@ def main():
         help="Don't actually add files to playlist",
     )
 
+    parser.add_argument(
+        "-t", "--trace", help="Save a Chrome trace of where the time went to this file"
+    )
+
     argcomplete.autocomplete(parser)
     args = parser.parse_args()
 
@@ -132,6 +102,8 @@ def main():
         logging.getLogger().setLevel(logging.WARNING)
     if args.debug:
         logging.getLogger().setLevel(logging.DEBUG)
+    if args.trace:
+        atexit.register(itdbtrace.write_trace, args.trace)
 
     logging.info("Start")
 
@@ -194,6 +166,7 @@ def get_playlist_parent(playlist):
         return None
 
 
+@itdbtrace.LogRuntime(args=[3])
 def export_playlist(music, prefix, allfile, name):
     logging.info("Making Playlist: %s", name)
 
@@ -214,6 +187,7 @@ def export_playlist(music, prefix, allfile, name):
     return m3u_filename
 
 
+@itdbtrace.LogRuntime(args=[3])
 def import_playlist(music, add, prefix, m3ufilename):
     playlist_name = os.path.splitext(os.path.basename(m3ufilename))[0]
     logging.info("importing: %s", playlist_name)
@@ -16,7 +16,9 @@ Usage: %(PROGRAM)s
   -l playlist_like
   --like=name - find all playlists matching like pattern and make links
 
-  --folder=name - find all playlists under this folder playlist
+  --folder=name - find all playlists under this folder playlist (at any depth)
+
+  --folder_tracks=name - link every track under this folder once
 
   -d destination
   --destination=directory - create links in this directory
@@ -46,6 +48,7 @@ Usage: %(PROGRAM)s
 
 
 import atexit
+import configparser
 import getopt
 import logging
 import os
@@ -54,44 +57,12 @@ import shutil
 import sys
 import urllib
 
-import MySQLdb
-import MySQLdb.cursors
+import itdbqueries
+import itdbstore
 
 __pychecker__ = "unusednames=PROGRAM,_a,_b"
 
-COLUMNS = [
-    "Track_ID",
-    "Name",
-    "Artist",
-    "Album",
-    "Genre",
-    "Kind",
-    "Size",
-    "Total_Time",
-    "Disc_Number",
-    "Disc_Count",
-    "Track_Number",
-    "Track_Count",
-    "Year",
-    "Date_Modified",
-    "Date_Added",
-    "Skip_Date",
-    "Skip_Count",
-    "Bit_Rate",
-    "Sample_Rate",
-    "Play_Count",
-    "Play_Date_UTC",
-    "Rating",
-    "Artwork_Count",
-    "Season",
-    "Persistent_ID",
-    "Track_Type",
-    "File_Type",
-    "File_Creator",
-    "Location",
-    "File_Folder_Count",
-    "Library_Folder_Count",
-]
+COLUMNS = itdbqueries.LINKS_COLUMNS
 
 
 def usage(code=False, msg=""):
@@ -109,9 +80,9 @@ def usage(code=False, msg=""):
 class PlaylistLinks:
     def __init__(self, dbconfig):
         """    """
-        self.conn = MySQLdb.connect(
-            read_default_file=dbconfig, cursorclass=MySQLdb.cursors.DictCursor
-        )
+        config = configparser.ConfigParser()
+        config.read(dbconfig)
+        self.conn = itdbstore.connect(config, dict_cursor=True)
         atexit.register(self.close)
         self.cursor = self.conn.cursor()
         self.random_ordering = False
@@ -129,8 +100,7 @@ class PlaylistLinks:
             self.conn = None
 
     def get_playlist_id(self, playlist):
-        sql = "SELECT Playlist_ID AS id from playlists WHERE name = %s"
-        self.cursor.execute(sql, (playlist,))
+        self.cursor.execute(itdbqueries.LINKS_PLAYLIST_ID, (playlist,))
         if self.cursor.rowcount == 1:
             result = self.cursor.fetchone()
             return int(result["id"])
@@ -151,25 +121,31 @@ class PlaylistLinks:
         self.from_playlist_id(playlist, playlist_id)
 
     def from_folder(self, folder):
-        sql = "SELECT Playlist_Persistent_ID FROM Playlists WHERE Name = %s"
+        # the playlists in the folder and in the folders in it and so on
+        sql = itdbqueries.LINKS_FOLDER_PLAYLISTS
         self.cursor.execute(sql, (folder,))
-        ids = [x["Playlist_Persistent_ID"] for x in self.cursor.fetchall()]
-        for playlist_id in ids:
-            sql = """SELECT Name AS name, Playlist_ID AS id FROM Playlists
-          WHERE Parent_Persistent_ID = %s"""
-            self.cursor.execute(sql, (playlist_id,))
-            for row in self.cursor.fetchall():
-                self.from_playlist_id(row["name"], row["id"])
+        for row in self.cursor.fetchall():
+            self.from_playlist_id(row["name"], row["id"])
+
+    def from_folder_tracks(self, folder):
+        # each track once, however many playlists under the folder it's in
+        sql = itdbqueries.LINKS_FOLDER_TRACKS
+        self.cursor.execute(sql, (folder,))
+        results = self.cursor.fetchall()
+        self.make_links_from_location(folder, "Folder:%s" % folder, results)
 
     def from_playlist_id(self, playlist, playlist_id):
-        sel = ", ".join(["tracks.%s as %s" % (x, x) for x in COLUMNS])
-        sql = (
-            "SELECT " + sel + " FROM tracks, playlist_tracks "
-            "WHERE tracks.Track_ID = playlist_tracks.Track_ID "
-            "AND playlist_tracks.Playlist_ID = %s;"
-        )
-        self.cursor.execute(sql, (playlist_id,))
+        self.cursor.execute(itdbqueries.LINKS_PLAYLIST_TRACKS, (playlist_id,))
         results = self.cursor.fetchall()
+        # in the playlist's order in iTunes
+        self.cursor.execute(itdbqueries.LINKS_PLAYLIST_ORDER, (playlist_id,))
+        items = self.cursor.fetchone()
+        if items:
+            results = itdbstore.in_playlist_order(
+                results,
+                itdbstore.unpack_track_ids(items["Track_IDs"]),
+                lambda row: row["Track_ID"],
+            )
         self.make_links_from_location(
             playlist, "Playlist:%s:%s" % (playlist_id, playlist), results
         )
@@ -333,6 +309,7 @@ def main():
                 "copy",
                 "destination=",
                 "folder=",
+                "folder_tracks=",
                 "format=",
                 "help",
                 "like=",
@@ -365,6 +342,8 @@ def main():
             pll.destination_directory = arg
         if opt in ("--folder",):
             pll.from_folder(arg)
+        if opt in ("--folder_tracks",):
+            pll.from_folder_tracks(arg)
         if opt in ("-f", "--format"):
             pll.format = arg
         if opt in ("-h", "--help"):
@@ -19,7 +19,7 @@ import logging
 import os
 import sys
 
-import iTunes
+import itdbxmlindex
 
 # pylint: disable=missing-docstring
 
@@ -67,14 +67,13 @@ def Run(file_name=None, playlists=None):
     if not playlists:
         usage(3, "provide playlist names")
 
+    # only the playlists we want and their tracks get parsed
     logging.info("Loading: %r", file_name)
-    lib = iTunes.Library(file_name)
-    lib.load()
+    index = itdbxmlindex.XmlIndex(file_name)
     logging.info("Loaded: %r", file_name)
 
-    track_map = load_tracks(lib)
     print_header()
-    do_playlists(lib, playlists, track_map)
+    do_playlists(index, playlists)
 
 
 def print_header():
@@ -87,51 +86,25 @@ iTunes.includeStandardAdditions = true;
     )
 
 
-def load_tracks(lib):
-    logging.info("Loading tracks")
-    track_map = {}
-    while True:
-        try:
-            info = lib.getTrack()
-        except EOFError:
-            break
-        if not info:
-            break
-        # logging.info("%r", info)
-        track_map[info["Track ID"]] = {
-            "Persistent ID": info["Persistent ID"],
-            "Name": info["Name"],
-        }
-    logging.info("DONE Loading tracks")
-    return track_map
-
-
-def do_playlists(lib, playlists, track_map):
+def do_playlists(index, playlists):
     logging.info("Loading playlists")
-    while True:
-        try:
-            info = lib.getPlaylist()
-        except EOFError:
-            break
-        if not info:
-            break
-        name = info["Name"]
-        if name in playlists:
-            do_playlist(info, track_map)
-            playlists.remove(name)
-            if not playlists:
-                break
+    for name in playlists:
+        found = index.playlists_named(name)
+        if not found:
+            logging.warning("Unable to find playlist: %r", name)
+        for info in found:
+            do_playlist(info, index)
     logging.info("DONE Loading playlists")
 
 
-def do_playlist(playlist, track_map):
-    logging.info("Doing playlist: %r", playlist)
+def do_playlist(playlist, index):
+    logging.info("Doing playlist: %r", playlist.name)
     persistent_ids = []
-    for track in playlist["Playlist Items"]:
-        track_id = track["Track ID"]
-        if track_id in track_map:
-            logging.info(track_map[track_id])
-            persistent_ids.append(track_map[track_id]["Persistent ID"])
+    for track_id in playlist.track_ids:
+        track = index.track(track_id)
+        if track:
+            logging.info({"Persistent ID": track.persistent_id, "Name": track.name})
+            persistent_ids.append(track.persistent_id)
         else:
             logging.warning("Unable to find track with id: %r", track_id)
 
@@ -147,7 +120,7 @@ for (trackId of ids) {
   }
 }
   """
-        % {"name": playlist["Name"], "ids": '", "'.join(persistent_ids)}
+        % {"name": playlist.name, "ids": '", "'.join(persistent_ids)}
     )
 
 
@@ -0,0 +1,8 @@
+# Copyright 2026 Alex K (wtwf.com)
+
+"""The itdb modules live at the top of the repo, not in a package."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
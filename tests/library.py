@@ -0,0 +1,57 @@
+# Copyright 2026 Alex K (wtwf.com)
+
+"""Small iTunes library xml files for the tests."""
+
+import datetime
+import plistlib
+
+
+def make_library(tracks=3, playlists=("Mix",)):
+    """A library dict with tracks 1..tracks, every playlist has all of them."""
+    added = datetime.datetime(2020, 1, 2, 3, 4, 5)
+    return {
+        "Major Version": 1,
+        "Minor Version": 1,
+        "Application Version": "12.0",
+        "Music Folder": "file:///Music/",
+        "Tracks": {
+            str(track_id): {
+                "Track ID": track_id,
+                "Name": "Song %d" % track_id,
+                "Artist": "Artist %d" % (track_id % 2),
+                "Album": "Album",
+                "Genre": "Rock",
+                "Kind": "MPEG audio file",
+                "Size": 1000 + track_id,
+                "Total Time": 200000,
+                "Date Modified": added,
+                "Date Added": added,
+                "Play Count": track_id,
+                "Persistent ID": "%016X" % track_id,
+                "Track Type": "File",
+                "Location": "file:///Music/song%d.mp3" % track_id,
+            }
+            for track_id in range(1, tracks + 1)
+        },
+        "Playlists": [
+            {
+                "Name": name,
+                "Playlist ID": 100 + index,
+                "Playlist Persistent ID": "%016X" % (100 + index),
+                "Playlist Items": [
+                    {"Track ID": track_id} for track_id in range(tracks, 0, -1)
+                ],
+            }
+            for index, name in enumerate(playlists)
+        ],
+    }
+
+
+def write_library(filename, library, sort_keys=False):
+    """Write library as plist xml.
+
+    plistlib sorts the keys, so its files have Playlists before Tracks.
+    Without sort_keys the keys go in the order iTunes writes them.
+    """
+    with open(filename, "wb") as outfile:
+        plistlib.dump(library, outfile, sort_keys=sort_keys)
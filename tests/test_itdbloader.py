@@ -0,0 +1,140 @@
+# Copyright 2026 Alex K (wtwf.com)
+
+import datetime
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+import itdbloader
+import library
+
+
+class LoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.directory.name, "itdb.sqlite")
+        self.xmlfile = os.path.join(self.directory.name, "library.xml")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def load(self, itunes, sort_keys=False, **options):
+        library.write_library(self.xmlfile, itunes, sort_keys)
+        config = itdbloader.get_config()
+        config["storage"] = {"backend": "sqlite", "path": self.database}
+        config["user"] = {"id": "1"}
+        config["iTunes"] = {"xmlfile": self.xmlfile}
+        config["html"] = {"dir": os.path.join(self.directory.name, "html")}
+        config.set("loader", "force", "yes")
+        config.set("loader", "stats", "no")
+        config.set("loader", "snapshot", "no")
+        for option, value in options.items():
+            config.set("loader", option, value)
+        itdbloader.load_itdb(config)
+
+    def query(self, sql):
+        with sqlite3.connect(self.database) as conn:
+            return conn.execute(sql).fetchall()
+
+    def test_incremental_playlists_before_tracks(self):
+        self.load(library.make_library())
+        self.load(library.make_library(), sort_keys=True, incremental="yes")
+        self.assertEqual(self.query("SELECT COUNT(*) FROM tracks"), [(3,)])
+        self.assertEqual(self.query("SELECT COUNT(*) FROM playlist_tracks"), [(3,)])
+
+    def test_incremental_keeps_tracks_when_none_parsed(self):
+        self.load(library.make_library())
+        with self.assertRaises(ValueError):
+            self.load(library.make_library(tracks=0), incremental="yes")
+        self.assertEqual(self.query("SELECT COUNT(*) FROM tracks"), [(3,)])
+
+    def test_artists_differing_in_case_share_an_id(self):
+        itunes = library.make_library(tracks=4)
+        artists = ["The Beatles", "the beatles ", "Wings", "THE BEATLES"]
+        for track, artist in zip(itunes["Tracks"].values(), artists):
+            track["Artist"] = artist
+        self.load(itunes)
+        self.assertEqual(
+            self.query("SELECT Name FROM artists ORDER BY Artist_ID"),
+            [("The Beatles",), ("Wings",)],
+        )
+        self.assertEqual(
+            self.query("SELECT Track_ID, Artist_ID FROM tracks ORDER BY Track_ID"),
+            [(1, 1), (2, 1), (3, 2), (4, 1)],
+        )
+        # and an incremental load finds the id the full load gave it
+        track = itunes["Tracks"]["3"]
+        track["Artist"] = " the BEATLES"
+        track["Date Modified"] += datetime.timedelta(days=1)
+        self.load(itunes, incremental="yes")
+        self.assertEqual(
+            self.query("SELECT Artist_ID FROM tracks WHERE Track_ID = 3"), [(1,)]
+        )
+
+    def test_failed_load_puts_indexes_back(self):
+        self.load(library.make_library())
+        indexes = (
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND sql NOT NULL"
+        )
+        (count,) = self.query(indexes)[0]
+        self.assertTrue(count)
+        itunes = library.make_library()
+        itunes["Playlists"][0]["Playlist ID"] = "not a number"
+        with self.assertRaises(ValueError):
+            self.load(itunes, dropindexes="yes")
+        self.assertEqual(self.query(indexes), [(count,)])
+
+
+class FailingShardLoader(itdbloader.DbLoader):
+    """A DbLoader that can't find the file for its second shard."""
+
+    def __init__(self, config):  # pylint: disable=super-init-not-called
+        self.config = config
+        self.conn = itdbloader.db_connect(config)
+        self.cursor = self.conn.cursor()
+        self.user_id = 1
+        self.pipeline = True
+        self.shards = 3
+        self.tables = {x: x for x in itdbloader.LOADED_TABLES}
+
+    def load_csv(self, table, filename, replace=False, local=False, cursor=None):
+        if filename.endswith("_1.csv"):
+            filename += ".missing"
+        super().load_csv(table, filename, replace, local, cursor)
+
+
+class ShardTest(unittest.TestCase):
+    def test_failed_shard_ends_pipeline_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = itdbloader.get_config()
+            config["storage"] = {
+                "backend": "sqlite",
+                "path": os.path.join(directory, "itdb.sqlite"),
+            }
+            loader = FailingShardLoader(config)
+
+            def write_rows(csv_file):
+                for track_id in range(10000):
+                    print("1,100,%d" % track_id, file=csv_file)
+
+            errors = []
+
+            def load():
+                try:
+                    loader.bulk_load("playlist_tracks", write_rows)
+                except Exception as ex:  # pylint: disable=broad-except
+                    errors.append(ex)
+
+            thread = threading.Thread(target=load, daemon=True)
+            thread.start()
+            thread.join(30)
+            self.assertFalse(thread.is_alive(), "the load hung")
+            self.assertEqual(len(errors), 1)
+            self.assertIsInstance(errors[0], FileNotFoundError)
+            loader.conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
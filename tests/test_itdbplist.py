@@ -0,0 +1,52 @@
+# Copyright 2026 Alex K (wtwf.com)
+
+import os
+import tempfile
+import unittest
+
+import itdbplist
+import library
+
+
+class LibraryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.library = library.make_library()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, sort_keys=False):
+        filename = os.path.join(self.directory.name, name)
+        library.write_library(filename, self.library, sort_keys)
+        return filename
+
+    def check(self, itunes):
+        self.assertEqual(list(itunes.tracks()), list(self.library["Tracks"].values()))
+        self.assertEqual(list(itunes.playlists()), self.library["Playlists"])
+        self.assertEqual(itunes.header["Music Folder"], "file:///Music/")
+
+    def test_tracks_then_playlists(self):
+        self.check(itdbplist.Library(self.write("lib.xml")))
+
+    def test_playlists_before_tracks(self):
+        self.check(itdbplist.Library(self.write("sorted.xml", sort_keys=True)))
+
+    def test_playlists_before_tracks_snapshot(self):
+        xmlfile = self.write("sorted.xml", sort_keys=True)
+        snapshot = os.path.join(self.directory.name, "snapshot")
+        # once to write the snapshot and once to read it
+        self.check(itdbplist.Library(xmlfile, snapshot))
+        self.check(itdbplist.Library(xmlfile, snapshot))
+
+    def test_playlists_first(self):
+        for sort_keys in (False, True):
+            itunes = itdbplist.Library(self.write("lib.xml", sort_keys))
+            self.assertEqual(list(itunes.playlists()), self.library["Playlists"])
+            self.assertEqual(
+                list(itunes.tracks()), list(self.library["Tracks"].values())
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
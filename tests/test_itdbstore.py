@@ -0,0 +1,49 @@
+# Copyright 2026 Alex K (wtwf.com)
+
+import csv
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import itdbstore
+
+
+class LoadDataTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.conn = itdbstore.SqliteConnection(
+            os.path.join(self.directory.name, "itdb.sqlite")
+        )
+        self.cursor = self.conn.cursor()
+        self.cursor.execute("CREATE TABLE pairs (a INTEGER, b TEXT)")
+
+    def tearDown(self):
+        self.conn.close()
+        self.directory.cleanup()
+
+    def load(self, rows):
+        filename = os.path.join(self.directory.name, "pairs.csv")
+        with open(filename, "w", newline="") as csv_file:
+            csv.writer(csv_file).writerows(rows)
+        return self.cursor.execute("LOAD DATA INFILE '%s' INTO TABLE pairs" % filename)
+
+    def test_load(self):
+        self.assertEqual(self.load([[1, "one"], [2, itdbstore.NULL]]), 2)
+        self.cursor.execute("SELECT a, b FROM pairs ORDER BY a")
+        self.assertEqual(self.cursor.fetchall(), [(1, "one"), (2, None)])
+
+    def test_failed_load_rolls_back(self):
+        # the first 1000 rows go in before the bad one
+        rows = [[x, "x"] for x in range(1000)] + [[1, "too", "many"]]
+        with self.assertRaises(sqlite3.Error):
+            self.load(rows)
+        self.assertFalse(self.conn.conn.in_transaction)
+        self.cursor.execute("SELECT COUNT(*) FROM pairs")
+        self.assertEqual(self.cursor.fetchall(), [(0,)])
+        # and the next load can start a transaction of its own
+        self.assertEqual(self.load([[1, "one"]]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()